@@ -1,27 +1,62 @@
 import base64
 import fcntl
+import fnmatch
 import json
 import os
 import platform
 import pty
+import random
 import select
 import struct
 import termios
 import threading
 import time
+from collections import deque
 
 import websocket
+from delta_sync import (
+    BLOCK_SIZE,
+    REMOTE_MCPS_DIR,
+    apply_delta,
+    block_signatures,
+    directory_manifest,
+)
+from file_transfer import (
+    CHUNK_SIZE,
+    DEFAULT_WINDOW,
+    ChunkReceiver,
+    TransferError,
+    TransferWindow,
+    file_sha256,
+    send_file,
+    unpack_chunk,
+)
+from wire_compression import (
+    MessageCodec,
+    is_compressed_frame,
+    negotiate,
+    supported_codecs,
+)
 
 # Configuration
 SERVER_URL = "ws://127.0.0.1:5000/agent"
 AGENT_ID = "agent-001"
 AUTH_TOKEN = "your-secret-token"
+LIST_DIR_PAGE_SIZE = 500
+LIST_DIR_MAX_DEPTH = 8
 
 # Global dictionary to store shell processes and related data
 shells = {}
 
+# Active chunked file transfers, indexed by transfer_id
+outgoing_transfers = {}  # files the agent is sending (TransferWindow)
+incoming_transfers = {}  # files the agent is receiving (ChunkReceiver)
 
-def shell_reader(ws, shell_id):
+# Compression is off until the server picks a codec in auth_result
+message_codec = MessageCodec()
+
+
+def shell_reader(shell_id):
     """
     Reads output from the shell pty and forwards it to the server.
     This runs in a separate thread for each shell.
@@ -40,7 +75,7 @@ def shell_reader(ws, shell_id):
                         "shell_id": shell_id,
                         "output": output.decode("utf-8", errors="ignore"),
                     }
-                    ws.send(json.dumps(response))
+                    send_control(response)
                 else:
                     # End of file, process has terminated
                     break
@@ -55,17 +90,241 @@ def shell_reader(ws, shell_id):
         shells.pop(shell_id, None)
         # Notify the server that the shell has closed
         try:
-            ws.send(json.dumps({"type": "shell_closed", "shell_id": shell_id}))
+            send_control({"type": "shell_closed", "shell_id": shell_id})
         except Exception as e:
             print(f"Could not notify server of shell closure for {shell_id}: {e}")
 
 
+def close_shell(shell_id):
+    shell = shells.pop(shell_id, None)
+    if shell is None:
+        return False
+    os.close(shell["fd"])
+    return True
+
+
+def send_control(message):
+    """Sends a JSON message, compressed when it is large enough."""
+    frame = message_codec.encode(message)
+    connection.send(frame, binary=isinstance(frame, bytes))
+
+
+def file_sender(transfer_id, file_path, window_size, chunk_size):
+    """
+    Streams a file to the server in binary chunks, from the offset the server
+    answers with (see file_fetch.py on the dashboard). This runs in a separate
+    thread so acknowledgements can be processed.
+    """
+    window = TransferWindow(window_size, chunk_size)
+    outgoing_transfers[transfer_id] = window
+    try:
+        size = os.path.getsize(file_path)
+        sha256 = file_sha256(file_path, chunk_size)
+        send_control(
+            {
+                "type": "read_file_stream_start",
+                "transfer_id": transfer_id,
+                "size": size,
+                "sha256": sha256,
+            },
+        )
+        send_file(
+            file_path,
+            transfer_id,
+            lambda frame: connection.send(frame, binary=True),
+            window,
+            offset=window.wait_until_ready(),
+            chunk_size=chunk_size,
+        )
+        send_control(
+            {
+                "type": "transfer_complete",
+                "transfer_id": transfer_id,
+                "size": size,
+                "sha256": sha256,
+            },
+        )
+    except (OSError, TransferError) as e:
+        send_control(
+            {
+                "type": "read_file_result",
+                "transfer_id": transfer_id,
+                "status": "error",
+                "message": str(e),
+            },
+        )
+    finally:
+        outgoing_transfers.pop(transfer_id, None)
+
+
+def _entry_info(entry, base_path):
+    """
+    Describes a directory entry using the stat data cached by scandir.
+
+    ``is_dir`` follows symlinks, as ``os.path.isdir`` did, so a link to a
+    directory can still be opened from the UI; ``type`` is "symlink" for it
+    and the recursive walk does not descend into links.
+    """
+    try:
+        is_link = entry.is_symlink()
+        is_dir = entry.is_dir()
+        stat = entry.stat(follow_symlinks=False)
+        size, mtime = stat.st_size, stat.st_mtime
+    except OSError:
+        is_link = is_dir = False
+        size, mtime = None, None
+    if is_link:
+        kind = "symlink"
+    elif is_dir:
+        kind = "dir"
+    elif entry.is_file(follow_symlinks=False):
+        kind = "file"
+    else:
+        kind = "other"
+    return {
+        "name": os.path.relpath(entry.path, base_path),
+        "is_dir": is_dir,
+        "type": kind,
+        "size": size,
+        "mtime": mtime,
+    }
+
+
+def iter_dir_entries(path, recursive=False, max_depth=1, pattern=None, kinds=None):
+    """
+    Yields entries of ``path`` using a single scandir pass per directory.
+
+    In recursive mode subdirectories are walked up to ``max_depth`` levels
+    (symlinks are not followed). ``pattern`` is a glob matched against the
+    entry name and ``kinds`` restricts the entry types returned; directories
+    that are filtered out are still walked.
+    """
+    stack = [(path, 1)]
+    while stack:
+        current, depth = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    info = _entry_info(entry, path)
+                    if recursive and info["type"] == "dir" and depth < max_depth:
+                        stack.append((entry.path, depth + 1))
+                    if pattern and not fnmatch.fnmatch(entry.name, pattern):
+                        continue
+                    if kinds and info["type"] not in kinds:
+                        continue
+                    yield info
+        except OSError:
+            if current == path:
+                raise
+            print(f"Skipping unreadable directory {current}")
+
+
+def list_dir_sender(request):
+    """
+    Streams a directory listing to the server in pages.
+    This runs in a separate thread so large directories do not block messages.
+    """
+    path = request.get("path", ".")
+    request_id = request.get("request_id")
+    page_size = max(1, int(request.get("page_size", LIST_DIR_PAGE_SIZE)))
+    sort_by = request.get("sort_by")
+    kinds = request.get("entry_types")
+    entries = iter_dir_entries(
+        path,
+        recursive=request.get("recursive", False),
+        max_depth=int(request.get("max_depth", LIST_DIR_MAX_DEPTH)),
+        pattern=request.get("pattern"),
+        kinds=set(kinds) if kinds else None,
+    )
+
+    def send_page(files, page, done, total):
+        send_control(
+            {
+                "type": "list_dir_result",
+                "request_id": request_id,
+                "status": "success",
+                "files": files,
+                "page": page,
+                "done": done,
+                "total": total,
+            }
+        )
+
+    try:
+        if sort_by in ("name", "size", "mtime"):
+            # Sorting needs every entry, but pages still keep frames small
+            if sort_by == "name":
+                key = lambda e: e["name"]  # noqa: E731
+            else:
+                # Entries whose stat failed go last
+                key = lambda e: (e[sort_by] is None, e[sort_by] or 0)  # noqa: E731
+            entries = sorted(entries, key=key, reverse=request.get("reverse", False))
+        page, total, files = 0, 0, []
+        for entry in entries:
+            files.append(entry)
+            total += 1
+            if len(files) == page_size:
+                send_page(files, page, False, None)
+                page, files = page + 1, []
+        send_page(files, page, True, total)
+    except Exception as e:
+        send_control(
+            {
+                "type": "list_dir_result",
+                "request_id": request_id,
+                "status": "error",
+                "message": str(e),
+            }
+        )
+
+
+def on_binary_chunk(frame):
+    """Handles a binary frame belonging to an incoming file transfer."""
+    try:
+        transfer_id, offset, data = unpack_chunk(frame)
+    except TransferError as e:
+        # The header cannot be trusted, the sender will time out and resume.
+        print(f"Discarding malformed chunk: {e}")
+        return
+
+    receiver = incoming_transfers.get(transfer_id)
+    if receiver is None:
+        send_control({"type": "transfer_cancel", "transfer_id": transfer_id})
+        return
+
+    # Duplicates are acknowledged again so a sender that missed an ack moves on
+    if receiver.write(offset, data) or offset < receiver.offset:
+        send_control(
+            {
+                "type": "transfer_ack",
+                "transfer_id": transfer_id,
+                "offset": receiver.offset,
+            },
+        )
+    else:
+        send_control(
+            {
+                "type": "transfer_nack",
+                "transfer_id": transfer_id,
+                "offset": receiver.offset,
+            },
+        )
+
+
 def on_message(ws, message):
-    print(f"Received message: {message}")
+    if isinstance(message, bytes) and not is_compressed_frame(message):
+        on_binary_chunk(message)
+        return
+
     try:
-        data = json.loads(message)
+        data = message_codec.decode(message)
+        print(f"Received message: {data.get('type')}")
         msg_type = data.get("type")
 
+        if msg_type == "auth_result":
+            on_auth_result(data)
+            return
+
         if msg_type == "shell_start":
             shell_id = data.get("shell_id", str(time.time()))
 
@@ -86,12 +345,12 @@ def on_message(ws, message):
                 print(f"Started new shell with PID {pid} and shell_id {shell_id}")
                 shells[shell_id] = {"pid": pid, "fd": fd}
 
-                thread = threading.Thread(target=shell_reader, args=(ws, shell_id))
+                thread = threading.Thread(target=shell_reader, args=(shell_id,))
                 thread.daemon = True
                 thread.start()
 
                 response = {"type": "shell_started", "shell_id": shell_id}
-                ws.send(json.dumps(response))
+                send_control(response)
 
         elif msg_type == "shell_input":
             shell_id = data.get("shell_id")
@@ -112,63 +371,183 @@ def on_message(ws, message):
 
         elif msg_type == "shell_close":
             shell_id = data.get("shell_id")
-            if shell_id in shells:
-                os.close(shells[shell_id]["fd"])
-                shells.pop(shell_id, None)
+            if close_shell(shell_id):
                 print(f"Closed shell {shell_id} by server request.")
 
         elif msg_type == "list_dir":
-            path = data.get("path", ".")
+            thread = threading.Thread(target=list_dir_sender, args=(data,))
+            thread.daemon = True
+            thread.start()
+
+        elif msg_type == "read_file":
+            file_path = data.get("file_path")
             request_id = data.get("request_id")
             try:
-                files = []
-                for entry in os.listdir(path):
-                    full_path = os.path.join(path, entry)
-                    is_dir = os.path.isdir(full_path)
-                    files.append({"name": entry, "is_dir": is_dir})
+                with open(file_path, "rb") as f:
+                    content = base64.b64encode(f.read()).decode("utf-8")
                 response = {
-                    "type": "list_dir_result",
+                    "type": "read_file_result",
                     "request_id": request_id,
                     "status": "success",
-                    "files": files,
+                    "content": content,
                 }
             except Exception as e:
                 response = {
-                    "type": "list_dir_result",
+                    "type": "read_file_result",
                     "request_id": request_id,
                     "status": "error",
                     "message": str(e),
                 }
-            ws.send(json.dumps(response))
+            send_control(response)
 
-        elif msg_type == "read_file":
+        elif msg_type == "write_file":
             file_path = data.get("file_path")
+            content = data.get("content")  # Base64 encoded
             request_id = data.get("request_id")
             try:
-                with open(file_path, "rb") as f:
-                    content = base64.b64encode(f.read()).decode("utf-8")
+                with open(file_path, "wb") as f:
+                    f.write(base64.b64decode(content))
                 response = {
-                    "type": "read_file_result",
+                    "type": "write_file_result",
                     "request_id": request_id,
                     "status": "success",
-                    "content": content,
                 }
             except Exception as e:
                 response = {
-                    "type": "read_file_result",
+                    "type": "write_file_result",
+                    "request_id": request_id,
+                    "status": "error",
+                    "message": str(e),
+                }
+            send_control(response)
+
+        elif msg_type == "read_file_stream":
+            thread = threading.Thread(
+                target=file_sender,
+                args=(
+                    data.get("transfer_id"),
+                    data.get("file_path"),
+                    data.get("window", DEFAULT_WINDOW),
+                    data.get("chunk_size", CHUNK_SIZE),
+                ),
+            )
+            thread.daemon = True
+            thread.start()
+
+        elif msg_type == "transfer_ready":
+            window = outgoing_transfers.get(data.get("transfer_id"))
+            if window:
+                window.ready(data.get("offset", 0))
+
+        elif msg_type == "transfer_ack":
+            window = outgoing_transfers.get(data.get("transfer_id"))
+            if window:
+                window.ack(data.get("offset", 0))
+
+        elif msg_type == "transfer_nack":
+            window = outgoing_transfers.get(data.get("transfer_id"))
+            if window:
+                window.nack(data.get("offset", 0))
+
+        elif msg_type == "write_file_stream":
+            transfer_id = data.get("transfer_id")
+            request_id = data.get("request_id")
+            try:
+                receiver = incoming_transfers.get(transfer_id)
+                if receiver is None:
+                    receiver = ChunkReceiver(
+                        transfer_id,
+                        data.get("file_path"),
+                        data.get("size"),
+                        data.get("sha256"),
+                    )
+                    incoming_transfers[transfer_id] = receiver
+                response = {
+                    "type": "transfer_ready",
                     "request_id": request_id,
+                    "transfer_id": transfer_id,
+                    "offset": receiver.offset,
+                }
+            except Exception as e:
+                response = {
+                    "type": "write_file_result",
+                    "request_id": request_id,
+                    "transfer_id": transfer_id,
+                    "status": "error",
+                    "message": str(e),
+                }
+            send_control(response)
+
+        elif msg_type == "transfer_cancel":
+            transfer_id = data.get("transfer_id")
+            window = outgoing_transfers.get(transfer_id)
+            if window:
+                window.cancel()
+            receiver = incoming_transfers.pop(transfer_id, None)
+            if receiver:
+                receiver.close()
+
+        elif msg_type == "transfer_complete":
+            transfer_id = data.get("transfer_id")
+            receiver = incoming_transfers.pop(transfer_id, None)
+            if receiver is None:
+                return
+            try:
+                receiver.finalize(data.get("size"), data.get("sha256"))
+                response = {
+                    "type": "write_file_result",
+                    "request_id": data.get("request_id"),
+                    "transfer_id": transfer_id,
+                    "status": "success",
+                }
+            except Exception as e:
+                response = {
+                    "type": "write_file_result",
+                    "request_id": data.get("request_id"),
+                    "transfer_id": transfer_id,
                     "status": "error",
                     "message": str(e),
                 }
-            ws.send(json.dumps(response))
+            send_control(response)
 
-        elif msg_type == "write_file":
-            file_path = data.get("file_path")
-            content = data.get("content")  # Base64 encoded
+        elif msg_type == "mcp_sync_request":
+            request_id = data.get("request_id")
+            block_size = data.get("block_size", BLOCK_SIZE)
+            manifest = directory_manifest(REMOTE_MCPS_DIR)
+            files = {}
+            for name, wanted_sha256 in data.get("files", {}).items():
+                current = manifest.get(name)
+                if current is None:
+                    continue
+                files[name] = {"sha256": current["sha256"]}
+                if current["sha256"] != wanted_sha256:
+                    files[name]["signatures"] = block_signatures(
+                        os.path.join(REMOTE_MCPS_DIR, name), block_size
+                    )
+            response = {
+                "type": "mcp_sync_response",
+                "request_id": request_id,
+                "manifest": manifest,
+                "files": files,
+            }
+            send_control(response)
+
+        elif msg_type == "apply_delta":
             request_id = data.get("request_id")
+            file_name = data.get("file_name", "")
             try:
-                with open(file_path, "wb") as f:
-                    f.write(base64.b64decode(content))
+                if os.path.basename(file_name) != file_name or not file_name:
+                    raise ValueError(f"Invalid file name: {file_name!r}")
+                target = os.path.join(REMOTE_MCPS_DIR, file_name)
+                partial = target + ".part"
+                os.makedirs(REMOTE_MCPS_DIR, exist_ok=True)
+                delta = base64.b64decode(data.get("delta", ""))
+                base = target if data.get("base_sha256") else None
+                apply_delta(base, delta, partial, data.get("block_size", BLOCK_SIZE))
+                if file_sha256(partial) != data.get("sha256"):
+                    os.remove(partial)
+                    raise ValueError("SHA-256 mismatch after applying delta.")
+                os.replace(partial, target)
                 response = {
                     "type": "write_file_result",
                     "request_id": request_id,
@@ -181,7 +560,7 @@ def on_message(ws, message):
                     "status": "error",
                     "message": str(e),
                 }
-            ws.send(json.dumps(response))
+            send_control(response)
 
         elif msg_type == "delete_file":
             file_path = data.get("file_path")
@@ -200,7 +579,7 @@ def on_message(ws, message):
                     "status": "error",
                     "message": str(e),
                 }
-            ws.send(json.dumps(response))
+            send_control(response)
 
     except json.JSONDecodeError:
         print("Error decoding JSON from server.")
@@ -213,10 +592,8 @@ def on_error(ws, error):
 
 
 def on_close(ws, close_status_code, close_msg):
-    print("### closed ###")
-    time.sleep(5)
-    print("Attempting to reconnect...")
-    connect_to_server()
+    print(f"### closed ({close_status_code}) ###")
+    connection.mark_disconnected()
 
 
 def on_open(ws):
@@ -227,19 +604,139 @@ def on_open(ws):
         "token": AUTH_TOKEN,
         "platform": platform.system(),
         "ip": "127.0.0.1",
+        "compression": supported_codecs(),
+        "resume_token": connection.session_token,
     }
+    # Authentication goes out directly: everything else waits for auth_result
     ws.send(json.dumps(auth_data))
 
 
-def connect_to_server():
-    ws = websocket.WebSocketApp(
-        SERVER_URL,
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close,
+def on_auth_result(data):
+    """Completes the handshake and resumes or resets the previous session."""
+    if data.get("status") != "success":
+        # Nothing is sent on a rejected link; reconnect and try again
+        print(f"Authentication failed: {data.get('message')}")
+        connection.close()
+        return
+    message_codec.codec = negotiate([data.get("compression")])
+    resumed = bool(connection.session_token) and data.get("resumed", False)
+    connection.session_token = data.get("session_token")
+    if not resumed:
+        # The server forgot the old session: its shells and pending
+        # transfers have nobody listening on the other side any more.
+        for shell_id in list(shells):
+            close_shell(shell_id)
+        for window in list(outgoing_transfers.values()):
+            window.cancel()
+        connection.clear_buffer()
+    print(
+        f"Authenticated (resumed: {resumed}, "
+        f"compression: {message_codec.codec or 'none'})"
     )
-    ws.run_forever()
+    connection.mark_connected()
+
+
+class AgentConnection:
+    """
+    Keeps the agent connected to the server.
+
+    Reconnects with jittered exponential backoff instead of a fixed delay, so
+    a fleet of agents does not reconnect in lockstep after a server restart.
+    While the link is down, outgoing messages are buffered (up to
+    ``buffer_limit`` bytes) and flushed in order once the session is resumed.
+    """
+
+    def __init__(self, url, base_delay=1.0, max_delay=60.0, buffer_limit=1048576):
+        self.url = url
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.buffer_limit = buffer_limit
+        self.session_token = None
+        self.attempt = 0
+        self.dropped_bytes = 0
+        self._ws = None
+        self._connected = False
+        self._buffer = deque()
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+
+    def send(self, frame, binary=False):
+        with self._lock:
+            if self._connected:
+                try:
+                    self._send_now(frame, binary)
+                    return
+                except websocket.WebSocketException as e:
+                    print(f"Send failed, buffering until reconnection: {e}")
+                    self._connected = False
+            self._buffer.append((frame, binary))
+            self._buffered_bytes += len(frame)
+            while self._buffered_bytes > self.buffer_limit and self._buffer:
+                dropped, _ = self._buffer.popleft()
+                self._buffered_bytes -= len(dropped)
+                self.dropped_bytes += len(dropped)
+
+    def _send_now(self, frame, binary):
+        opcode = websocket.ABNF.OPCODE_BINARY if binary else websocket.ABNF.OPCODE_TEXT
+        self._ws.send(frame, opcode=opcode)
+
+    def mark_connected(self):
+        """Flushes buffered output once the server accepted the session."""
+        with self._lock:
+            while self._buffer:
+                frame, binary = self._buffer[0]
+                try:
+                    self._send_now(frame, binary)
+                except websocket.WebSocketException:
+                    return
+                self._buffer.popleft()
+                self._buffered_bytes -= len(frame)
+            self._connected = True
+            self.attempt = 0
+        if self.dropped_bytes:
+            print(f"Dropped {self.dropped_bytes} bytes of output while offline.")
+            self.dropped_bytes = 0
+
+    def close(self):
+        if self._ws is not None:
+            self._ws.close()
+
+    def mark_disconnected(self):
+        with self._lock:
+            self._connected = False
+
+    def clear_buffer(self):
+        with self._lock:
+            self._buffer.clear()
+            self._buffered_bytes = 0
+
+    def next_delay(self):
+        """Full-jitter exponential backoff."""
+        ceiling = min(self.max_delay, self.base_delay * (2**self.attempt))
+        self.attempt += 1
+        return random.uniform(0, ceiling)
+
+    def run_forever(self):
+        while True:
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=on_open,
+                on_message=on_message,
+                on_error=on_error,
+                on_close=on_close,
+            )
+            self._ws.run_forever(ping_interval=20, ping_timeout=10)
+            self.mark_disconnected()
+            delay = self.next_delay()
+            print(f"Attempting to reconnect in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+connection = AgentConnection(SERVER_URL)
+
+
+def connect_to_server():
+    connection.run_forever()
 
 
 if __name__ == "__main__":
@@ -1,27 +1,107 @@
 import logging
+import secrets
+import time
 from datetime import datetime, timezone
 
 import jwt
 from extensions import db
 from flask import current_app, request
 from flask_socketio import Namespace, emit, join_room
+from metrics import SOCKETIO_EVENTS
 from models import Agent, AutomationLog
+from wire_compression import MessageCodec, is_compressed_frame, negotiate
 
 log = logging.getLogger(__name__)
 
+# How long an agent may stay disconnected and still resume its session
+RESUME_GRACE_SECONDS = 120
+
 
 class AgentNamespace(Namespace):
     def __init__(self, namespace, playbook_executor):
         super(AgentNamespace, self).__init__(namespace)
         self.playbook_executor = playbook_executor
+        # Negotiated message codec per SID, see wire_compression.py
+        self.codecs = {}
+        # Resumable sessions:
+        # token -> {"agent_id", "sid", "disconnected_at", "codec", "info"}
+        self.sessions = {}
+
+    def _resume_session(self, agent_id, resume_token):
+        """
+        Returns ``(session, token, resumed)`` for an authenticated agent.
+
+        A token is resumed only if it belongs to the same agent and the agent
+        reconnected within ``RESUME_GRACE_SECONDS``. The session keeps the
+        agent's codec (and its traffic counters) and its ``connected_agents``
+        record while the agent is away, so a resumed agent picks up where it
+        left off; otherwise a new session starts and the agent discards its
+        open shells and buffered output.
+        """
+        now = time.monotonic()
+        for token, session in list(self.sessions.items()):
+            disconnected_at = session["disconnected_at"]
+            if disconnected_at and now - disconnected_at > RESUME_GRACE_SECONDS:
+                del self.sessions[token]
+
+        session = self.sessions.get(resume_token) if resume_token else None
+        if session and session["agent_id"] == agent_id:
+            session.update(sid=request.sid, disconnected_at=None)
+            return session, resume_token, True
+
+        token = secrets.token_urlsafe(32)
+        session = {
+            "agent_id": agent_id,
+            "sid": request.sid,
+            "disconnected_at": None,
+            "codec": None,
+            "info": None,
+        }
+        self.sessions[token] = session
+        return session, token, False
+
+    def trigger_event(self, event, *args):
+        """
+        Decodes the frames agents send (compressed or JSON text) before
+        dispatching, counting their size as received. Payloads the Socket.IO
+        client sent as objects arrive already parsed and are not counted.
+        """
+        if len(args) > 1:
+            sid, payload = args[0], args[1]
+            codec = self.codecs.get(sid)
+            if codec is not None and (
+                is_compressed_frame(payload) or isinstance(payload, str)
+            ):
+                try:
+                    payload = codec.decode(payload)
+                except ValueError:
+                    # Not a JSON document: a plain string argument
+                    pass
+                else:
+                    args = (sid, payload) + args[2:]
+        SOCKETIO_EVENTS.inc((self.namespace, event))
+        return super(AgentNamespace, self).trigger_event(event, *args)
+
+    def send_to_agent(self, sid, event, data):
+        """Emits to an agent, compressing the payload if the agent negotiated it."""
+        codec = self.codecs.get(sid)
+        if codec is not None and codec.codec:
+            frame = codec.encode(data)
+            if isinstance(frame, bytes):
+                data = frame
+        emit(event, data, room=sid)
 
     def on_connect(self):
         log.info(f"Agent connected: {request.sid}")
         emit("request_authentication", {"message": "Please authenticate to proceed."})
 
     def on_disconnect(self):
-        if request.sid in current_app.connected_agents:
-            agent_info = current_app.connected_agents.pop(request.sid)
+        self.codecs.pop(request.sid, None)
+        agent_info = current_app.connected_agents.pop(request.sid, None)
+        for session in self.sessions.values():
+            if session["sid"] == request.sid:
+                session.update(disconnected_at=time.monotonic(), info=agent_info)
+        if agent_info is not None:
             agent_id = agent_info.get("id")
             log.info(
                 f"Agent disconnected: {agent_info.get('name', 'Unknown')} (ID: {agent_id}) SID: {request.sid}"
@@ -47,6 +127,19 @@ class AgentNamespace(Namespace):
             log.warning(f"Unauthenticated agent disconnected: {request.sid}")
 
     def on_authenticate(self, data):
+        """
+        Authenticates an agent and answers with an ``auth_result`` message.
+
+        The agent holds back everything but the authentication until it sees
+        ``auth_result``, so the result is emitted to the agent as well as
+        returned as the acknowledgement.
+        """
+        result = self._authenticate(data or {})
+        result["type"] = "auth_result"
+        emit("auth_result", result)
+        return result
+
+    def _authenticate(self, data):
         token = data.get("token")
         if not token:
             log.warning(f"Auth failed (missing token) from SID: {request.sid}")
@@ -76,15 +169,32 @@ class AgentNamespace(Namespace):
             agent.last_seen = datetime.now(timezone.utc)
             db.session.commit()
 
-            current_app.connected_agents[request.sid] = {
-                "id": agent_id,
-                "name": agent.name,
-                "sid": request.sid,
-                "status": "online",
-            }
+            session, session_token, resumed = self._resume_session(
+                agent_id, data.get("resume_token")
+            )
+            compression = negotiate(data.get("compression"))
+            codec = session["codec"]
+            if codec is None:
+                codec = session["codec"] = MessageCodec(compression)
+            else:
+                # Same counters as before the reconnection
+                codec.codec = compression
+            self.codecs[request.sid] = codec
+            agent_info = session["info"] or {"id": agent_id}
+            agent_info.update(
+                name=agent.name,
+                sid=request.sid,
+                status="online",
+                compression=codec.codec,
+                traffic=codec.counters,
+                session_token=session_token,
+            )
+            session["info"] = None
+            current_app.connected_agents[request.sid] = agent_info
             join_room(agent_id)
             log.info(
-                f"Agent '{agent.name}' authenticated successfully (SID: {request.sid})"
+                f"Agent '{agent.name}' authenticated successfully "
+                f"(SID: {request.sid}, resumed: {resumed})"
             )
 
             emit(
@@ -98,7 +208,13 @@ class AgentNamespace(Namespace):
                 namespace="/agent",
             )
 
-            return {"status": "success", "message": "Authentication successful"}
+            return {
+                "status": "success",
+                "message": "Authentication successful",
+                "compression": codec.codec,
+                "session_token": session_token,
+                "resumed": resumed,
+            }
 
         except jwt.ExpiredSignatureError:
             log.warning(f"Auth failed: Token expired for SID: {request.sid}")
@@ -130,10 +246,10 @@ class AgentNamespace(Namespace):
             log.info(
                 f"Relaying command '{command}' to agent {agent_id} (SID: {agent_sid})"
             )
-            emit(
+            self.send_to_agent(
+                agent_sid,
                 "server_command",
                 {"method": "exec_command", "params": command, "id": task_id},
-                room=agent_sid,
             )
         else:
             log.warning(
@@ -156,10 +272,10 @@ class AgentNamespace(Namespace):
         if agent_sid:
             log.info(f"Requesting health from agent {agent_id} (SID: {agent_sid})")
             # The agent will respond via the 'on_command_result' event
-            emit(
+            self.send_to_agent(
+                agent_sid,
                 "server_command",
                 {"method": "get_health", "id": f"health_{agent_id}"},
-                room=agent_sid,
             )
         else:
             log.warning(
@@ -222,6 +338,57 @@ class AgentNamespace(Namespace):
             namespace="/agent",
         )  # Emitting to the same namespace for simplicity
 
+    def on_transfer_ready(self, data):
+        """The agent accepted a chunked upload; `offset` is where to resume."""
+        window = current_app.file_transfers.get(data.get("transfer_id"))
+        if window:
+            window.ready(data.get("offset", 0))
+
+    def on_transfer_ack(self, data):
+        window = current_app.file_transfers.get(data.get("transfer_id"))
+        if window:
+            window.ack(data.get("offset", 0))
+
+    def on_transfer_nack(self, data):
+        window = current_app.file_transfers.get(data.get("transfer_id"))
+        if window:
+            window.nack(data.get("offset", 0))
+
+    def on_transfer_cancel(self, data):
+        window = current_app.file_transfers.get(data.get("transfer_id"))
+        if window:
+            window.cancel()
+        current_app.file_fetcher.handle_failure(data)
+
+    def on_read_file_stream_start(self, data):
+        """The agent announced a file the dashboard asked for (see file_fetch.py)."""
+        current_app.file_fetcher.handle_start(data)
+
+    def on_file_chunk(self, frame):
+        current_app.file_fetcher.handle_chunk(frame)
+
+    def on_transfer_complete(self, data):
+        current_app.file_fetcher.handle_complete(data)
+
+    def on_read_file_result(self, data):
+        """Only sent for a chunked read when the agent could not send the file."""
+        current_app.file_fetcher.handle_failure(data)
+
+    def on_write_file_result(self, data):
+        """Final status of a chunked upload, after the agent verified the hash."""
+        agent_id = self.get_agent_id_from_sid(request.sid)
+        if data.get("status") == "success":
+            log.info(f"Agent {agent_id} stored transfer {data.get('transfer_id')}")
+        else:
+            log.error(
+                f"Agent {agent_id} failed transfer {data.get('transfer_id')}: "
+                f"{data.get('message')}"
+            )
+
+    def on_mcp_sync_response(self, data):
+        """Hashes and block signatures of the agent's remote_mcps directory."""
+        current_app.mcp_sync.handle_sync_response(data)
+
     def get_agent_id_from_sid(self, sid):
         if sid in current_app.connected_agents:
             return current_app.connected_agents[sid].get("id")
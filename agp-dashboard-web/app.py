@@ -9,13 +9,27 @@ from datetime import datetime
 
 import click
 import extensions
+import metrics
+import profiling
+import static_assets
+import templating
+from agent_metrics import MetricsStore, flush_to_db
+from backup_jobs import BackupJobs
+from file_fetch import FileFetcher
 from flask import Flask, jsonify, redirect, url_for
 from flask.cli import with_appcontext
 from flask_compress import Compress
+from log_index import LogIndex
+from log_pipeline import LogPipeline
+from log_viewer import LogTailNamespace
+from mcp_sync import McpSync
+from menu import MenuCache
 from playbook_executor import PlaybookExecutor
+from user_cache import USER_CACHE_SECONDS, UserCache
 from utils import _cargar_proyectos, get_dashboard_stats
 
 
+@metrics.track_job
 def broadcast_device_status():
     """
     Fetches device status from Termux:API and broadcasts it via Socket.IO.
@@ -41,6 +55,55 @@ def broadcast_device_status():
     ) as e:
         current_app.logger.warning("Could not fetch Termux device status", error=str(e))
 
+@metrics.track_job
+def flush_agent_metrics():
+    """
+    Persists the health metrics pushed by agents since the last run.
+    Executed periodically by Flask-APScheduler, like broadcast_device_status.
+    """
+    from flask import current_app
+    from models import Agent
+
+    written = flush_to_db(
+        current_app.agent_metrics, extensions.db, Agent, extensions.socketio
+    )
+    if written:
+        current_app.logger.info("Agent metrics flushed", agents=written)
+
+@metrics.track_job
+def update_log_index():
+    """
+    Indexes the lines appended to app.log since the last run.
+    Executed periodically by Flask-APScheduler.
+    """
+    from backup_jobs import run_off_hub
+    from flask import current_app
+
+    # Parsing megabytes of JSON lines in a green thread would stall requests
+    run_off_hub(current_app.log_index.update)
+
+@metrics.track_job
+def create_backup_snapshot():
+    """
+    Saves a snapshot in the local backup repository and applies the retention.
+    Executed periodically by Flask-APScheduler.
+    """
+    from backup_jobs import run_off_hub
+    from backup_repository import snapshot_and_prune
+    from flask import current_app
+
+    # Chunking in a green thread would stall every request until it is done
+    snapshot, (removed, chunks) = run_off_hub(
+        snapshot_and_prune, current_app._get_current_object()
+    )
+    current_app.logger.info(
+        "Backup snapshot created",
+        snapshot=snapshot["id"],
+        removed_snapshots=removed,
+        removed_chunks=chunks,
+        **snapshot["stats"],
+    )
+
 @click.command(name="seed_db")
 @with_appcontext
 def seed_db():
@@ -177,9 +240,16 @@ def create_app() -> Flask:
     stream_handler.setFormatter(logging.Formatter("%(message)s"))
     stream_handler.setLevel(logging.INFO)
 
-    # Add handlers to Flask's app.logger
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(stream_handler)
+    # Put the handlers on the root logger behind a queue, in place of the
+    # basicConfig handler of utils.py: every logger (app, agent_api, mcp_sync,
+    # ...) only enqueues and a native thread does the writing (see
+    # log_pipeline.py). Started first, so the previous app's pipeline has
+    # already given the root logger its handlers back
+    app.log_pipeline = LogPipeline()
+    app.log_pipeline.start()
+    root_logger = logging.getLogger()
+    app.log_pipeline.attach(root_logger, [file_handler, stream_handler], replace=True)
+    root_logger.setLevel(logging.INFO)
     app.logger.setLevel(logging.INFO) # Set level for app.logger
 
     structlog.configure(
@@ -200,11 +270,12 @@ def create_app() -> Flask:
     app.logger.info("Logging configured for Flask application with rotation.")
     # --- End of Structured Logging Configuration ---
 
-    app.config["TEMPLATES_AUTO_RELOAD"] = True
     Compress(app)
 
     # Load the instance config, if it exists, when not testing
     app.config.from_pyfile("config.py", silent=True)
+    # e.g. {"agent_api": 0.1} keeps one in ten of its records below WARNING
+    app.log_pipeline.sampler.configure(app.config.get("LOG_SAMPLING", {}))
 
     # After loading config, get the absolute DB path
     db_uri = app.config.get("SQLALCHEMY_DATABASE_URI")
@@ -229,30 +300,71 @@ def create_app() -> Flask:
     # Initialize extensions
     extensions.init_app(app)
     app.socketio = extensions.socketio # Make socketio accessible via app.socketio
+    # Request, query and job timings served at /metrics (see metrics.py)
+    metrics.init_app(app)
+    # Sampled request profiles, only with PROFILING_ENABLED (see profiling.py)
+    profiling.init_app(app)
     extensions.migrate.init_app(app, extensions.db)
 
+    # Identities for auto_login_admin and load_user, without a query per
+    # request (see user_cache.py)
+    from models import User
+
+    app.user_cache = UserCache(
+        extensions.db,
+        User,
+        app.config.get("USER_CACHE_SECONDS", USER_CACHE_SECONDS),
+    )
+
     # --- Auto-login feature for admin user ---
     @app.before_request
     def auto_login_admin():
         from flask import request
         from flask_login import current_user, login_user
-        from models import User
+
+        # Ni los archivos estáticos ni el transporte de Socket.IO usan la sesión
+        endpoint = request.endpoint
+        if request.path.startswith("/socket.io/") or (
+            endpoint and (endpoint == "static" or endpoint.endswith(".static"))
+        ):
+            return
 
         # Evitar el auto-login en la ruta de logout para permitir la desconexión
-        if request.endpoint and 'logout' in request.endpoint:
+        if endpoint and 'logout' in endpoint:
             return
 
         if not current_user.is_authenticated:
-            admin_user = User.query.filter_by(username="admin").first()
+            admin_user = app.user_cache.get_by_username("admin")
             if admin_user:
                 login_user(admin_user)
 
     # Store connected agents (this might be better in a dedicated module)
     app.connected_agents = {}
+    # Outgoing chunked file transfers (see file_transfer.py), by transfer_id
+    app.file_transfers = {}
+    # Incoming ones, for files read from agents (see file_fetch.py)
+    app.file_fetcher = FileFetcher(extensions.socketio)
+    # Latest health pushed by enterprise agents (see agent_metrics.py)
+    app.agent_metrics = MetricsStore()
 
     # Initialize Playbook Executor
     app.playbook_executor = PlaybookExecutor(extensions.socketio, app.connected_agents)
 
+    # Snapshots and restores run in native threads (see backup_jobs.py)
+    app.backup_jobs = BackupJobs(extensions.socketio)
+
+    # Initialize MCP delta sync
+    app.mcp_sync = McpSync(
+        extensions.socketio, app.connected_agents, app.file_transfers
+    )
+
+    # Sidecar index of app.log for time and field queries (see log_index.py)
+    app.log_index = LogIndex(
+        log_file_path, os.path.join(app.instance_path, "app.log.index.sqlite")
+    )
+    # Live tail of app.log for the log viewer
+    extensions.socketio.on_namespace(LogTailNamespace("/logs", log_file_path))
+
     # Register the agent Socket.IO namespace
     # register_agent_namespace(extensions.socketio, app.playbook_executor)
 
@@ -348,122 +460,42 @@ def create_app() -> Flask:
     app.cli.add_command(seed_db)
     app.cli.add_command(reset_admin_password)
 
+    # Built once, with its URLs resolved, on the first render (see menu.py)
+    app.menu_cache = MenuCache()
+
     @app.context_processor
     def inject_menu():
-        """Injects the dynamic menu structure into all templates."""
-        main_menu = [
-            {
-                "type": "link",
-                "name": "Resumen",
-                "url": "dashboard",
-                "icon": "bi-house-door-fill",
-            },
-            {
-                "type": "submenu",
-                "name": "Gestión",
-                "id": "gestion-submenu",
-                "icon": "bi-kanban-fill",
-                "items": [
-                    {
-                        "name": "Proyectos",
-                        "url": "projects.projects_manager",
-                        "icon": "bi-folder-check",
-                    },
-                    {
-                        "name": "Tareas",
-                        "url": "tasks.tasks_manager",
-                        "icon": "bi-list-check",
-                    },
-                    {"name": "MCPs", "url": "mcp.mcp_manager", "icon": "bi-tools"},
-                ],
-            },
-            {
-                "type": "submenu",
-                "name": "IA Tools",
-                "id": "ia-tools-submenu",
-                "icon": "bi-robot",
-                "items": [
-                    {
-                        "name": "Laboratorio 3D",
-                        "url": "threed_lab.lab",
-                        "icon": "bi-box-fill",
-                    },
-                    {
-                        "name": "Galería de Modelos",
-                        "url": "threed_lab.gallery",
-                        "icon": "bi-collection-fill",
-                    },
-                    {
-                        "name": "Visor AR",
-                        "url": "ar_viewer",
-                        "icon": "bi-badge-ar-fill",
-                    },
-                    {
-                        "name": "Estudio Culinario",
-                        "url": "culinary_studio.studio_page",
-                        "icon": "bi-image-fill",
-                    },
-                    {
-                        "name": "Carga de Material",
-                        "url": "threed_lab.upload",
-                        "icon": "bi-cloud-arrow-up-fill",
-                    }
-                ],
-            },
-            {
-                "type": "submenu",
-                "name": "SYSTEM",
-                "id": "system-submenu",
-                "icon": "bi-hdd-stack-fill",
-                "items": [
-                    {
-                        "name": "Ejecución Local",
-                        "url": "local_execution.execution_page",
-                        "icon": "bi-terminal-fill",
-                    },
-                    {
-                        "name": "Notificaciones Termux",
-                        "url": "notifications.termux_notify",
-                        "icon": "bi-phone-vibrate-fill",
-                    },
-                    {
-                        "name": "Ajustes",
-                        "url": "settings.settings_manager",
-                        "icon": "bi-gear-wide-connected",
-                    },
-                    {
-                        "name": "Gestor de Secretos",
-                        "url": "vault.vault_manager",
-                        "icon": "bi-key-fill",
-                    },
-                    {
-                        "name": "Copias de Seguridad",
-                        "url": "system.backup_page",
-                        "icon": "bi-database-down",
-                    },
-                    {
-                        "name": "Visor de Logs",
-                        "url": "logs_viewer",
-                        "icon": "bi-file-earmark-text-fill",
-                    },
-                ],
-            },
-        ]
-        return dict(main_menu=main_menu)
+        """Injects the menu structure into all templates."""
+        return dict(
+            main_menu=app.menu_cache.main_menu(),
+            cached_fragment=app.menu_cache.cached_fragment,
+        )
 
     @app.route("/logs_viewer")
     def logs_viewer():
-        import os
+        from flask import render_template
+        return render_template("logs_viewer.html")
 
-        from flask import current_app, render_template
-        log_file_path = os.path.join(current_app.instance_path, 'app.log')
-        log_content = "No se pudo leer el archivo de logs."
+    @app.route("/logs_viewer/records")
+    def logs_viewer_records():
+        """Log records before ``cursor``, filtered by level, event or agent_id."""
+        from flask import current_app, request
+        from log_index import query_page
+        from log_viewer import MAX_PAGE_LINES, clean_filters
+
+        limit = min(request.args.get("limit", 200, type=int), MAX_PAGE_LINES)
         try:
-            with open(log_file_path, 'r', encoding='utf-8') as f:
-                log_content = f.read()
-        except Exception as e:
-            current_app.logger.error(f"Error al leer el archivo de logs: {e}")
-        return render_template("logs_viewer.html", log_content=log_content)
+            page = query_page(
+                current_app.log_index,
+                cursor=request.args.get("cursor"),
+                limit=max(limit, 1),
+                filters=clean_filters(request.args),
+                since=request.args.get("since"),
+                until=request.args.get("until"),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(page)
 
     @app.route("/ar_viewer")
     def ar_viewer():
@@ -552,6 +584,37 @@ def create_app() -> Flask:
                 seconds=30,
                 replace_existing=True
             )
+        if not extensions.scheduler.get_job('log_index_job'):
+            extensions.scheduler.add_job(
+                id='log_index_job',
+                func='app:update_log_index',
+                trigger='interval',
+                seconds=5,
+                replace_existing=True
+            )
+        if not extensions.scheduler.get_job('backup_snapshot_job'):
+            extensions.scheduler.add_job(
+                id='backup_snapshot_job',
+                func='app:create_backup_snapshot',
+                trigger='interval',
+                hours=app.config.get("BACKUP_SNAPSHOT_INTERVAL_HOURS", 24),
+                replace_existing=True
+            )
+        if not extensions.scheduler.get_job('agent_metrics_flush_job'):
+            extensions.scheduler.add_job(
+                id='agent_metrics_flush_job',
+                func='app:flush_agent_metrics',
+                trigger='interval',
+                seconds=10,
+                replace_existing=True
+            )
+
+    # Auto-reload in development; with PRODUCTION, templates are compiled at
+    # startup into a bytecode cache instead (see templating.py)
+    templating.init_app(app)
+    # Fingerprinted, precompressed static files from `flask build-static`
+    # (see static_assets.py)
+    static_assets.init_app(app)
 
     return app
 
@@ -560,5 +623,9 @@ if __name__ == "__main__":
     app = create_app()
     # Disable the reloader permanently as it's incompatible with the environment
     extensions.socketio.run(
-        app, host="0.0.0.0", port=5000, debug=True, use_reloader=False
+        app,
+        host="0.0.0.0",
+        port=5000,
+        debug=not app.config.get("PRODUCTION", False),
+        use_reloader=False,
     )
@@ -0,0 +1,136 @@
+"""
+Backup work run off the eventlet hub.
+
+Creating or restoring a snapshot chunks, hashes and compresses every file in
+pure Python. In a green thread that would stall every request and Socket.IO
+connection for as long as it runs, so the work goes to eventlet's pool of
+native threads (``tpool``). The endpoints answer with 202 and a ``BackupJobs``
+entry whose progress is pushed to the page as ``backup_job_progress`` events;
+the scheduled snapshot simply waits on ``run_off_hub``.
+
+Work running in a native thread must not use green primitives: the locks it
+takes come from the unpatched ``threading`` module, and it never emits
+Socket.IO events itself. It only records its progress in the job, which a
+green thread watches and emits.
+"""
+
+import logging
+import time
+import uuid
+
+try:
+    from eventlet import tpool
+except ImportError:
+    tpool = None
+
+# Finished jobs kept for their status to be read, oldest dropped first
+MAX_FINISHED_JOBS = 20
+# Seconds between checks for new progress to emit while a job runs
+PROGRESS_INTERVAL = 0.5
+
+log = logging.getLogger(__name__)
+
+
+def run_off_hub(func, *args):
+    """Calls ``func(*args)`` in a native thread, blocking only this green thread."""
+    if tpool is None:
+        return func(*args)
+    return tpool.execute(func, *args)
+
+
+def _progress(job):
+    return job["stage"], job["done"], job["total"]
+
+
+class BackupJobs:
+    """Backup and restore jobs of this process, by id."""
+
+    def __init__(
+        self,
+        socketio,
+        max_finished=MAX_FINISHED_JOBS,
+        progress_interval=PROGRESS_INTERVAL,
+    ):
+        self.socketio = socketio
+        self.max_finished = max_finished
+        self.progress_interval = progress_interval
+        self._jobs = {}  # id -> job, in start order
+        self._announced = set()  # Finished jobs already returned by pop_finished
+
+    def start(self, kind, work, error_prefix):
+        """
+        Runs ``work(report)`` in the background and returns the new job.
+        ``report(stage, done, total)`` updates the job's progress and ``work``
+        returns the message shown when it is done. If it raises, the job
+        fails with ``"<error_prefix>: <error>"``.
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "running",
+            "stage": None,
+            "done": 0,
+            "total": 0,
+            "message": None,
+            "started_at": time.time(),
+            "finished_at": None,
+        }
+        self._jobs[job["id"]] = job
+        self.socketio.start_background_task(self._run, job, work, error_prefix)
+        return dict(job)
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return None if job is None else dict(job)
+
+    def running(self):
+        return [dict(job) for job in self._jobs.values() if job["status"] == "running"]
+
+    def pop_finished(self):
+        """Finished jobs not returned by an earlier call, to show their messages."""
+        jobs = [
+            job
+            for job in self._jobs.values()
+            if job["status"] != "running" and job["id"] not in self._announced
+        ]
+        self._announced.update(job["id"] for job in jobs)
+        return [dict(job) for job in jobs]
+
+    def _run(self, job, work, error_prefix):
+        def report(stage, done, total):
+            job.update(stage=stage, done=done, total=total)
+
+        self.socketio.start_background_task(self._watch, job, self._emit(job))
+        try:
+            message = run_off_hub(work, report)
+        except Exception as e:
+            log.exception("Backup job %s (%s) failed", job["id"], job["kind"])
+            job.update(status="error", message=f"{error_prefix}: {e}")
+        else:
+            job.update(status="done", message=message)
+        job["finished_at"] = time.time()
+        self._emit(job)
+        self._forget_old()
+
+    def _watch(self, job, last):
+        """Emits the progress ``report`` records from the native thread."""
+        while True:
+            self.socketio.sleep(self.progress_interval)
+            if job["status"] != "running":
+                return
+            if _progress(job) != last:
+                last = self._emit(job)
+
+    def _emit(self, job):
+        """Sends the job to the pages and returns the progress it sent."""
+        job = dict(job)
+        self.socketio.emit("backup_job_progress", job)
+        return _progress(job)
+
+    def _forget_old(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items() if job["status"] != "running"
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+            self._announced.discard(job_id)
@@ -0,0 +1,349 @@
+"""
+Local, deduplicating backup repository.
+
+Files are split with content-defined chunking (a gear rolling hash, as in
+FastCDC), so an edit only changes the chunks around it and identical data is
+stored once no matter which file or snapshot it belongs to. Layout::
+
+    <repo>/chunks/ab/abcdef...    zlib-compressed chunk, named by its SHA-256
+    <repo>/snapshots/<id>.json    snapshot manifest: files and their chunk ids
+
+Snapshots are pruned with a keep-daily / keep-weekly policy and chunks no
+longer referenced by any snapshot are then garbage collected.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zipfile
+import zlib
+from datetime import datetime, timezone
+
+from backup_stream import BACKUP_STATE_DIR, StreamSink, iter_backup_files
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+if patcher is not None:
+    _threading = patcher.original("threading")
+else:
+    import threading as _threading
+
+REPOSITORY_DIR = "repository"  # Inside BACKUP_STATE_DIR
+DEFAULT_KEEP_DAILY = 7
+DEFAULT_KEEP_WEEKLY = 4
+
+MIN_CHUNK_SIZE = 16 * 1024
+AVG_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+# A cut point is where the low bits of the rolling hash are all zero
+_CUT_MASK = AVG_CHUNK_SIZE - 1
+_HASH_MASK = (1 << 64) - 1
+# 256 fixed pseudo-random 64-bit values; must never change or dedup is lost
+_GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big") for i in range(256)
+]
+
+# Snapshot creation and pruning must not interleave: garbage collection would
+# delete chunks a snapshot in progress has already referenced. Both run in
+# native threads (see backup_jobs.py), hence a native lock
+_repository_lock = _threading.Lock()
+
+
+class RepositoryError(Exception):
+    """Raised for missing snapshots or chunks that fail verification."""
+
+
+def find_cut(data, start, end):
+    """
+    Returns the offset where the chunk starting at ``start`` ends, looking no
+    further than ``end``. Bytes before ``MIN_CHUNK_SIZE`` are skipped since a
+    64-bit gear hash only depends on the last 64 bytes anyway.
+    """
+    limit = min(end, start + MAX_CHUNK_SIZE)
+    if limit - start <= MIN_CHUNK_SIZE:
+        return limit
+    gear = _GEAR
+    h = 0
+    for i in range(start + MIN_CHUNK_SIZE - 64, limit):
+        h = ((h << 1) + gear[data[i]]) & _HASH_MASK
+        if not h & _CUT_MASK and i >= start + MIN_CHUNK_SIZE:
+            return i + 1
+    return limit
+
+
+def iter_chunks(f):
+    """Yields the content-defined chunks of a binary file object."""
+    buffer = b""
+    pos = 0
+    eof = False
+    while True:
+        # Keep at least one maximum-size chunk ahead so cut points don't
+        # depend on how the file happened to be read
+        if not eof and len(buffer) - pos < MAX_CHUNK_SIZE:
+            block = f.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer = buffer[pos:] + block
+            pos = 0
+            continue
+        if pos >= len(buffer):
+            return
+        cut = find_cut(buffer, pos, len(buffer))
+        yield buffer[pos:cut]
+        pos = cut
+
+
+def _snapshot_time(snapshot):
+    return datetime.fromtimestamp(snapshot["created_at"], timezone.utc)
+
+
+class BackupRepository:
+    """Stores snapshots of the dashboard data as deduplicated chunks."""
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks_dir = os.path.join(path, "chunks")
+        self.snapshots_dir = os.path.join(path, "snapshots")
+
+    # --- Chunks ---
+
+    def _chunk_path(self, chunk_id):
+        return os.path.join(self.chunks_dir, chunk_id[:2], chunk_id)
+
+    def _store_chunk(self, data):
+        """Stores ``data`` unless already present. Returns (id, bytes written)."""
+        chunk_id = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(chunk_id)
+        if os.path.exists(path):
+            return chunk_id, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return chunk_id, len(compressed)
+
+    def read_chunk(self, chunk_id):
+        try:
+            with open(self._chunk_path(chunk_id), "rb") as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            raise RepositoryError(f"Chunk {chunk_id} is missing or corrupt: {e}")
+        if hashlib.sha256(data).hexdigest() != chunk_id:
+            raise RepositoryError(f"Chunk {chunk_id} failed verification.")
+        return data
+
+    # --- Snapshots ---
+
+    def list_snapshots(self):
+        """Snapshots, newest first."""
+        snapshots = []
+        if not os.path.isdir(self.snapshots_dir):
+            return snapshots
+        for name in os.listdir(self.snapshots_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(self.snapshots_dir, name), "r") as f:
+                    snapshots.append(json.load(f))
+        snapshots.sort(key=lambda s: s["created_at"], reverse=True)
+        return snapshots
+
+    def load_snapshot(self, snapshot_id):
+        name = f"{os.path.basename(snapshot_id)}.json"
+        path = os.path.join(self.snapshots_dir, name)
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise RepositoryError(f"Snapshot {snapshot_id} does not exist.")
+
+    def create_snapshot(self, base_path):
+        """
+        Records the current state of the dashboard data. Files whose mtime and
+        size match the latest snapshot reuse its chunk list without being read.
+        """
+        with _repository_lock:
+            return self._create_snapshot(base_path)
+
+    def _create_snapshot(self, base_path):
+        latest = self.list_snapshots()
+        previous_files = latest[0]["files"] if latest else {}
+        created_at = time.time()
+        snapshot_id = datetime.fromtimestamp(created_at, timezone.utc).strftime(
+            "%Y%m%dT%H%M%S%fZ"
+        )
+        files = {}
+        stats = {"files": 0, "bytes": 0, "new_chunks": 0, "stored_bytes": 0}
+
+        for path, arcname, st in iter_backup_files(base_path):
+            old = previous_files.get(arcname)
+            if old and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+                files[arcname] = old
+            else:
+                digest = hashlib.sha256()
+                chunk_ids = []
+                try:
+                    with open(path, "rb") as f:
+                        for chunk in iter_chunks(f):
+                            digest.update(chunk)
+                            chunk_id, written = self._store_chunk(chunk)
+                            chunk_ids.append(chunk_id)
+                            if written:
+                                stats["new_chunks"] += 1
+                                stats["stored_bytes"] += written
+                except OSError:
+                    continue  # Vanished or unreadable
+                files[arcname] = {
+                    "mtime": st.st_mtime,
+                    "size": st.st_size,
+                    "sha256": digest.hexdigest(),
+                    "chunks": chunk_ids,
+                }
+            stats["files"] += 1
+            stats["bytes"] += st.st_size
+
+        snapshot = {
+            "id": snapshot_id,
+            "created_at": created_at,
+            "files": files,
+            "stats": stats,
+        }
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        path = os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(f"{path}.tmp", path)
+        return snapshot
+
+    def iter_file(self, entry):
+        """Yields the content of a snapshot file entry, chunk by chunk."""
+        for chunk_id in entry["chunks"]:
+            yield self.read_chunk(chunk_id)
+
+    def restore(self, snapshot_id, target_dir, on_progress=None):
+        """
+        Rebuilds every file of a snapshot under ``target_dir``, calling
+        ``on_progress(nbytes)`` after each chunk written.
+        """
+        snapshot = self.load_snapshot(snapshot_id)
+        for arcname, entry in snapshot["files"].items():
+            path = os.path.join(target_dir, *arcname.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            digest = hashlib.sha256()
+            with open(path, "wb") as f:
+                for data in self.iter_file(entry):
+                    digest.update(data)
+                    f.write(data)
+                    if on_progress:
+                        on_progress(len(data))
+            if digest.hexdigest() != entry["sha256"]:
+                raise RepositoryError(f"{arcname} does not match the snapshot.")
+            os.utime(path, (entry["mtime"], entry["mtime"]))
+        return snapshot
+
+    def stream_zip(self, snapshot_id):
+        """Generates a snapshot as a ZIP backup, in the format of backup_stream."""
+        snapshot = self.load_snapshot(snapshot_id)
+        sink = StreamSink()
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for arcname, entry in snapshot["files"].items():
+                date_time = max(time.localtime(entry["mtime"])[:6], (1980, 1, 1))
+                info = zipfile.ZipInfo(arcname, date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.file_size = entry["size"]
+                with zf.open(info, "w") as dest:
+                    for data in self.iter_file(entry):
+                        dest.write(data)
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            manifest = {
+                "created_at": snapshot["created_at"],
+                "type": "full",
+                "base_created_at": None,
+                "files": {
+                    name: {k: e[k] for k in ("mtime", "size", "sha256")}
+                    for name, e in snapshot["files"].items()
+                },
+                "deleted": [],
+            }
+            zf.writestr("backup_manifest.json", json.dumps(manifest, indent=2))
+        yield sink.drain()
+
+    # --- Retention ---
+
+    def select_kept(self, snapshots, keep_daily, keep_weekly, keep_last=1):
+        """
+        Ids of the snapshots to keep: the newest ``keep_last``, plus the newest
+        snapshot of each of the last ``keep_daily`` days and ``keep_weekly``
+        ISO weeks that have one.
+        """
+        kept = {s["id"] for s in snapshots[:keep_last]}
+        for count, period in (
+            (keep_daily, lambda t: t.date()),
+            (keep_weekly, lambda t: t.isocalendar()[:2]),
+        ):
+            seen = set()
+            for snapshot in snapshots:
+                key = period(_snapshot_time(snapshot))
+                if key in seen:
+                    continue
+                if len(seen) >= count:
+                    break
+                seen.add(key)
+                kept.add(snapshot["id"])
+        return kept
+
+    def prune(self, keep_daily=7, keep_weekly=4, keep_last=1):
+        """
+        Deletes the snapshots outside the retention policy and the chunks only
+        they referenced. Returns ``(snapshots removed, chunks removed)``.
+        """
+        with _repository_lock:
+            snapshots = self.list_snapshots()
+            kept = self.select_kept(snapshots, keep_daily, keep_weekly, keep_last)
+            removed = 0
+            for snapshot in snapshots:
+                if snapshot["id"] not in kept:
+                    name = f"{snapshot['id']}.json"
+                    os.remove(os.path.join(self.snapshots_dir, name))
+                    removed += 1
+            return removed, self._collect_garbage()
+
+    def _collect_garbage(self):
+        live = set()
+        for snapshot in self.list_snapshots():
+            for entry in snapshot["files"].values():
+                live.update(entry["chunks"])
+        removed = 0
+        if not os.path.isdir(self.chunks_dir):
+            return removed
+        for prefix in os.listdir(self.chunks_dir):
+            prefix_dir = os.path.join(self.chunks_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if name not in live:
+                    os.remove(os.path.join(prefix_dir, name))
+                    removed += 1
+        return removed
+
+
+def open_repository(app):
+    return BackupRepository(
+        os.path.join(app.root_path, BACKUP_STATE_DIR, REPOSITORY_DIR)
+    )
+
+
+def snapshot_and_prune(app):
+    """Creates a snapshot and applies the retention configured for ``app``."""
+    repository = open_repository(app)
+    snapshot = repository.create_snapshot(app.root_path)
+    removed = repository.prune(
+        keep_daily=app.config.get("BACKUP_KEEP_DAILY", DEFAULT_KEEP_DAILY),
+        keep_weekly=app.config.get("BACKUP_KEEP_WEEKLY", DEFAULT_KEEP_WEEKLY),
+    )
+    return snapshot, removed
@@ -0,0 +1,244 @@
+"""
+Staged, validated restores of the dashboard data.
+
+A backup is never extracted over the live data. Its entries are streamed into
+a staging directory and checked against the SHA-256 recorded in
+``backup_manifest.json``; files an incremental backup left out are taken from
+the live tree, which must still match the manifest. Only when the staged tree
+is complete are the data roots swapped in with ``os.rename`` (the staging
+directory lives in ``BACKUP_STATE_DIR``, on the same filesystem). The
+replaced data is kept in ``BACKUP_STATE_DIR/pre_restore`` until the next
+restore.
+
+The JSON stores are read from disk on every request, so the restored data is
+served right away without restarting the server.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+
+from backup_stream import (
+    BACKUP_ROOTS,
+    BACKUP_STATE_DIR,
+    MANIFEST_NAME,
+    READ_BLOCK_SIZE,
+    file_sha256,
+)
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+if patcher is not None:
+    _threading = patcher.original("threading")
+else:
+    import threading as _threading
+
+STAGING_DIR = "restore_staging"
+PREVIOUS_DIR = "pre_restore"
+PROGRESS_INTERVAL = 0.5  # Seconds between progress reports while staging
+
+# Restores run in native threads (see backup_jobs.py), hence a native lock
+_restore_lock = _threading.Lock()
+
+
+class RestoreError(Exception):
+    """Raised when a backup is invalid or does not match its manifest."""
+
+
+class RestoreProgress:
+    """
+    Reports progress through ``callback(stage, done, total)``: once when a
+    stage starts and at most every ``PROGRESS_INTERVAL`` seconds within it.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self._last_report = 0.0
+
+    def start(self, stage, total=0):
+        self.stage = stage
+        self.done = 0
+        self.total = total
+        self._report()
+
+    def advance(self, nbytes):
+        self.done += nbytes
+        if time.monotonic() - self._last_report >= PROGRESS_INTERVAL:
+            self._report()
+
+    def _report(self):
+        self._last_report = time.monotonic()
+        if self.callback:
+            self.callback(self.stage, self.done, self.total)
+
+
+def _entry_path(staging_dir, name):
+    """
+    Where archive entry ``name`` is staged, or None for entries outside the
+    data roots. Entries escaping the staging directory are rejected.
+    """
+    parts = name.split("/")
+    if name.startswith("/") or ".." in parts:
+        raise RestoreError(f"Unsafe path in archive: {name}")
+    if parts[0] not in BACKUP_ROOTS or name.endswith("/"):
+        return None
+    return os.path.join(staging_dir, *parts)
+
+
+def _read_manifest(zf):
+    try:
+        return json.loads(zf.read(MANIFEST_NAME))
+    except KeyError:
+        return None  # Backup made before manifests existed
+    except ValueError as e:
+        raise RestoreError(f"Invalid {MANIFEST_NAME}: {e}")
+
+
+def stage_archive(fileobj, base_path, staging_dir, progress):
+    """
+    Stages the state described by a backup archive in ``staging_dir``.
+
+    With a manifest, the staged tree holds exactly the files it lists: every
+    data root is staged (possibly empty) and replaces the live one. Archives
+    without a manifest can only be checked against their CRCs and only the
+    roots they contain are replaced.
+    """
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise RestoreError(f"Not a valid ZIP archive: {e}")
+
+    with zf:
+        manifest = _read_manifest(zf)
+        expected = manifest["files"] if manifest else {}
+        members = [
+            (info, path)
+            for info in zf.infolist()
+            if (path := _entry_path(staging_dir, info.filename))
+        ]
+        progress.start("staging", sum(info.file_size for info, _ in members))
+
+        staged = set()
+        for info, path in members:
+            entry = expected.get(info.filename)
+            if manifest and entry is None:
+                raise RestoreError(f"{info.filename} is not in the manifest.")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            digest = hashlib.sha256()
+            try:
+                with zf.open(info) as src, open(path, "wb") as dest:
+                    for block in iter(lambda: src.read(READ_BLOCK_SIZE), b""):
+                        digest.update(block)
+                        dest.write(block)
+                        progress.advance(len(block))
+            except zipfile.BadZipFile as e:
+                raise RestoreError(f"{info.filename} is corrupt: {e}")
+            if entry:
+                if digest.hexdigest() != entry["sha256"]:
+                    raise RestoreError(f"{info.filename} does not match the manifest.")
+                os.utime(path, (entry["mtime"], entry["mtime"]))
+            staged.add(info.filename)
+
+    if manifest is None:
+        return {"files": len(staged), "validated": False}
+
+    for name, entry in expected.items():
+        if name in staged:
+            continue
+        # Left out of an incremental backup: the live copy must be unchanged
+        source = os.path.join(base_path, *name.split("/"))
+        try:
+            unchanged = file_sha256(source) == entry["sha256"]
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            raise RestoreError(
+                f"{name} is not in the archive and the current copy differs "
+                "from the backup; restore the base backup first."
+            )
+        path = _entry_path(staging_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy2(source, path)
+    for root in BACKUP_ROOTS:
+        os.makedirs(os.path.join(staging_dir, root), exist_ok=True)
+    return {"files": len(expected), "validated": True}
+
+
+def swap_in(base_path, staging_dir, previous_dir):
+    """
+    Replaces each data root with its staged copy. On failure the roots already
+    replaced are moved back, so the live data is never left half restored.
+    """
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    os.makedirs(previous_dir)
+    moved = []
+    try:
+        for root in BACKUP_ROOTS:
+            staged = os.path.join(staging_dir, root)
+            if not os.path.isdir(staged):
+                continue
+            live = os.path.join(base_path, root)
+            moved.append(root)
+            if os.path.exists(live):
+                os.rename(live, os.path.join(previous_dir, root))
+            os.rename(staged, live)
+    except OSError as e:
+        for root in reversed(moved):
+            live = os.path.join(base_path, root)
+            previous = os.path.join(previous_dir, root)
+            if os.path.exists(previous):
+                shutil.rmtree(live, ignore_errors=True)
+                os.rename(previous, live)
+        raise RestoreError(f"Could not swap in the restored data: {e}")
+
+
+def _staged_restore(base_path, stage, progress):
+    if not _restore_lock.acquire(blocking=False):
+        raise RestoreError("Another restore is already running.")
+    state_dir = os.path.join(base_path, BACKUP_STATE_DIR)
+    staging_dir = os.path.join(state_dir, STAGING_DIR)
+    try:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        summary = stage(staging_dir)
+        progress.start("swapping")
+        swap_in(base_path, staging_dir, os.path.join(state_dir, PREVIOUS_DIR))
+        progress.start("done", summary["files"])
+        return summary
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        _restore_lock.release()
+
+
+def restore_archive(fileobj, base_path, progress=None):
+    """Restores a ZIP backup (a seekable file object) into ``base_path``."""
+    progress = progress or RestoreProgress()
+    return _staged_restore(
+        base_path,
+        lambda staging_dir: stage_archive(fileobj, base_path, staging_dir, progress),
+        progress,
+    )
+
+
+def restore_snapshot(repository, snapshot_id, base_path, progress=None):
+    """Restores a snapshot of a ``BackupRepository`` into ``base_path``."""
+    progress = progress or RestoreProgress()
+    snapshot = repository.load_snapshot(snapshot_id)
+
+    def stage(staging_dir):
+        progress.start("staging", snapshot["stats"]["bytes"])
+        repository.restore(snapshot_id, staging_dir, progress.advance)
+        for root in BACKUP_ROOTS:
+            os.makedirs(os.path.join(staging_dir, root), exist_ok=True)
+        return {"files": len(snapshot["files"]), "validated": True}
+
+    return _staged_restore(base_path, stage, progress)
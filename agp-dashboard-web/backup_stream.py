@@ -0,0 +1,152 @@
+"""
+Streamed ZIP backups of the dashboard data.
+
+The archive is generated while it is being sent: ``zipfile`` writes into a
+sink that is drained after every block, so the first bytes reach the browser
+as soon as the first file is being compressed and memory use stays constant.
+
+Every backup carries a ``backup_manifest.json`` with the ``mtime``, ``size``
+and ``sha256`` of all the files it covers. The manifest of the last completed
+backup is kept in ``BACKUP_STATE_DIR`` so that an incremental backup only
+includes files whose content changed since then (files with the same mtime
+and size are trusted without being re-read).
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+
+BACKUP_ROOTS = ("instance", "playbooks")
+BACKUP_STATE_DIR = "backups"
+MANIFEST_NAME = "backup_manifest.json"
+LAST_MANIFEST_FILE = "last_manifest.json"
+READ_BLOCK_SIZE = 256 * 1024
+
+
+class StreamSink(io.RawIOBase):
+    """Write-only, unseekable file collecting what ``zipfile`` writes."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_backup_files(base_path, roots=BACKUP_ROOTS):
+    """Yields ``(path, arcname, stat)`` for every file under ``roots``."""
+    for root in roots:
+        root_path = os.path.join(base_path, root)
+        for dirpath, dirnames, filenames in os.walk(root_path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                arcname = os.path.relpath(path, base_path).replace(os.sep, "/")
+                try:
+                    yield path, arcname, os.stat(path)
+                except OSError:
+                    continue  # Removed while walking
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_last_manifest(state_dir):
+    try:
+        with open(os.path.join(state_dir, LAST_MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_last_manifest(state_dir, manifest):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, LAST_MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def stream_backup(base_path, incremental=False, state_dir=None):
+    """
+    Generates a ZIP backup of ``base_path`` chunk by chunk.
+
+    With ``incremental`` and a previous manifest, unchanged files are left out
+    and the manifest lists the files deleted since. The stored manifest is only
+    replaced once the whole archive has been produced, so an aborted download
+    does not become the base of the next incremental backup.
+    """
+    state_dir = state_dir or os.path.join(base_path, BACKUP_STATE_DIR)
+    previous = load_last_manifest(state_dir) if incremental else None
+    previous_files = previous["files"] if previous else {}
+    files = {}
+
+    sink = StreamSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path, arcname, st in iter_backup_files(base_path):
+            entry = {"mtime": st.st_mtime, "size": st.st_size}
+            old = previous_files.get(arcname)
+            if old and old["mtime"] == entry["mtime"] and old["size"] == entry["size"]:
+                files[arcname] = dict(entry, sha256=old["sha256"])
+                continue
+            if old and old["size"] == entry["size"]:
+                # Touched but maybe not modified: compare content before sending
+                sha256 = file_sha256(path)
+                if sha256 == old["sha256"]:
+                    files[arcname] = dict(entry, sha256=sha256)
+                    continue
+
+            digest = hashlib.sha256()
+            try:
+                info = zipfile.ZipInfo.from_file(
+                    path, arcname, strict_timestamps=False
+                )
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, "rb") as src, zf.open(info, "w") as dest:
+                    for block in iter(lambda: src.read(READ_BLOCK_SIZE), b""):
+                        digest.update(block)
+                        dest.write(block)
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            except OSError:
+                continue  # Vanished or unreadable: not part of this backup
+            files[arcname] = dict(entry, sha256=digest.hexdigest(), included=True)
+
+        manifest = {
+            "created_at": time.time(),
+            "type": "incremental" if previous else "full",
+            "base_created_at": previous["created_at"] if previous else None,
+            "files": files,
+            "deleted": sorted(set(previous_files) - set(files)),
+        }
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    yield sink.drain()
+
+    # "included" only describes this archive, not the state to compare against
+    for entry in files.values():
+        entry.pop("included", None)
+    save_last_manifest(state_dir, manifest)
@@ -10,4 +10,4 @@ api_v1_bp = Blueprint(
 
 # Import the endpoint modules here to register their routes.
 # We will add them as we build them.
-from . import tasks
+from . import agents, tasks
@@ -0,0 +1,136 @@
+from extensions import db
+from flask import current_app, jsonify, request
+from models import Agent, AutomationLog
+
+from . import api_v1_bp
+
+
+def _lookup_api_key(agent_id):
+    agent = Agent.query.filter_by(agent_id=agent_id).first()
+    return agent.api_key if agent else None
+
+
+def _authorized(agent_id):
+    """Checks the request's bearer token against the agent's API key."""
+    auth = request.headers.get('Authorization', '')
+    token = auth[len('Bearer '):] if auth.startswith('Bearer ') else None
+    return current_app.agent_metrics.authorize(agent_id, token, _lookup_api_key)
+
+
+@api_v1_bp.route('/agents/report_metrics', methods=['POST'])
+def report_metrics():
+    """Receives a batch of delta-encoded health samples from an agent.
+
+    Samples are only folded into memory here; ``flush_agent_metrics`` writes
+    them to the database periodically.
+    """
+    payload = request.get_json(silent=True) or {}
+    agent_id = payload.get('agent_id')
+    samples = payload.get('samples')
+    if not agent_id or not isinstance(samples, list):
+        return jsonify({"error": "agent_id and samples are required"}), 400
+
+    if not _authorized(agent_id):
+        return jsonify({"error": "Invalid or missing token"}), 401
+
+    resync = current_app.agent_metrics.ingest(agent_id, samples)
+    return jsonify({"message": "Metrics received", "resync": resync})
+
+
+@api_v1_bp.route('/agents/report_results', methods=['POST'])
+def report_results():
+    """Stores a batch of final task results from an agent.
+
+    The agent retries a batch until it is acknowledged, so a result may
+    arrive more than once: results whose ``task_id`` is already logged for
+    the agent are acknowledged without being stored again.
+    """
+    payload = request.get_json(silent=True) or {}
+    agent_id = payload.get('agent_id')
+    results = payload.get('results')
+    if not agent_id or not isinstance(results, list):
+        return jsonify({"error": "agent_id and results are required"}), 400
+    if not all(
+        isinstance(result, dict) and result.get('task_id') and result.get('status')
+        for result in results
+    ):
+        return jsonify({"error": "Every result needs a task_id and a status"}), 400
+
+    if not _authorized(agent_id):
+        return jsonify({"error": "Invalid or missing token"}), 401
+
+    task_ids = {result['task_id'] for result in results}
+    seen = {
+        task_id
+        for (task_id,) in db.session.query(AutomationLog.task_id).filter(
+            AutomationLog.agent_id == agent_id, AutomationLog.task_id.in_(task_ids)
+        )
+    }
+    stored = []
+    for result in results:
+        if result['task_id'] in seen:
+            continue
+        seen.add(result['task_id'])
+        output = result.get('output') or ''
+        if result.get('error'):
+            output = f"{output}\n{result['error']}" if output else result['error']
+        db.session.add(
+            AutomationLog(
+                task_id=result['task_id'],
+                agent_id=agent_id,
+                type='task',
+                name=result.get('name', 'Enterprise Task'),
+                status=result['status'],
+                output=output,
+            )
+        )
+        stored.append(result)
+    db.session.commit()
+
+    for result in stored:
+        current_app.socketio.emit(
+            'task_result',
+            {
+                'agent_id': agent_id,
+                'task_id': result['task_id'],
+                'status': result['status'],
+                'error': result.get('error'),
+            },
+            namespace='/agent',
+        )
+    return jsonify(
+        {
+            "message": "Results received",
+            "stored": len(stored),
+            "duplicates": len(results) - len(stored),
+        }
+    )
+
+
+@api_v1_bp.route('/agents/report_progress', methods=['POST'])
+def report_progress():
+    """Relays a batch of output from a running task to the browsers.
+
+    Batches carry a ``seq`` number per task so the UI can put them in order.
+    """
+    payload = request.get_json(silent=True) or {}
+    agent_id = payload.get('agent_id')
+    task_id = payload.get('task_id')
+    chunks = payload.get('chunks')
+    if not agent_id or not task_id or not isinstance(chunks, list):
+        return jsonify({"error": "agent_id, task_id and chunks are required"}), 400
+
+    if not _authorized(agent_id):
+        return jsonify({"error": "Invalid or missing token"}), 401
+
+    current_app.socketio.emit(
+        'task_progress',
+        {
+            'agent_id': agent_id,
+            'task_id': task_id,
+            'seq': payload.get('seq'),
+            'chunks': chunks,
+        },
+        namespace='/agent',
+    )
+    return jsonify({"message": "Progress received"})
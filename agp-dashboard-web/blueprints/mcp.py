@@ -1,8 +1,8 @@
-import base64
 import os
 import re
 import uuid
 
+from delta_sync import REMOTE_MCPS_DIR
 from flask import (
     Blueprint,
     current_app,
@@ -19,7 +19,7 @@ mcp_bp = Blueprint("mcp", __name__)
 # Define paths locally
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CUSTOM_TOOLS_DIR = os.path.join(BASE_DIR, "..", "instance", "custom_tools")
-AGENT_REMOTE_MCPS_DIR = os.path.join(BASE_DIR, "..", "instance", "remote_mcps")
+AGENT_REMOTE_MCPS_DIR = REMOTE_MCPS_DIR
 
 
 def _get_custom_tools_data():
@@ -289,23 +289,15 @@ def send_mcp_to_agent(agent_id, mcp_name):
         return redirect(url_for("mcp.mcp_manager"))
 
     try:
-        with open(mcp_file_path, "rb") as f:
-            file_content = f.read()
-        file_content_base64 = base64.b64encode(file_content).decode("utf-8")
-
         remote_path = os.path.join(AGENT_REMOTE_MCPS_DIR, mcp_name)
         task_id = str(uuid.uuid4())
 
-        current_app.socketio.emit(
-            "upload_file",
-            {
-                "file_path": remote_path,
-                "file_content_base64": file_content_base64,
-                "task_id": task_id,
-                "description": f"Transferencia de MCP: {mcp_name}",
-            },
-            room=agent_data["sid"],
-            namespace="/agent",
+        current_app.socketio.start_background_task(
+            current_app.mcp_sync.send_file,
+            agent_data["sid"],
+            mcp_file_path,
+            remote_path,
+            task_id,
         )
 
         flash(
@@ -321,6 +313,34 @@ def send_mcp_to_agent(agent_id, mcp_name):
     return redirect(url_for("mcp.mcp_manager"))
 
 
+@mcp_bp.route("/sync_mcp/<mcp_name>", methods=["POST"])
+def sync_mcp(mcp_name):
+    """Sincroniza un MCP con varios agentes enviando solo las diferencias."""
+    mcp_file_path = os.path.join(CUSTOM_TOOLS_DIR, mcp_name)
+    if not os.path.exists(mcp_file_path):
+        flash(f"MCP '{mcp_name}' no encontrado en el servidor del dashboard.", "danger")
+        return redirect(url_for("mcp.mcp_manager"))
+
+    selected = request.form.getlist("agent_ids")
+    agent_sids = [
+        sid
+        for sid, agent_data in current_app.connected_agents.items()
+        if agent_data.get("status") == "online" and (not selected or sid in selected)
+    ]
+    if not agent_sids:
+        flash("No hay agentes conectados para sincronizar.", "warning")
+        return redirect(url_for("mcp.mcp_manager"))
+
+    current_app.socketio.start_background_task(
+        current_app.mcp_sync.push, mcp_file_path, agent_sids
+    )
+    flash(
+        f"Sincronización de '{mcp_name}' iniciada con {len(agent_sids)} agente(s).",
+        "success",
+    )
+    return redirect(url_for("mcp.mcp_manager"))
+
+
 @mcp_bp.route("/install_mcp_dependencies/<agent_id>", methods=["POST"])
 def install_mcp_dependencies(agent_id):
     agent_data = current_app.connected_agents.get(agent_id)
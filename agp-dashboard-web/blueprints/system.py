@@ -1,69 +1,159 @@
-import io
 import os
-import zipfile
+import tempfile
 from datetime import datetime
 
+from backup_repository import (
+    RepositoryError,
+    open_repository,
+    snapshot_and_prune,
+)
+from backup_restore import (
+    RestoreProgress,
+    restore_archive,
+    restore_snapshot,
+)
+from backup_stream import BACKUP_STATE_DIR, stream_backup
 from flask import (
     Blueprint,
+    Response,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
-    send_file,
+    stream_with_context,
     url_for,
 )
+from profiling import delete_profile, flamegraph, list_profiles
 
 system_bp = Blueprint("system", __name__, url_prefix="/system")
 
 
+def _restored_message(summary):
+    if summary["validated"]:
+        return (
+            f"Copia de seguridad restaurada: {summary['files']} archivos verificados."
+        )
+    return (
+        f"Copia de seguridad restaurada: {summary['files']} archivos. "
+        "El archivo no incluía manifiesto, por lo que no se pudo verificar."
+    )
+
+
+def _start_restore(restore):
+    """Ejecuta ``restore(progress)`` en segundo plano y responde 202."""
+
+    def work(report):
+        return _restored_message(restore(RestoreProgress(report)))
+
+    job = current_app.backup_jobs.start(
+        "restore", work, "Ocurrió un error durante la restauración"
+    )
+    return _job_started(job)
+
+
+def _job_started(job):
+    """Responde 202 con el trabajo y la URL donde consultar su progreso."""
+    status_url = url_for(".backup_job", job_id=job["id"])
+    response = jsonify({"job": job, "status_url": status_url})
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
 @system_bp.route("/backup")
 def backup_page():
     """Muestra la página de gestión de copias de seguridad."""
-    return render_template("system/backup.html")
+    jobs = current_app.backup_jobs
+    for job in jobs.pop_finished():
+        flash(job["message"], "success" if job["status"] == "done" else "danger")
+    snapshots = open_repository(current_app).list_snapshots()
+    running = [
+        dict(job, status_url=url_for(".backup_job", job_id=job["id"]))
+        for job in jobs.running()
+    ]
+    return render_template(
+        "system/backup.html", snapshots=snapshots, running_jobs=running
+    )
+
+
+@system_bp.route("/backup/jobs/<job_id>")
+def backup_job(job_id):
+    """Estado y progreso de un trabajo de copia o restauración."""
+    job = current_app.backup_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "El trabajo solicitado no existe."}), 404
+    return jsonify(job)
 
 
 @system_bp.route("/backup/create")
 def create_backup():
-    """Crea un archivo ZIP con los datos importantes y lo envía para descarga."""
-    memory_file = io.BytesIO()
-    base_path = current_app.root_path
-
-    paths_to_backup = {
-        os.path.join(base_path, "instance"): "instance",
-        os.path.join(base_path, "playbooks"): "playbooks",
-    }
-
-    with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as zf:
-        for path, arc_dir in paths_to_backup.items():
-            if not os.path.exists(path):
-                continue
-            if os.path.isfile(path):
-                zf.write(path, os.path.join(arc_dir, os.path.basename(path)))
-            elif os.path.isdir(path):
-                for root, _, files in os.walk(path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        archive_name = os.path.join(
-                            arc_dir, os.path.relpath(file_path, path)
-                        )
-                        zf.write(file_path, archive_name)
-
-    memory_file.seek(0)
+    """
+    Genera un archivo ZIP con los datos importantes y lo envía mientras se
+    comprime. Con ``?mode=incremental`` solo incluye lo que cambió desde la
+    última copia.
+    """
+    incremental = request.args.get("mode") == "incremental"
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"agp_dashboard_backup_{timestamp}.zip"
+    kind = "incremental" if incremental else "full"
+    filename = f"agp_dashboard_backup_{kind}_{timestamp}.zip"
 
-    return send_file(
-        memory_file,
-        download_name=filename,
-        as_attachment=True,
+    return Response(
+        stream_with_context(stream_backup(current_app.root_path, incremental)),
         mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@system_bp.route("/backup/snapshots", methods=["POST"])
+def create_snapshot():
+    """
+    Guarda una instantánea en el repositorio local y aplica la retención, en
+    segundo plano. Responde 202 con el trabajo para seguir su progreso.
+    """
+    app = current_app._get_current_object()
+
+    def work(report):
+        report("snapshot", 0, 0)
+        snapshot, (removed, _) = snapshot_and_prune(app)
+        stats = snapshot["stats"]
+        return (
+            f"Instantánea {snapshot['id']} creada: {stats['files']} archivos, "
+            f"{stats['new_chunks']} bloques nuevos ({stats['stored_bytes']} bytes). "
+            f"{removed} instantáneas antiguas eliminadas."
+        )
+
+    job = current_app.backup_jobs.start(
+        "snapshot", work, "No se pudo crear la instantánea"
+    )
+    return _job_started(job)
+
+
+@system_bp.route("/backup/snapshots/<snapshot_id>/download")
+def download_snapshot(snapshot_id):
+    """Descarga una instantánea del repositorio como archivo ZIP."""
+    repository = open_repository(current_app)
+    try:
+        repository.load_snapshot(snapshot_id)
+    except RepositoryError:
+        flash("La instantánea solicitada no existe.", "danger")
+        return redirect(url_for(".backup_page"))
+
+    filename = f"agp_dashboard_snapshot_{snapshot_id}.zip"
+    return Response(
+        stream_with_context(repository.stream_zip(snapshot_id)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
 @system_bp.route("/backup/restore", methods=["POST"])
 def restore_backup():
-    """Restaura la aplicación desde un archivo de backup."""
+    """
+    Restaura la aplicación desde un archivo de backup, en segundo plano.
+    Responde 202 con el trabajo para seguir su progreso.
+    """
     if "backup_file" not in request.files:
         flash("No se encontró el archivo en la petición.", "danger")
         return redirect(url_for(".backup_page"))
@@ -73,18 +163,59 @@ def restore_backup():
         flash("Por favor, selecciona un archivo .zip válido.", "danger")
         return redirect(url_for(".backup_page"))
 
-    try:
-        base_path = current_app.root_path
-        with zipfile.ZipFile(file, "r") as zf:
-            # Extraer y reemplazar los directorios de datos
-            # ATENCIÓN: Esto es destructivo.
-            zf.extractall(path=base_path)
-
-        flash(
-            "Copia de seguridad restaurada con éxito. Por favor, REINICIA el servidor para aplicar los cambios.",
-            "success",
-        )
-    except Exception as e:
-        flash(f"Ocurrió un error durante la restauración: {e}", "danger")
+    # El archivo se guarda para restaurarlo en segundo plano, después de esta
+    # petición. Se prepara y verifica aparte; los datos actuales solo se
+    # reemplazan cuando todo es correcto
+    root_path = current_app.root_path
+    state_dir = os.path.join(root_path, BACKUP_STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    fd, upload_path = tempfile.mkstemp(prefix="restore_upload_", dir=state_dir)
+    with os.fdopen(fd, "wb") as f:
+        file.save(f)
+
+    def restore(progress):
+        try:
+            with open(upload_path, "rb") as f:
+                return restore_archive(f, root_path, progress)
+        finally:
+            os.remove(upload_path)
+
+    return _start_restore(restore)
+
+
+@system_bp.route("/backup/snapshots/<snapshot_id>/restore", methods=["POST"])
+def restore_from_snapshot(snapshot_id):
+    """Restaura los datos desde una instantánea del repositorio local."""
+    repository = open_repository(current_app)
+    root_path = current_app.root_path
+    return _start_restore(
+        lambda progress: restore_snapshot(repository, snapshot_id, root_path, progress)
+    )
+
+
+@system_bp.route("/profiles")
+def profiles_page():
+    """
+    Lista los endpoints perfilados y muestra el flamegraph agregado del
+    seleccionado con ``?profile=``.
+    """
+    profiles_dir = current_app.config["PROFILES_DIR"]
+    endpoint = request.args.get("profile")
+    tree = flamegraph(profiles_dir, endpoint) if endpoint else None
+    return render_template(
+        "system/profiles.html",
+        profiles=list_profiles(profiles_dir),
+        endpoint=endpoint,
+        tree=tree,
+        enabled=current_app.config.get("PROFILING_ENABLED", False),
+    )
+
 
-    return redirect(url_for(".backup_page"))
+@system_bp.route("/profiles/<profile>/delete", methods=["POST"])
+def delete_endpoint_profile(profile):
+    """Borra las muestras acumuladas de un endpoint."""
+    if delete_profile(current_app.config["PROFILES_DIR"], profile):
+        flash(f"Perfil de {profile} borrado.", "success")
+    else:
+        flash("El perfil solicitado no existe.", "danger")
+    return redirect(url_for(".profiles_page"))
@@ -0,0 +1,194 @@
+"""
+Content-addressed, rsync-style synchronisation of files with agents.
+
+The receiver describes what it already has (a SHA-256 per file and, for files
+that changed, a list of per-block signatures). The sender then transmits only
+what is missing: whole files for new tools and, for changed ones, a delta made
+of references to blocks the receiver already owns plus literal bytes.
+
+A delta is a compact binary string of records:
+
+* ``C`` + ``!II`` (first block index, block count): copy blocks from the old file.
+* ``D`` + ``!I`` (length) + bytes: literal data.
+"""
+
+import hashlib
+import os
+import struct
+
+BLOCK_SIZE = 2048
+# Where agents keep the synchronised MCP tools. agent.py and the dashboard
+# both read this setting, so the paths the dashboard sends match the agent's.
+REMOTE_MCPS_DIR = os.environ.get(
+    "AGP_REMOTE_MCPS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "remote_mcps"),
+)
+_MOD = 65521
+
+_COPY = b"C"
+_DATA = b"D"
+_COPY_RECORD = struct.Struct("!II")
+_DATA_RECORD = struct.Struct("!I")
+
+
+class DeltaError(Exception):
+    """Raised when a delta cannot be applied to the receiver's file."""
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _strong_checksum(block):
+    return hashlib.md5(block, usedforsecurity=False).hexdigest()
+
+
+def _weak_checksum(block):
+    """Adler-style checksum returning ``(a, b)`` so it can be rolled."""
+    a = b = 0
+    length = len(block)
+    for i, byte in enumerate(block):
+        a += byte
+        b += (length - i) * byte
+    return a % _MOD, b % _MOD
+
+
+def _combine(a, b):
+    return a | (b << 16)
+
+
+def directory_manifest(directory):
+    """Returns ``{filename: {"size", "sha256"}}`` for the files in ``directory``."""
+    manifest = {}
+    if not os.path.isdir(directory):
+        return manifest
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.endswith((".part", ".part.json")):
+                continue
+            digest = hashlib.sha256()
+            with open(entry.path, "rb") as f:
+                for block in iter(lambda: f.read(65536), b""):
+                    digest.update(block)
+            manifest[entry.name] = {
+                "size": entry.stat().st_size,
+                "sha256": digest.hexdigest(),
+            }
+    return manifest
+
+
+def block_signatures(path, block_size=BLOCK_SIZE):
+    """Weak and strong checksums of every block of ``path``, read in order."""
+    signatures = []
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            signatures.append(
+                [_combine(*_weak_checksum(block)), _strong_checksum(block)]
+            )
+    return signatures
+
+
+def _encode_literal(out, literal):
+    if literal:
+        out += _DATA + _DATA_RECORD.pack(len(literal)) + literal
+
+
+def compute_delta(data, signatures, block_size=BLOCK_SIZE):
+    """
+    Builds a delta that turns the receiver's file (described by
+    ``signatures``) into ``data``.
+
+    Blocks are matched at any offset using a rolling weak checksum and
+    confirmed with the strong checksum, as rsync does. Without signatures the
+    delta is simply the whole file as literal data.
+    """
+    out = bytearray()
+    table = {}
+    for index, (weak, strong) in enumerate(signatures):
+        table.setdefault(weak, []).append((index, strong))
+
+    literal = bytearray()
+    run_start = run_count = None
+
+    def flush_run():
+        nonlocal run_start, run_count
+        if run_start is not None:
+            out.extend(_COPY + _COPY_RECORD.pack(run_start, run_count))
+            run_start = run_count = None
+
+    length = len(data)
+    pos = 0
+    a = b = None
+    while pos < length:
+        end = min(pos + block_size, length)
+        window = end - pos
+        if a is None:
+            a, b = _weak_checksum(data[pos:end])
+
+        match = None
+        candidates = table.get(_combine(a, b)) if table else None
+        if candidates:
+            strong = _strong_checksum(data[pos:end])
+            match = next((i for i, s in candidates if s == strong), None)
+
+        if match is not None:
+            if literal:
+                flush_run()
+                _encode_literal(out, bytes(literal))
+                literal.clear()
+            if run_start is not None and run_start + run_count == match:
+                run_count += 1
+            else:
+                flush_run()
+                run_start, run_count = match, 1
+            pos = end
+            a = b = None
+            continue
+
+        # No match: emit one literal byte and roll the window forward.
+        flush_run()
+        out_byte = data[pos]
+        literal.append(out_byte)
+        pos += 1
+        if end < length:
+            in_byte = data[end]
+            a = (a - out_byte + in_byte) % _MOD
+            b = (b - window * out_byte + a) % _MOD
+        else:
+            # Tail of the file: the window shrinks instead of sliding.
+            a = (a - out_byte) % _MOD
+            b = (b - window * out_byte) % _MOD
+
+    flush_run()
+    _encode_literal(out, bytes(literal))
+    return bytes(out)
+
+
+def apply_delta(old_path, delta, new_path, block_size=BLOCK_SIZE):
+    """Rebuilds a file from ``old_path`` and ``delta`` into ``new_path``."""
+    old = open(old_path, "rb") if old_path and os.path.exists(old_path) else None
+    try:
+        with open(new_path, "wb") as out:
+            view = memoryview(delta)
+            pos = 0
+            while pos < len(view):
+                tag = bytes(view[pos : pos + 1])
+                pos += 1
+                if tag == _COPY:
+                    start, count = _COPY_RECORD.unpack_from(view, pos)
+                    pos += _COPY_RECORD.size
+                    if old is None:
+                        raise DeltaError("Delta references blocks of a missing file.")
+                    old.seek(start * block_size)
+                    block = old.read(count * block_size)
+                    out.write(block)
+                elif tag == _DATA:
+                    (size,) = _DATA_RECORD.unpack_from(view, pos)
+                    pos += _DATA_RECORD.size
+                    out.write(view[pos : pos + size])
+                    pos += size
+                else:
+                    raise DeltaError(f"Unknown delta record {tag!r}.")
+    finally:
+        if old is not None:
+            old.close()
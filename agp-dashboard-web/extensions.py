@@ -30,9 +30,9 @@ login_manager = LoginManager()
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
+    from flask import current_app
 
-    return User.query.get(int(user_id))
+    return current_app.user_cache.get(int(user_id))
 
 
 def init_app(app):
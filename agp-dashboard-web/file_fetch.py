@@ -0,0 +1,157 @@
+"""
+Downloads files from agents with the chunked transfer of file_transfer.py.
+
+The dashboard asks for a file with ``read_file_stream``; the agent answers
+with ``read_file_stream_start`` announcing the file's ``size`` and
+``sha256``, and the dashboard replies ``transfer_ready`` with the offset to
+start from (the size of a matching partial file, to resume). From there the
+roles of an upload are reversed: the agent streams binary chunks within its
+window, the dashboard acknowledges them and verifies the hash once the agent
+sends ``transfer_complete``.
+"""
+
+import logging
+import threading
+import time
+
+from file_transfer import (
+    ACK_TIMEOUT,
+    CHUNK_SIZE,
+    DEFAULT_WINDOW,
+    ChunkReceiver,
+    TransferError,
+    new_transfer_id,
+    unpack_chunk,
+)
+
+log = logging.getLogger(__name__)
+
+
+class FileFetcher:
+    """Incoming transfers from agents, by transfer_id."""
+
+    def __init__(self, socketio_instance, window=DEFAULT_WINDOW, chunk_size=CHUNK_SIZE):
+        self.socketio = socketio_instance
+        self.window = window
+        self.chunk_size = chunk_size
+        # transfer_id -> {"sid", "local_path", "receiver", "done", "error", "seen"}
+        self.transfers = {}
+
+    def fetch(self, agent_sid, remote_path, local_path, idle_timeout=ACK_TIMEOUT):
+        """
+        Copies ``remote_path`` from an agent to ``local_path`` and returns its
+        size. Blocks (this green thread only) until the file is verified;
+        raises ``TransferError`` if it fails or the agent goes quiet for
+        ``idle_timeout`` seconds. A partial file left by a failed attempt is
+        kept, so fetching the same file again resumes where it stopped.
+        """
+        transfer_id = new_transfer_id()
+        transfer = {
+            "sid": agent_sid,
+            "local_path": local_path,
+            "receiver": None,
+            "done": threading.Event(),
+            "error": None,
+            "seen": time.monotonic(),
+        }
+        self.transfers[transfer_id] = transfer
+        try:
+            self._emit(
+                "read_file_stream",
+                {
+                    "transfer_id": transfer_id,
+                    "file_path": remote_path,
+                    "window": self.window,
+                    "chunk_size": self.chunk_size,
+                },
+                agent_sid,
+            )
+            while not transfer["done"].wait(idle_timeout):
+                if time.monotonic() - transfer["seen"] > idle_timeout:
+                    self._emit(
+                        "transfer_cancel", {"transfer_id": transfer_id}, agent_sid
+                    )
+                    raise TransferError(f"Agent stopped sending {remote_path}.")
+            if transfer["error"]:
+                raise TransferError(transfer["error"])
+            return transfer["receiver"].offset
+        finally:
+            self.transfers.pop(transfer_id, None)
+            if transfer["receiver"] is not None:
+                transfer["receiver"].close()
+
+    def handle_start(self, data):
+        """The agent announced the file: open the receiver and say where to start."""
+        transfer = self._touch(data)
+        if transfer is None:
+            return
+        transfer_id = data.get("transfer_id")
+        try:
+            transfer["receiver"] = ChunkReceiver(
+                transfer_id,
+                transfer["local_path"],
+                data.get("size"),
+                data.get("sha256"),
+            )
+        except OSError as e:
+            self._emit("transfer_cancel", {"transfer_id": transfer_id}, transfer["sid"])
+            self._finish(transfer, str(e))
+            return
+        self._emit(
+            "transfer_ready",
+            {"transfer_id": transfer_id, "offset": transfer["receiver"].offset},
+            transfer["sid"],
+        )
+
+    def handle_chunk(self, frame):
+        try:
+            transfer_id, offset, data = unpack_chunk(frame)
+        except TransferError as e:
+            # The header cannot be trusted, the agent will time out and resume
+            log.warning(f"Discarding malformed chunk: {e}")
+            return
+        transfer = self._touch({"transfer_id": transfer_id})
+        if transfer is None or transfer["receiver"] is None:
+            return
+        receiver = transfer["receiver"]
+        # Duplicates are acknowledged again so an agent that missed an ack moves on
+        if receiver.write(offset, data) or offset < receiver.offset:
+            event = "transfer_ack"
+        else:
+            event = "transfer_nack"
+        self._emit(
+            event,
+            {"transfer_id": transfer_id, "offset": receiver.offset},
+            transfer["sid"],
+        )
+
+    def handle_complete(self, data):
+        """Every chunk was sent: verify the file and move it into place."""
+        transfer = self._touch(data)
+        if transfer is None or transfer["receiver"] is None:
+            return
+        try:
+            transfer["receiver"].finalize(data.get("size"), data.get("sha256"))
+        except (OSError, TransferError) as e:
+            self._finish(transfer, str(e))
+        else:
+            self._finish(transfer)
+
+    def handle_failure(self, data):
+        """The agent could not read the file or gave up on the transfer."""
+        transfer = self._touch(data)
+        if transfer is not None:
+            self._finish(transfer, data.get("message") or "Transfer cancelled.")
+
+    def _touch(self, data):
+        transfer = self.transfers.get(data.get("transfer_id"))
+        if transfer is not None:
+            transfer["seen"] = time.monotonic()
+        return transfer
+
+    def _finish(self, transfer, error=None):
+        transfer["error"] = error
+        transfer["done"].set()
+
+    def _emit(self, event, data, sid):
+        self.socketio.emit(event, data, room=sid, namespace="/agent")
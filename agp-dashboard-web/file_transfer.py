@@ -0,0 +1,288 @@
+"""
+Chunked binary file transfer shared by agent.py and the dashboard.
+
+Files are streamed as fixed-size chunks in binary websocket frames instead of
+a single base64 JSON message. Each frame carries a small header with the
+transfer id, the byte offset and a CRC32 of the payload, so the receiver can
+verify every chunk, acknowledge progress and resume an interrupted transfer
+from the last acknowledged offset. The sender never has more than ``window``
+unacknowledged chunks in flight, which keeps memory bounded on both sides
+regardless of the file size.
+
+Control messages (JSON text frames) used by the protocol, after the sender
+announced the file's ``size`` and ``sha256``:
+
+* ``transfer_ready``    receiver -> sender, ``offset`` to start/resume from.
+* ``transfer_ack``      receiver -> sender, every byte before ``offset`` is on disk.
+* ``transfer_nack``     receiver -> sender, resend starting at ``offset``.
+* ``transfer_complete`` sender -> receiver, final ``size`` and ``sha256``.
+* ``transfer_cancel``   either side, aborts the transfer.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import uuid
+import zlib
+
+CHUNK_SIZE = 256 * 1024
+DEFAULT_WINDOW = 8
+ACK_TIMEOUT = 30
+
+# frame kind, transfer id (uuid bytes), offset, payload length, crc32 of the payload
+CHUNK_HEADER = struct.Struct("!c16sQII")
+FRAME_CHUNK = b"F"
+PARTIAL_SUFFIX = ".part"
+# Size and hash of the file a partial file belongs to
+META_SUFFIX = ".json"
+
+
+class TransferError(Exception):
+    """Raised when a chunk is malformed or a transfer cannot continue."""
+
+
+def new_transfer_id():
+    return uuid.uuid4().hex
+
+
+def pack_chunk(transfer_id, offset, data):
+    """Builds a binary frame for ``data`` located at ``offset`` in the file."""
+    header = CHUNK_HEADER.pack(
+        FRAME_CHUNK,
+        uuid.UUID(hex=transfer_id).bytes,
+        offset,
+        len(data),
+        zlib.crc32(data),
+    )
+    return header + data
+
+
+def unpack_chunk(frame):
+    """Parses a binary frame and returns ``(transfer_id, offset, data)``."""
+    if len(frame) < CHUNK_HEADER.size:
+        raise TransferError("Frame shorter than the chunk header.")
+    kind, raw_id, offset, length, crc = CHUNK_HEADER.unpack_from(frame)
+    if kind != FRAME_CHUNK:
+        raise TransferError("Frame is not a file chunk.")
+    data = bytes(frame[CHUNK_HEADER.size :])
+    transfer_id = uuid.UUID(bytes=raw_id).hex
+    if len(data) != length:
+        raise TransferError(f"Chunk at offset {offset} is truncated.")
+    if zlib.crc32(data) != crc:
+        raise TransferError(f"Checksum mismatch for chunk at offset {offset}.")
+    return transfer_id, offset, data
+
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    """Hashes a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TransferWindow:
+    """
+    Sliding window of unacknowledged bytes for the sending side.
+
+    ``ack`` and ``nack`` are called from the thread that receives control
+    messages, while ``wait_for_slot`` blocks the sending thread.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, chunk_size=CHUNK_SIZE):
+        self.limit = window * chunk_size
+        self.acked = 0
+        self.resend_from = None
+        self.start_offset = None
+        self.cancelled = False
+        self._cond = threading.Condition()
+
+    def ready(self, offset):
+        """Records the offset the receiver wants the transfer to start at."""
+        with self._cond:
+            self.start_offset = offset
+            self.acked = offset
+            self._cond.notify_all()
+
+    def wait_until_ready(self, timeout=ACK_TIMEOUT):
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self.cancelled or self.start_offset is not None, timeout
+            )
+            self._check_cancelled()
+            if not ready:
+                raise TransferError("Receiver did not accept the transfer.")
+            return self.start_offset
+
+    def ack(self, offset):
+        with self._cond:
+            if offset > self.acked:
+                self.acked = offset
+            self._cond.notify_all()
+
+    def nack(self, offset):
+        with self._cond:
+            self.resend_from = offset
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+    def _check_cancelled(self):
+        if self.cancelled:
+            raise TransferError("Transfer cancelled by the peer.")
+
+    def wait_for_slot(self, next_offset, timeout=ACK_TIMEOUT):
+        """Blocks until ``next_offset`` fits in the window or a resend is due."""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: (
+                    self.cancelled
+                    or self.resend_from is not None
+                    or next_offset - self.acked < self.limit
+                ),
+                timeout,
+            )
+            self._check_cancelled()
+            if not ready:
+                raise TransferError("Timed out waiting for acknowledgement.")
+
+    def take_resend(self):
+        with self._cond:
+            offset, self.resend_from = self.resend_from, None
+            return offset
+
+    def wait_for_ack(self, size, timeout=ACK_TIMEOUT):
+        """Blocks until the receiver acknowledged the whole file."""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: (
+                    self.cancelled or self.resend_from is not None or self.acked >= size
+                ),
+                timeout,
+            )
+            self._check_cancelled()
+            if not ready:
+                raise TransferError("Timed out waiting for the final acknowledgement.")
+            return self.resend_from is None
+
+
+def send_file(path, transfer_id, send_frame, window, offset=0, chunk_size=CHUNK_SIZE):
+    """
+    Streams ``path`` through ``send_frame`` starting at ``offset``.
+
+    Only one chunk is held in memory at a time; the ``window`` throttles the
+    sender until the receiver acknowledges what was already sent. Returns the
+    total file size once every byte has been acknowledged.
+    """
+    size = os.path.getsize(path)
+    window.acked = max(window.acked, offset)
+    with open(path, "rb") as f:
+        while True:
+            f.seek(offset)
+            while offset < size:
+                window.wait_for_slot(offset)
+                resend = window.take_resend()
+                if resend is not None:
+                    offset = resend
+                    f.seek(offset)
+                    continue
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                send_frame(pack_chunk(transfer_id, offset, data))
+                offset += len(data)
+            if window.wait_for_ack(size):
+                return size
+            offset = window.take_resend()
+
+
+class ChunkReceiver:
+    """
+    Writes incoming chunks to ``<path>.part`` and renames it on completion.
+
+    The announced ``size`` and ``sha256`` are recorded next to the partial
+    file. A later transfer of the same path resumes from the partial file's
+    size only if it announces the same file; anything else starts over, so
+    bytes of an older version are never spliced into a new one.
+    """
+
+    def __init__(self, transfer_id, path, size=None, sha256=None):
+        self.transfer_id = transfer_id
+        self.path = path
+        self.partial_path = path + PARTIAL_SUFFIX
+        self.meta_path = self.partial_path + META_SUFFIX
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = {"size": size, "sha256": sha256}
+        resumable = sha256 is not None and self._read_meta() == meta
+        self._file = open(self.partial_path, "ab" if resumable else "wb")
+        self.offset = self._file.tell()
+        if size is not None and self.offset > size:
+            self._file.truncate(0)
+            self.offset = 0
+        with open(self.meta_path, "w") as f:
+            json.dump(meta, f)
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, offset, data):
+        """
+        Appends a chunk if it is the next expected one.
+
+        Returns ``True`` when the chunk was written. Duplicated or out-of-order
+        chunks are ignored and the caller should answer with ``offset`` so the
+        sender rewinds to the right position.
+        """
+        if offset != self.offset:
+            return False
+        self._file.write(data)
+        self.offset += len(data)
+        return True
+
+    def finalize(self, size, sha256):
+        """
+        Verifies the received file and moves it into place. On any failure
+        the partial file is deleted, so the next attempt starts over.
+        """
+        self._file.close()
+        try:
+            if self.offset != size:
+                raise TransferError(
+                    f"Incomplete transfer: received {self.offset} of {size} bytes."
+                )
+            if sha256 and file_sha256(self.partial_path) != sha256:
+                raise TransferError("SHA-256 mismatch after transfer.")
+            os.replace(self.partial_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+        self._remove(self.meta_path)
+
+    def close(self):
+        """Stops writing, keeping the partial file to resume later."""
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        self._remove(self.partial_path)
+        self._remove(self.meta_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,314 @@
+"""
+SQLite index of the structured application log.
+
+The indexer follows ``app.log`` and its rotated backups and stores one small
+row per line: timestamp, level, agent_id and where the line starts (file inode
+and byte offset). A query such as "errors of agent X in the last hour" is
+answered from the index and only the matching lines are read, each with a
+single seek.
+
+Progress is recorded per file (by inode, plus a hash of the first bytes so a
+reused inode is not mistaken for an old file; while a file is shorter than
+``HEAD_BYTES`` only the bytes it had are compared). Rows of files that rotated out
+of the backups are deleted and the database is vacuumed incrementally, so the
+index never outgrows the logs it covers.
+
+The scheduled update runs in a native thread (see ``run_off_hub``) while
+requests index a little themselves from green threads, so updates are
+serialized by a lock from the unpatched ``threading`` module. Requests never
+wait for it.
+"""
+
+import contextlib
+import hashlib
+import sqlite3
+from datetime import datetime
+
+from log_viewer import log_files, matches, parse_line, read_page
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+if patcher is not None:
+    _threading = patcher.original("threading")
+else:
+    import threading as _threading
+
+# Bytes indexed per update, so catching up with a large log is spread out
+MAX_INDEX_BYTES = 16 * 1024 * 1024
+# A query only indexes this much itself; the scheduled job does the rest
+MAX_REQUEST_INDEX_BYTES = 1024 * 1024
+HEAD_BYTES = 256
+MAX_SCANNED_ROWS = 20000  # Per query, when an event filter rejects most rows
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    inode INTEGER PRIMARY KEY,
+    head TEXT NOT NULL,
+    indexed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    ts REAL,
+    level TEXT,
+    agent_id TEXT
+);
+CREATE INDEX IF NOT EXISTS lines_ts ON lines (ts);
+CREATE INDEX IF NOT EXISTS lines_level ON lines (level, ts);
+CREATE INDEX IF NOT EXISTS lines_agent ON lines (agent_id, ts);
+CREATE INDEX IF NOT EXISTS lines_inode ON lines (inode);
+"""
+
+
+def parse_timestamp(value):
+    """Epoch seconds of a structlog ISO timestamp, or None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_time(value):
+    """
+    Epoch seconds from a query argument: a number, or an ISO date (local time
+    unless it carries an offset, as sent by ``datetime-local`` inputs).
+    """
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    ts = parse_timestamp(value)
+    if ts is None:
+        raise ValueError(f"Invalid time: {value}")
+    return ts
+
+
+def _head(data):
+    """``"<length>:<sha256>"`` of the first bytes of a file."""
+    return f"{len(data)}:{hashlib.sha256(data).hexdigest()}"
+
+
+def _same_file(known_head, first):
+    """Whether ``first``, the file's first bytes now, starts as recorded."""
+    length, _, _ = known_head.partition(":")
+    try:
+        return _head(first[: int(length)]) == known_head
+    except ValueError:
+        return False
+
+
+class LogIndex:
+    """Index of ``log_path`` stored in the SQLite database ``index_path``."""
+
+    def __init__(self, log_path, index_path):
+        self.log_path = log_path
+        self.index_path = index_path
+        self._lock = _threading.Lock()
+        with self._connect() as conn:
+            # Must be set before the first table is created to take effect
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # One connection per call: the scheduler job and requests run in
+        # different threads and connections can't be shared between them
+        conn = sqlite3.connect(self.index_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def update(self, max_bytes=MAX_INDEX_BYTES, wait=True):
+        """
+        Indexes up to ``max_bytes`` of the lines written since the last update
+        and returns how many. With ``wait=False`` nothing is done while another
+        update is running; green threads must pass it, as waiting would block
+        the hub until the native update is done.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return 0
+        try:
+            return self._update(max_bytes)
+        finally:
+            self._lock.release()
+
+    def _update(self, max_bytes):
+        with self._connect() as conn:
+            files = log_files(self.log_path)
+            indexed = {
+                inode: (head, offset)
+                for inode, head, offset in conn.execute(
+                    "SELECT inode, head, indexed FROM files"
+                )
+            }
+            live = set()
+            budget = max_bytes
+            added = 0
+            # Oldest first, so row ids follow the order lines were written
+            for path, inode, size in reversed(files):
+                try:
+                    with open(path, "rb") as f:
+                        first = f.read(HEAD_BYTES)
+                except OSError:
+                    continue  # Rotated away since it was listed
+                live.add(inode)
+                head = _head(first)
+                known_head, offset = indexed.get(inode, (None, 0))
+                if offset and (not _same_file(known_head, first) or size < offset):
+                    # Reused inode or a truncated file: start over
+                    conn.execute("DELETE FROM lines WHERE inode = ?", (inode,))
+                    offset = 0
+                if offset >= size or budget <= 0:
+                    self._save_progress(conn, inode, head, offset)
+                    continue
+                rows, new_offset = self._index_file(path, inode, offset, size, budget)
+                budget -= new_offset - offset
+                offset = new_offset
+                conn.executemany(
+                    "INSERT INTO lines (inode, offset, ts, level, agent_id)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._save_progress(conn, inode, head, offset)
+                added += len(rows)
+            self._prune(conn, set(indexed) - live)
+            return added
+
+    def _save_progress(self, conn, inode, head, offset):
+        conn.execute(
+            "INSERT OR REPLACE INTO files (inode, head, indexed) VALUES (?, ?, ?)",
+            (inode, head, offset),
+        )
+
+    def _index_file(self, path, inode, offset, size, budget):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(min(size - offset, budget))
+        # Only complete lines; a line being written is indexed next time
+        data = data[: data.rfind(b"\n") + 1]
+        rows = []
+        ts = None
+        for line in data.splitlines(keepends=True):
+            if line.strip():
+                record = parse_line(line.rstrip(b"\n"))
+                # Lines without a timestamp (tracebacks) take the previous one
+                ts = parse_timestamp(record.get("timestamp")) or ts
+                level = record.get("level")
+                agent_id = record.get("agent_id")
+                rows.append(
+                    (
+                        inode,
+                        offset,
+                        ts,
+                        str(level).lower() if level else None,
+                        str(agent_id) if agent_id is not None else None,
+                    )
+                )
+            offset += len(line)
+        return rows, offset
+
+    def _prune(self, conn, inodes):
+        """Drops the rows of files no longer among the log and its backups."""
+        if not inodes:
+            return
+        for inode in inodes:
+            conn.execute("DELETE FROM lines WHERE inode = ?", (inode,))
+            conn.execute("DELETE FROM files WHERE inode = ?", (inode,))
+        conn.commit()
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def query(self, since=None, until=None, filters=None, limit=200, before=None):
+        """
+        Returns ``{"records": [...], "cursor": ...}`` with up to ``limit``
+        records in ``[since, until)`` (epoch seconds) matching ``filters``,
+        newest last. ``level`` and ``agent_id`` are answered by the index;
+        ``event`` is checked on the lines read. ``cursor`` is the row id to
+        pass as ``before`` for the previous page, or None.
+        """
+        filters = dict(filters or {})
+        where, params = [], []
+        for field, value in (("ts >=", since), ("ts <", until), ("id <", before)):
+            if value is not None:
+                where.append(f"{field} ?")
+                params.append(value)
+        if "level" in filters:
+            where.append("level = ?")
+            params.append(filters.pop("level").lower())
+        if "agent_id" in filters:
+            where.append("agent_id = ?")
+            params.append(filters.pop("agent_id"))
+        sql = "SELECT id, inode, offset FROM lines"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+
+        paths = {inode: path for path, inode, _ in log_files(self.log_path)}
+        handles = {}
+        records = []
+        cursor = None
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params + [MAX_SCANNED_ROWS])
+                scanned = 0
+                for row_id, inode, offset in rows:
+                    scanned += 1
+                    cursor = row_id
+                    record = self._read_record(handles, paths, inode, offset)
+                    if record is not None and matches(record, filters):
+                        records.append(record)
+                        if len(records) >= limit:
+                            break
+                else:
+                    if scanned < MAX_SCANNED_ROWS:
+                        cursor = None  # Every matching row was read
+        finally:
+            for f in handles.values():
+                f.close()
+        records.reverse()
+        return {"records": records, "cursor": cursor}
+
+    def _read_record(self, handles, paths, inode, offset):
+        if inode not in paths:
+            return None  # Rotated out, pruned on the next update
+        f = handles.get(inode)
+        if f is None:
+            f = handles[inode] = open(paths[inode], "rb")
+        f.seek(offset)
+        return parse_line(f.readline().rstrip(b"\n"))
+
+
+def query_page(index, cursor=None, limit=200, filters=None, since=None, until=None):
+    """
+    Serves a log viewer page. Time ranges and ``level``/``agent_id`` filters
+    are answered from ``index``; otherwise the log is read backwards with
+    ``read_page``. Index cursors start with ``#``. The first page indexes at
+    most ``MAX_REQUEST_INDEX_BYTES`` of new lines itself, and nothing while
+    the scheduled update runs, so the newest lines may show up a little late.
+    """
+    filters = filters or {}
+    since, until = parse_time(since), parse_time(until)
+    indexed = since or until or "level" in filters or "agent_id" in filters
+    if not indexed and not (cursor or "").startswith("#"):
+        return read_page(index.log_path, cursor, limit, filters)
+
+    before = None
+    if cursor:
+        try:
+            before = int(cursor.lstrip("#"))
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+    if before is None:
+        index.update(MAX_REQUEST_INDEX_BYTES, wait=False)
+    page = index.query(since, until, filters, limit, before)
+    page["cursor"] = f"#{page['cursor']}" if page["cursor"] else None
+    return page
@@ -0,0 +1,201 @@
+"""
+Non-blocking logging pipeline.
+
+A log call only puts the record on a bounded queue. The file and stdout
+handlers (writes, flushes and rotation checks) run on a native OS thread that
+drains the queue in batches. Under eventlet a regular thread would be a green
+thread and its file I/O would still block the hub, so the thread and its queue
+come from the unpatched modules.
+
+When the queue is full the record is dropped rather than blocking the caller;
+drops are counted and reported in the log itself once there is room again.
+Noisy loggers can be sampled: ``Sampler`` keeps a fraction of their records
+below WARNING.
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+if patcher is not None:
+    _queue = patcher.original("queue")
+    _threading = patcher.original("threading")
+else:
+    import queue as _queue
+    import threading as _threading
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 256
+STOP_TIMEOUT = 5.0
+
+_STOP = object()
+# The pipeline started by the last create_app, replaced by the next one
+_active = None
+
+
+class Sampler(logging.Filter):
+    """
+    Keeps a fraction of the records below WARNING of the configured loggers,
+    e.g. ``{"agent_api": 0.1}`` keeps one record in ten. Sampling is even
+    rather than random: the first record is kept, then one every 1/rate.
+    """
+
+    def __init__(self):
+        super(Sampler, self).__init__()
+        self.rates = {}
+        self.sampled_out = 0
+        self._credit = {}
+
+    def configure(self, rates):
+        """Applies ``rates`` (logger name -> fraction kept) as logger filters."""
+        for name in set(self.rates) - set(rates):
+            logging.getLogger(name).removeFilter(self)
+        self.rates = {name: float(rate) for name, rate in rates.items()}
+        self._credit = {}
+        for name in self.rates:
+            logging.getLogger(name).addFilter(self)
+
+    def filter(self, record):
+        rate = self.rates.get(record.name, 1.0)
+        if record.levelno >= logging.WARNING or rate >= 1.0:
+            return True
+        credit = self._credit.get(record.name, 1.0)
+        keep = credit >= 1.0
+        if keep:
+            credit -= 1.0
+        else:
+            self.sampled_out += 1
+        self._credit[record.name] = credit + rate
+        return keep
+
+
+class _PipelineHandler(QueueHandler):
+    """Queues records for one group of handlers of a ``LogPipeline``."""
+
+    def __init__(self, pipeline, route):
+        super(_PipelineHandler, self).__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.route = route
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait((self.route, record))
+        except _queue.Full:
+            self.pipeline.count_drop()
+
+
+class LogPipeline:
+    """
+    Writes log records on a native thread. ``attach`` puts a queueing handler
+    on a logger in place of the handlers it is given; with ``replace`` it also
+    takes the place of the handlers the logger already had, which ``stop``
+    puts back.
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.queue = _queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.sampler = Sampler()
+        self.dropped = 0
+        self._drop_lock = _threading.Lock()
+        self._routes = []
+        self._attached = []  # (logger, queueing handler, replaced handlers)
+        self._thread = None
+
+    def attach(self, logger, handlers, replace=False):
+        handler = _PipelineHandler(self, len(self._routes))
+        self._routes.append(list(handlers))
+        replaced = list(logger.handlers) if replace else []
+        for old in replaced:
+            logger.removeHandler(old)
+        self._attached.append((logger, handler, replaced))
+        logger.addHandler(handler)
+        return handler
+
+    def count_drop(self):
+        with self._drop_lock:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.dropped,
+            "sampled_out": self.sampler.sampled_out,
+        }
+
+    def start(self):
+        global _active
+        if _active is not None:
+            _active.stop()
+        _active = self
+        self._thread = _threading.Thread(
+            target=self._run, name="log-pipeline", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Writes what is queued, then detaches and closes the handlers."""
+        global _active
+        if self._thread is not None:
+            try:
+                self.queue.put((None, _STOP), timeout=STOP_TIMEOUT)
+            except _queue.Full:
+                pass
+            self._thread.join(STOP_TIMEOUT)
+            self._thread = None
+        self.sampler.configure({})
+        for logger, handler, replaced in self._attached:
+            logger.removeHandler(handler)
+            for old in replaced:
+                logger.addHandler(old)
+        for handlers in self._routes:
+            for handler in handlers:
+                handler.close()
+        self._attached = []
+        if _active is self:
+            _active = None
+
+    def _run(self):
+        reported = 0
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except _queue.Empty:
+                pass
+            for route, record in batch:
+                if record is _STOP:
+                    return
+                self._write(self._routes[route], record)
+            if self.dropped != reported:
+                dropped, reported = self.dropped - reported, self.dropped
+                for handlers in self._routes:
+                    self._write(handlers, self._drop_record(dropped))
+
+    def _write(self, handlers, record):
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _drop_record(self, dropped):
+        # Rendered like the structlog output so the log viewer can filter it
+        message = json.dumps(
+            {
+                "dropped": dropped,
+                "event": "Log records dropped, the queue was full",
+                "level": "warning",
+                "timestamp": datetime.now(timezone.utc)
+                .isoformat()
+                .replace("+00:00", "Z"),
+            }
+        )
+        return logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0, message, None, None
+        )
@@ -0,0 +1,220 @@
+"""
+Reading the structured application log without loading it whole.
+
+``app.log`` is written by a RotatingFileHandler (10 MB x 5 backups) with one
+structlog JSON object per line. Pages are read backwards from the end in
+blocks, so a request only reads the lines it returns plus the ones a filter
+skipped, and a page never scans more than ``MAX_SCAN_BYTES``.
+
+A page position is a cursor ``"<inode>:<offset>"``. The inode identifies a
+file across rotations, which rename ``app.log`` to ``app.log.1`` and so on, so
+paginating backwards keeps working while the log rotates underneath.
+"""
+
+import itertools
+import json
+import os
+
+from flask import request
+from flask_socketio import Namespace
+
+BLOCK_SIZE = 64 * 1024
+DEFAULT_PAGE_LINES = 200
+MAX_PAGE_LINES = 1000
+# Per page, so a filter that rarely matches doesn't read every file at once
+MAX_SCAN_BYTES = 8 * 1024 * 1024
+FILTER_FIELDS = ("level", "event", "agent_id")
+TAIL_INTERVAL = 1.0
+
+
+def log_files(log_path):
+    """``(path, inode, size)`` of the log and its rotated backups, newest first."""
+    files = []
+    for index in itertools.count():
+        path = log_path if index == 0 else f"{log_path}.{index}"
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if index == 0:
+                continue  # Rotated right now, backups may still exist
+            break
+        files.append((path, st.st_ino, st.st_size))
+    return files
+
+
+def iter_lines_backwards(f, end):
+    """Yields ``(offset, line)`` for the lines of ``f`` before ``end``, last first."""
+    pos = end
+    head = b""
+    while pos > 0:
+        size = min(BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + head).split(b"\n")
+        # The first piece may continue in the previous block
+        head = lines.pop(0)
+        line_end = pos + len(head) + sum(len(line) + 1 for line in lines)
+        for line in reversed(lines):
+            start = line_end - len(line)
+            if line:
+                yield start, line
+            line_end = start - 1
+    if head:
+        yield 0, head
+
+
+def parse_line(line):
+    """The record of a log line; lines not written by structlog become events."""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", "replace")
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {"event": line}
+    return record if isinstance(record, dict) else {"event": line}
+
+
+def clean_filters(params):
+    """Keeps the supported, non-empty filters of a request's arguments."""
+    return {field: str(params[field]) for field in FILTER_FIELDS if params.get(field)}
+
+
+def matches(record, filters):
+    """
+    ``level`` and ``agent_id`` must be equal (level ignoring case); ``event``
+    matches as a case-insensitive substring.
+    """
+    for field, value in filters.items():
+        actual = str(record.get(field, ""))
+        if field == "event":
+            if value.lower() not in actual.lower():
+                return False
+        elif field == "level":
+            if actual.lower() != value.lower():
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def read_page(log_path, cursor=None, limit=DEFAULT_PAGE_LINES, filters=None):
+    """
+    Returns ``{"records": [...], "cursor": ...}`` with up to ``limit`` matching
+    records before ``cursor`` (the end of the log by default), oldest first.
+    The returned cursor continues backwards and is None at the start of the
+    oldest backup.
+    """
+    filters = filters or {}
+    files = log_files(log_path)
+    index, offset = 0, None
+    if cursor:
+        try:
+            inode, offset = (int(part) for part in cursor.split(":"))
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        index = next((i for i, f in enumerate(files) if f[1] == inode), None)
+        if index is None:
+            # Rotated out of the backups since the previous page
+            return {"records": [], "cursor": None}
+
+    records = []
+    scanned = 0
+    for path, inode, size in files[index:]:
+        end = size if offset is None else min(offset, size)
+        offset = None
+        with open(path, "rb") as f:
+            for start, line in iter_lines_backwards(f, end):
+                scanned += len(line) + 1
+                record = parse_line(line)
+                if matches(record, filters):
+                    records.append(record)
+                if len(records) >= limit or scanned >= MAX_SCAN_BYTES:
+                    records.reverse()
+                    return {"records": records, "cursor": f"{inode}:{start}"}
+    records.reverse()
+    return {"records": records, "cursor": None}
+
+
+class LogTailer:
+    """
+    Returns the records appended to the log since the previous poll, reading
+    at most ``MAX_SCAN_BYTES`` per poll. After a rotation the previous file is
+    read to its end, over as many polls as needed, before the new one.
+    """
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        files = log_files(log_path)
+        self.inode, self.offset = (files[0][1], files[0][2]) if files else (None, 0)
+
+    def poll(self):
+        files = log_files(self.log_path)
+        if not files or files[0][0] != self.log_path:
+            return []
+        records = []
+        path, inode, size = files[0]
+        if inode != self.inode:
+            # Rotated: finish the previous file, now a backup, first
+            previous = next((f for f in files if f[1] == self.inode), None)
+            if previous:
+                drained = previous[2] - self.offset <= MAX_SCAN_BYTES
+                records.extend(self._read(previous[0], previous[2]))
+                if not drained:
+                    return records
+            self.inode, self.offset = inode, 0
+        elif size < self.offset:
+            self.offset = 0  # Truncated
+        records.extend(self._read(path, size))
+        return records
+
+    def _read(self, path, size):
+        end = min(size, self.offset + MAX_SCAN_BYTES)
+        with open(path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(end - self.offset)
+        # A line still being written is left for the next poll
+        complete = data.rfind(b"\n") + 1
+        self.offset += complete
+        return [parse_line(line) for line in data[:complete].splitlines() if line]
+
+
+class LogTailNamespace(Namespace):
+    """
+    Live tail over Socket.IO: a client emits ``tail`` with its filters and
+    receives ``log_records`` batches until it emits ``untail`` or disconnects.
+    One background task polls the log while anybody is subscribed.
+    """
+
+    def __init__(self, namespace, log_path):
+        super(LogTailNamespace, self).__init__(namespace)
+        self.log_path = log_path
+        self.subscribers = {}  # sid -> filters
+        self._following = False
+
+    def on_tail(self, data):
+        self.subscribers[request.sid] = clean_filters(data or {})
+        if not self._following:
+            self._following = True
+            # Created now so lines logged before the task first runs are sent
+            tailer = LogTailer(self.log_path)
+            self.socketio.start_background_task(self._follow, tailer)
+
+    def on_untail(self, data=None):
+        self.subscribers.pop(request.sid, None)
+
+    def on_disconnect(self, reason=None):
+        self.subscribers.pop(request.sid, None)
+
+    def _follow(self, tailer):
+        try:
+            while self.subscribers:
+                self.socketio.sleep(TAIL_INTERVAL)
+                records = tailer.poll()
+                if not records:
+                    continue
+                for sid, filters in list(self.subscribers.items()):
+                    matching = [r for r in records if matches(r, filters)]
+                    if matching:
+                        self.emit("log_records", {"records": matching}, room=sid)
+        finally:
+            self._following = False
@@ -0,0 +1,220 @@
+import base64
+import logging
+import os
+import queue
+import time
+import uuid
+
+from delta_sync import BLOCK_SIZE, REMOTE_MCPS_DIR, compute_delta, sha256_bytes
+from file_transfer import (
+    CHUNK_SIZE,
+    DEFAULT_WINDOW,
+    TransferError,
+    TransferWindow,
+    file_sha256,
+    new_transfer_id,
+    send_file,
+)
+
+log = logging.getLogger(__name__)
+
+
+class McpSync:
+    """
+    Pushes MCP tool files to agents sending only what they are missing.
+
+    Each agent answers a ``mcp_sync_request`` with the hashes of its
+    ``remote_mcps`` directory and block signatures for the files that differ.
+    Up-to-date agents receive nothing, agents without the file receive it in
+    full through a chunked transfer (see file_transfer.py) and the rest
+    receive an rsync-style delta.
+    """
+
+    def __init__(
+        self,
+        socketio_instance,
+        connected_agents,
+        file_transfers=None,
+        remote_dir=REMOTE_MCPS_DIR,
+    ):
+        self.socketio = socketio_instance
+        self.connected_agents = connected_agents
+        # Outgoing transfer windows by transfer_id, acked by the /agent namespace
+        self.file_transfers = {} if file_transfers is None else file_transfers
+        self.remote_dir = remote_dir
+        # request_id -> queue of the push waiting for that response
+        self.pending_responses = {}
+
+    def handle_sync_response(self, data):
+        """Callback for when an agent answers a sync request."""
+        request_id = data.get("request_id")
+        if request_id and request_id in self.pending_responses:
+            self.pending_responses[request_id].put((request_id, data))
+        else:
+            log.warning(f"Received unhandled or late sync response {request_id}")
+
+    def push(self, local_path, agent_sids, timeout=30.0):
+        """
+        Synchronises ``local_path`` with every agent in ``agent_sids``.
+
+        The source file is read and hashed once, and deltas are shared between
+        agents that hold the same previous version. Returns a dict with the
+        outcome per agent SID.
+        """
+        file_name = os.path.basename(local_path)
+        with open(local_path, "rb") as f:
+            data = f.read()
+        sha256 = sha256_bytes(data)
+
+        responses = queue.Queue()
+        requests = {}
+        for sid in agent_sids:
+            request_id = str(uuid.uuid4())
+            self.pending_responses[request_id] = responses
+            requests[request_id] = sid
+            self.socketio.emit(
+                "mcp_sync_request",
+                {
+                    "request_id": request_id,
+                    "files": {file_name: sha256},
+                    "block_size": BLOCK_SIZE,
+                },
+                room=sid,
+                namespace="/agent",
+            )
+
+        # Agents are answered in the order they respond, within one deadline
+        deadline = time.monotonic() + timeout
+        deltas = {}
+        results = {}
+        try:
+            while len(results) < len(requests):
+                try:
+                    request_id, response = responses.get(
+                        timeout=max(0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                sid = requests[request_id]
+                results[sid] = self._send_update(
+                    sid, request_id, local_path, data, sha256, response, deltas
+                )
+        finally:
+            for request_id in requests:
+                self.pending_responses.pop(request_id, None)
+
+        for sid in agent_sids:
+            if sid not in results:
+                log.error(f"Agent {sid} did not answer sync of {file_name}.")
+                results[sid] = "timeout"
+
+        log.info(f"Sync of {file_name} finished: {results}")
+        return results
+
+    def _send_update(self, sid, request_id, local_path, data, sha256, response, deltas):
+        file_name = os.path.basename(local_path)
+        remote = response.get("files", {}).get(file_name)
+        if remote and remote.get("sha256") == sha256:
+            return "up_to_date"
+
+        if not remote:
+            # Nothing to diff against: stream the file instead of a delta
+            # made of a single base64-encoded literal.
+            self.socketio.start_background_task(
+                self.send_file,
+                sid,
+                local_path,
+                os.path.join(self.remote_dir, file_name),
+                request_id,
+            )
+            return "full"
+
+        base_sha256 = remote["sha256"]
+        if base_sha256 not in deltas:
+            signatures = remote.get("signatures", [])
+            deltas[base_sha256] = compute_delta(data, signatures, BLOCK_SIZE)
+        delta = deltas[base_sha256]
+
+        self.socketio.emit(
+            "apply_delta",
+            {
+                "request_id": request_id,
+                "file_name": file_name,
+                "base_sha256": base_sha256,
+                "sha256": sha256,
+                "block_size": BLOCK_SIZE,
+                # The agent speaks JSON text frames; deltas are small enough
+                # that base64 only inflates the changed bytes.
+                "delta": base64.b64encode(delta).decode("ascii"),
+            },
+            room=sid,
+            namespace="/agent",
+        )
+        log.info(
+            f"Sent {len(delta)} delta bytes for {file_name} ({len(data)} bytes) "
+            f"to agent {sid}"
+        )
+        return "delta"
+
+    def send_file(self, agent_sid, local_path, remote_path, task_id):
+        """
+        Streams a local file to an agent in binary chunks.
+
+        Runs as a Socket.IO background task; acknowledgements from the agent
+        are routed to the transfer window by the /agent namespace.
+        """
+        socketio = self.socketio
+        transfer_id = new_transfer_id()
+        window = TransferWindow(DEFAULT_WINDOW, CHUNK_SIZE)
+        self.file_transfers[transfer_id] = window
+        try:
+            size = os.path.getsize(local_path)
+            sha256 = file_sha256(local_path)
+            socketio.emit(
+                "write_file_stream",
+                {
+                    "file_path": remote_path,
+                    "transfer_id": transfer_id,
+                    "task_id": task_id,
+                    "size": size,
+                    "sha256": sha256,
+                    "chunk_size": CHUNK_SIZE,
+                },
+                room=agent_sid,
+                namespace="/agent",
+            )
+            offset = window.wait_until_ready()
+            send_file(
+                local_path,
+                transfer_id,
+                lambda frame: socketio.emit(
+                    "file_chunk", frame, room=agent_sid, namespace="/agent"
+                ),
+                window,
+                offset=offset,
+                chunk_size=CHUNK_SIZE,
+            )
+            socketio.emit(
+                "transfer_complete",
+                {
+                    "transfer_id": transfer_id,
+                    "task_id": task_id,
+                    "size": size,
+                    "sha256": sha256,
+                },
+                room=agent_sid,
+                namespace="/agent",
+            )
+            log.info(f"Transfer {transfer_id} of {local_path} completed ({size} bytes)")
+            return True
+        except (OSError, TransferError) as e:
+            log.error(f"Transfer {transfer_id} of {local_path} failed: {e}")
+            socketio.emit(
+                "transfer_cancel",
+                {"transfer_id": transfer_id},
+                room=agent_sid,
+                namespace="/agent",
+            )
+            return False
+        finally:
+            self.file_transfers.pop(transfer_id, None)
@@ -0,0 +1,173 @@
+"""
+Sidebar navigation menu.
+
+The menu is the same for every request, so it is built once per process (per
+script root, in case the app is mounted under several prefixes) with its URLs
+already resolved, and handed to templates as an immutable structure.
+Templates can also cache rendered fragments, such as the sidebar, by locale
+with ``cached_fragment``.
+"""
+
+from types import MappingProxyType
+
+from flask import current_app, has_request_context, request, url_for
+from flask_babel import get_locale
+from markupsafe import Markup
+
+# Menu items by endpoint ("url"); items with "external" set keep "url" as is.
+# Items whose blueprint isn't registered are left out.
+MAIN_MENU = [
+    {
+        "type": "link",
+        "name": "Resumen",
+        "url": "dashboard",
+        "icon": "bi-house-door-fill",
+    },
+    {
+        "type": "submenu",
+        "name": "Gestión",
+        "id": "gestion-submenu",
+        "icon": "bi-kanban-fill",
+        "items": [
+            {
+                "name": "Proyectos",
+                "url": "projects.projects_manager",
+                "icon": "bi-folder-check",
+            },
+            {
+                "name": "Tareas",
+                "url": "tasks.tasks_manager",
+                "icon": "bi-list-check",
+            },
+            {"name": "MCPs", "url": "mcp.mcp_manager", "icon": "bi-tools"},
+        ],
+    },
+    {
+        "type": "submenu",
+        "name": "IA Tools",
+        "id": "ia-tools-submenu",
+        "icon": "bi-robot",
+        "items": [
+            {
+                "name": "Laboratorio 3D",
+                "url": "threed_lab.lab",
+                "icon": "bi-box-fill",
+            },
+            {
+                "name": "Galería de Modelos",
+                "url": "threed_lab.gallery",
+                "icon": "bi-collection-fill",
+            },
+            {
+                "name": "Visor AR",
+                "url": "ar_viewer",
+                "icon": "bi-badge-ar-fill",
+            },
+            {
+                "name": "Estudio Culinario",
+                "url": "culinary_studio.studio_page",
+                "icon": "bi-image-fill",
+            },
+            {
+                "name": "Carga de Material",
+                "url": "threed_lab.upload",
+                "icon": "bi-cloud-arrow-up-fill",
+            }
+        ],
+    },
+    {
+        "type": "submenu",
+        "name": "SYSTEM",
+        "id": "system-submenu",
+        "icon": "bi-hdd-stack-fill",
+        "items": [
+            {
+                "name": "Ejecución Local",
+                "url": "local_execution.execution_page",
+                "icon": "bi-terminal-fill",
+            },
+            {
+                "name": "Notificaciones Termux",
+                "url": "notifications.termux_notify",
+                "icon": "bi-phone-vibrate-fill",
+            },
+            {
+                "name": "Ajustes",
+                "url": "settings.settings_manager",
+                "icon": "bi-gear-wide-connected",
+            },
+            {
+                "name": "Gestor de Secretos",
+                "url": "vault.vault_manager",
+                "icon": "bi-key-fill",
+            },
+            {
+                "name": "Copias de Seguridad",
+                "url": "system.backup_page",
+                "icon": "bi-database-down",
+            },
+            {
+                "name": "Visor de Logs",
+                "url": "logs_viewer",
+                "icon": "bi-file-earmark-text-fill",
+            },
+            {
+                "name": "Perfiles de Rendimiento",
+                "url": "system.profiles_page",
+                "icon": "bi-speedometer2",
+            },
+        ],
+    },
+]
+
+
+def _freeze(item):
+    """Returns ``item`` with ``url`` resolved, or None if its endpoint is missing."""
+    frozen = dict(item)
+    if "items" in item:
+        frozen["items"] = tuple(
+            sub for sub in map(_freeze, item["items"]) if sub is not None
+        )
+    elif not item.get("external"):
+        if item["url"] not in current_app.view_functions:
+            return None
+        frozen["url"] = url_for(item["url"])
+    return MappingProxyType(frozen)
+
+
+def build_menu(menu=MAIN_MENU):
+    """Resolves the URLs of ``menu`` in the current app (and request) context."""
+    return tuple(item for item in map(_freeze, menu) if item is not None)
+
+
+class MenuCache:
+    """The built menu and cached template fragments of one app."""
+
+    def __init__(self, menu=MAIN_MENU):
+        self.menu = menu
+        self._built = {}  # script root -> built menu
+        self._fragments = {}
+
+    def main_menu(self):
+        script_root = request.script_root if has_request_context() else ""
+        built = self._built.get(script_root)
+        if built is None:
+            built = self._built[script_root] = build_menu(self.menu)
+        return built
+
+    def cached_fragment(self, name, *key, caller):
+        """
+        Renders the body of a ``{% call cached_fragment(name) %}`` block once
+        per ``name``, locale, script root and any extra ``key`` values. Nothing
+        is cached while templates are auto-reloaded, so edits show up in
+        development: fragments are only cached with ``PRODUCTION`` (see
+        templating.py) or ``TEMPLATES_AUTO_RELOAD = False``.
+        """
+        if current_app.jinja_env.auto_reload:
+            return caller()
+        script_root = request.script_root if has_request_context() else ""
+        cache_key = (name, str(get_locale()), script_root) + key
+        fragment = self._fragments.get(cache_key)
+        if fragment is None:
+            fragment = self._fragments[cache_key] = Markup(caller())
+        return fragment
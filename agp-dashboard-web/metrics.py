@@ -0,0 +1,470 @@
+"""
+Prometheus metrics for the dashboard, served at ``/metrics`` in the text
+exposition format, without depending on prometheus_client.
+
+Requests, Socket.IO handlers and scheduler jobs run in green threads, but
+metrics are also recorded from native threads: scheduled jobs whose work runs
+off the hub, backup jobs and the log pipeline's writer. Each counter and
+histogram therefore guards its values with a lock from the unpatched
+``threading`` module. It is held only for a few dict updates, never across
+I/O, so a green thread never waits on it long. Recording a request costs two
+``perf_counter()`` calls, a bisect and a few dict updates.
+
+SQL statements are also tallied per request: how many ran, how long they
+took, and which identical statements repeated, the signature of an N+1 query
+loop over ORM objects.
+"""
+
+import functools
+from bisect import bisect_left
+from collections import Counter as _Tally
+from time import perf_counter
+
+from flask import (
+    Response,
+    before_render_template,
+    current_app,
+    has_request_context,
+    request,
+    template_rendered,
+)
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+if patcher is not None:
+    _threading = patcher.original("threading")
+else:
+    import threading as _threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+# A statement run this many times in one request is reported as an N+1 pattern
+DEFAULT_REPEAT_THRESHOLD = 5
+SQL_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+_START_KEY = "agp.metrics_start"
+_QUERIES_KEY = "agp.metrics_queries"
+_RENDER_KEY = "agp.metrics_render_starts"
+# (endpoint, statement) pairs already logged as repeated, to log each once
+_reported_repeats = set()
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values = {}
+        self._lock = _threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield (
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self.values = {}
+        self._lock = _threading.Lock()
+
+    def observe(self, value, labels=()):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bucket] += 1
+            entry[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        with self._lock:
+            values = [
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self.values.items()
+            ]
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                label_str = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{label_str} {cumulative}"
+            label_str = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_str} {_format_value(total)}"
+            yield f"{self.name}_count{label_str} {cumulative}"
+
+
+class Gauge:
+    """
+    A value read from ``func()`` when the metrics are scraped. ``kind`` is
+    "counter" for totals kept elsewhere that only go up. With ``labelnames``,
+    ``func()`` returns a dict of values by label tuple.
+    """
+
+    def __init__(self, name, help_text, func, kind="gauge", labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.kind = kind
+        self.labelnames = labelnames
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        if not self.labelnames:
+            yield f"{self.name} {_format_value(self.func())}"
+            return
+        for labels, value in self.func().items():
+            yield (
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """Adds ``metric``, replacing any metric with the same name."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "agp_http_request_duration_seconds",
+        "Time spent handling HTTP requests, by Flask endpoint.",
+        ("endpoint", "method"),
+    )
+)
+HTTP_REQUESTS = REGISTRY.register(
+    Counter(
+        "agp_http_requests_total",
+        "HTTP requests handled, by Flask endpoint and status code.",
+        ("endpoint", "method", "status"),
+    )
+)
+SOCKETIO_EVENTS = REGISTRY.register(
+    Counter(
+        "agp_socketio_events_total",
+        "Socket.IO events received, by namespace and event.",
+        ("namespace", "event"),
+    )
+)
+DB_QUERY_DURATION = REGISTRY.register(
+    Histogram(
+        "agp_db_query_duration_seconds",
+        "Time spent executing SQL statements, by operation.",
+        ("operation",),
+        QUERY_BUCKETS,
+    )
+)
+REQUEST_DB_QUERIES = REGISTRY.register(
+    Histogram(
+        "agp_http_request_db_queries",
+        "SQL statements executed per HTTP request, by Flask endpoint.",
+        ("endpoint",),
+        QUERY_COUNT_BUCKETS,
+    )
+)
+REQUEST_DB_DURATION = REGISTRY.register(
+    Histogram(
+        "agp_http_request_db_seconds",
+        "Time spent in SQL statements per HTTP request, by Flask endpoint.",
+        ("endpoint",),
+        QUERY_BUCKETS + (2.5, 5.0),
+    )
+)
+REPEATED_QUERIES = REGISTRY.register(
+    Counter(
+        "agp_http_repeated_queries_total",
+        "Requests that ran the same SQL statement repeatedly (N+1 pattern).",
+        ("endpoint",),
+    )
+)
+TEMPLATE_RENDER_DURATION = REGISTRY.register(
+    Histogram(
+        "agp_template_render_seconds",
+        "Time spent rendering templates, by Flask endpoint and template.",
+        ("endpoint", "template"),
+        QUERY_BUCKETS + (2.5, 5.0),
+    )
+)
+JOB_DURATION = REGISTRY.register(
+    Histogram(
+        "agp_scheduler_job_duration_seconds",
+        "Duration of scheduled jobs.",
+        ("job",),
+        JOB_BUCKETS,
+    )
+)
+JOB_FAILURES = REGISTRY.register(
+    Counter(
+        "agp_scheduler_job_failures_total",
+        "Scheduled job runs that raised an exception.",
+        ("job",),
+    )
+)
+
+
+def track_job(func):
+    """Records the duration and failures of a scheduled job function."""
+    labels = (func.__name__,)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            JOB_FAILURES.inc(labels)
+            raise
+        finally:
+            JOB_DURATION.observe(perf_counter() - start, labels)
+
+    return wrapper
+
+
+class QueryStats:
+    """The SQL statements run while handling one request."""
+
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = None
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is None:
+            self.statements = _Tally()
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        """The statements run at least ``threshold`` times, most repeated first."""
+        if self.count < threshold:
+            return []
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def _before_request():
+    environ = request.environ
+    environ[_START_KEY] = perf_counter()
+    environ[_QUERIES_KEY] = QueryStats()
+
+
+def _report_queries(app, response, endpoint, queries):
+    REQUEST_DB_QUERIES.observe(queries.count, (endpoint,))
+    REQUEST_DB_DURATION.observe(queries.seconds, (endpoint,))
+    repeated = queries.repeated(app.config["SQL_REPEAT_THRESHOLD"])
+    if repeated:
+        REPEATED_QUERIES.inc((endpoint,))
+        for statement, count in repeated:
+            if (endpoint, statement) not in _reported_repeats:
+                _reported_repeats.add((endpoint, statement))
+                app.logger.warning(
+                    "Repeated SQL statement, possible N+1 query",
+                    endpoint=endpoint,
+                    statement=statement,
+                    count=count,
+                )
+    if app.debug:
+        response.headers["X-DB-Query-Count"] = str(queries.count)
+        response.headers["X-DB-Time-Ms"] = f"{queries.seconds * 1000:.1f}"
+        response.headers["X-DB-Repeated-Statements"] = str(len(repeated))
+
+
+def _after_request(response):
+    # Resolve the request proxy once: each lookup costs about as much as the
+    # rest of the bookkeeping
+    req = request._get_current_object()
+    start = req.environ.pop(_START_KEY, None)
+    if start is not None:
+        endpoint = req.endpoint or "unmatched"
+        labels = (endpoint, req.method)
+        HTTP_REQUEST_DURATION.observe(perf_counter() - start, labels)
+        HTTP_REQUESTS.inc(labels + (response.status_code,))
+        _report_queries(
+            current_app._get_current_object(),
+            response,
+            endpoint,
+            req.environ.pop(_QUERIES_KEY),
+        )
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    # Renders outside a request (e.g. from a scheduled job) aren't timed
+    if has_request_context():
+        request.environ.setdefault(_RENDER_KEY, []).append(perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    if not has_request_context():
+        return
+    starts = request.environ.get(_RENDER_KEY)
+    if starts:
+        TEMPLATE_RENDER_DURATION.observe(
+            perf_counter() - starts.pop(),
+            (request.endpoint or "unmatched", template.name or "<string>"),
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("metrics_query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = perf_counter() - starts.pop()
+    operation = statement.lstrip()[:6].upper()
+    if operation not in SQL_OPERATIONS:
+        operation = "OTHER"
+    DB_QUERY_DURATION.observe(elapsed, (operation,))
+    # Statements run by scheduler jobs or after the response have no request
+    if has_request_context():
+        queries = request.environ.get(_QUERIES_KEY)
+        if queries is not None:
+            queries.add(statement, elapsed)
+
+
+def _agent_traffic(connected_agents):
+    """Bytes exchanged with each connected agent, see wire_compression.py."""
+    values = {}
+    for info in list(connected_agents.values()):
+        traffic = info.get("traffic")
+        if traffic is None:
+            continue
+        counts = traffic.as_dict()
+        for direction in ("in", "out"):
+            for stage in ("raw", "wire"):
+                labels = (info.get("id"), direction, stage)
+                values[labels] = counts[f"{stage}_{direction}"]
+    return values
+
+
+def _listen_to_queries():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+    ):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+
+def init_app(app):
+    """
+    Instruments ``app`` and serves the metrics at ``/metrics``. In debug mode
+    responses carry their SQL statement count and time in ``X-DB-*`` headers.
+    """
+    app.config.setdefault("SQL_REPEAT_THRESHOLD", DEFAULT_REPEAT_THRESHOLD)
+    # First in the chain, so the other hooks are part of the measured time
+    app.before_request_funcs.setdefault(None, []).insert(0, _before_request)
+    app.after_request(_after_request)
+    _listen_to_queries()
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    REGISTRY.register(
+        Gauge(
+            "agp_connected_agents",
+            "Agents connected over Socket.IO.",
+            lambda: len(app.connected_agents),
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "agp_agent_traffic_bytes_total",
+            "Bytes exchanged with each connected agent, before (raw) and after "
+            "(wire) compression.",
+            lambda: _agent_traffic(app.connected_agents),
+            kind="counter",
+            labelnames=("agent", "direction", "stage"),
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "agp_playbook_pending_responses",
+            "Playbook tasks waiting for an agent's response.",
+            lambda: len(app.playbook_executor.pending_responses),
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "agp_log_queue_size",
+            "Log records waiting to be written.",
+            lambda: app.log_pipeline.stats()["queued"],
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            "agp_log_records_dropped_total",
+            "Log records dropped because the log queue was full.",
+            lambda: app.log_pipeline.stats()["dropped"],
+            kind="counter",
+        )
+    )
+
+    app.add_url_rule(
+        "/metrics",
+        "metrics",
+        lambda: Response(REGISTRY.render(), content_type=CONTENT_TYPE),
+    )
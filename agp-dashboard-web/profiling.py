@@ -0,0 +1,194 @@
+"""
+Opt-in sampling profiler for slow dashboard pages.
+
+With ``PROFILING_ENABLED`` a fraction of the requests
+(``PROFILING_SAMPLE_RATE``), and every request carrying the ``X-Profile``
+header, is profiled: a native thread reads the request's Python stack every
+``PROFILING_INTERVAL`` seconds. Under eventlet every request runs in a green
+thread of the same OS thread, so a sample only counts when the stack being run
+ends in the profiled request's own bottom frame; time the request spends
+waiting on I/O, while other green threads run, is not sampled.
+
+Stacks are appended in the collapsed format used by flamegraph tools
+(``outer;inner;leaf count``) to one file per endpoint in ``instance/profiles``.
+When profiling is disabled no hook is installed at all.
+"""
+
+import os
+import random
+import re
+import sys
+from collections import Counter
+
+from flask import request
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+if patcher is not None:
+    _threading = patcher.original("threading")
+else:
+    import threading as _threading
+
+PROFILES_DIR = "profiles"
+PROFILE_HEADER = "X-Profile"
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_INTERVAL = 0.005
+# Above this size an endpoint's file is rewritten with its stacks merged
+MAX_PROFILE_BYTES = 1024 * 1024
+_PROFILE_KEY = "agp.profile"
+
+
+def _bottom(frame):
+    while frame.f_back is not None:
+        frame = frame.f_back
+    return frame
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class RequestProfile:
+    """Samples the stack of the calling thread (or green thread) until stopped."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._ident = _threading.get_ident()
+        self._bottom = _bottom(sys._getframe())
+        self._stopped = _threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = _threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._bottom = None
+        return self.stacks
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._ident)
+            # Another green thread is running, or the request is done
+            if frame is None or _bottom(frame) is not self._bottom:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+
+
+def _profile_path(profiles_dir, endpoint):
+    return os.path.join(profiles_dir, re.sub(r"[^\w.-]", "_", endpoint) + ".folded")
+
+
+def read_stacks(path):
+    """Merges the collapsed stacks of ``path`` into a Counter."""
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def _write_stacks(path, stacks, mode):
+    with open(path, mode) as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+def save_stacks(profiles_dir, endpoint, stacks):
+    os.makedirs(profiles_dir, exist_ok=True)
+    path = _profile_path(profiles_dir, endpoint)
+    _write_stacks(path, stacks, "a")
+    if os.path.getsize(path) > MAX_PROFILE_BYTES:
+        _write_stacks(path, read_stacks(path), "w")
+
+
+def list_profiles(profiles_dir):
+    """The profiled endpoints, with their sample totals, most sampled first."""
+    if not os.path.isdir(profiles_dir):
+        return []
+    profiles = []
+    for name in os.listdir(profiles_dir):
+        if name.endswith(".folded"):
+            stacks = read_stacks(os.path.join(profiles_dir, name))
+            profiles.append(
+                {"endpoint": name[: -len(".folded")], "samples": sum(stacks.values())}
+            )
+    return sorted(profiles, key=lambda p: p["samples"], reverse=True)
+
+
+def flamegraph(profiles_dir, endpoint):
+    """
+    The aggregated stacks of ``endpoint`` as a tree of
+    ``{"name", "value", "children"}`` nodes, or None if it has no profile.
+    """
+    path = _profile_path(profiles_dir, endpoint)
+    if not os.path.exists(path):
+        return None
+    root = {"name": endpoint, "value": 0, "children": {}}
+    for stack, count in read_stacks(path).items():
+        root["value"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(
+                name, {"name": name, "value": 0, "children": {}}
+            )
+            node["value"] += count
+
+    def to_list(node):
+        children = sorted(node["children"].values(), key=lambda n: -n["value"])
+        node["children"] = [to_list(child) for child in children]
+        return node
+
+    return to_list(root)
+
+
+def delete_profile(profiles_dir, endpoint):
+    """Removes the stacks saved for ``endpoint``; False if there were none."""
+    try:
+        os.remove(_profile_path(profiles_dir, endpoint))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def init_app(app):
+    """Installs the profiling hooks on ``app`` if ``PROFILING_ENABLED`` is set."""
+    app.config.setdefault("PROFILES_DIR", os.path.join(app.instance_path, PROFILES_DIR))
+    if not app.config.get("PROFILING_ENABLED"):
+        return
+    sample_rate = app.config.get("PROFILING_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+    interval = app.config.get("PROFILING_INTERVAL", DEFAULT_INTERVAL)
+    profiles_dir = app.config["PROFILES_DIR"]
+
+    def start_profile():
+        if PROFILE_HEADER in request.headers or random.random() < sample_rate:
+            profile = RequestProfile(interval)
+            request.environ[_PROFILE_KEY] = profile
+            profile.start()
+
+    def stop_profile(exc):
+        profile = request.environ.pop(_PROFILE_KEY, None)
+        if profile is None:
+            return
+        stacks = profile.stop()
+        if stacks:
+            save_stacks(profiles_dir, request.endpoint or "unmatched", stacks)
+
+    app.before_request_funcs.setdefault(None, []).insert(0, start_profile)
+    app.teardown_request(stop_profile)
@@ -1,7 +1,9 @@
-const CACHE_NAME = 'agp-dashboard-cache-v1';
+// `flask build-static` replaces this line with the fingerprinted static files
+const PRECACHE_MANIFEST = {"version": "dev", "urls": ["/static/css/style.css"]};
+const CACHE_NAME = 'agp-dashboard-cache-' + PRECACHE_MANIFEST.version;
 const urlsToCache = [
   '/',
-  '/static/css/style.css',
+  ...PRECACHE_MANIFEST.urls,
   'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
   'https://cdn.jsdelivr.net/npm/bootstrap-icons/font/bootstrap-icons.css',
   'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
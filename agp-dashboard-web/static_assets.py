@@ -0,0 +1,263 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``flask build-static`` copies every file of ``static/`` to
+``instance/static_build`` under a name that includes a hash of its content
+(``css/style.3f2a9c1b7e4d.css``), writes ``.br`` and ``.gz`` variants of the
+compressible ones and records the mapping in ``manifest.json``. It also
+regenerates the service worker with the list of fingerprinted URLs to
+precache and a cache name derived from them, so clients drop their old cache
+exactly when an asset changes.
+
+When the build is in use (``STATIC_BUILD``, on by default with
+``PRODUCTION``), ``url_for('static', ...)`` returns the fingerprinted names,
+which are served with the best encoding the client accepts and cached for a
+year as immutable. Other static files are served as before.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUILD_DIR = "static_build"
+MANIFEST_NAME = "manifest.json"
+SERVICE_WORKER = "sw.js"
+# Uploaded and generated content changes without a build
+EXCLUDED_PREFIXES = ("uploads/", "generated_food/")
+COMPRESSIBLE_EXTENSIONS = frozenset(
+    {".css", ".js", ".json", ".svg", ".gltf", ".html", ".txt", ".map", ".xml"}
+)
+# A variant is only kept if it saves at least this fraction of the size
+MIN_COMPRESSION_SAVING = 0.1
+# Larger files, such as 3D models, are fetched on demand rather than precached
+PRECACHE_MAX_BYTES = 512 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 12
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# The line of sw.js that `build-static` replaces with the generated manifest
+_PRECACHE_LINE = re.compile(r"^const PRECACHE_MANIFEST = .*;$", re.MULTILINE)
+
+
+def _fingerprinted_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def _iter_static_files(static_folder):
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            full_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(full_path, static_folder).replace(os.sep, "/")
+            if rel_path != SERVICE_WORKER and not rel_path.startswith(
+                EXCLUDED_PREFIXES
+            ):
+                yield rel_path, full_path
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _compressed_variants(data):
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {
+        suffix: compressed
+        for suffix, compressed in variants.items()
+        if len(compressed) <= len(data) * (1 - MIN_COMPRESSION_SAVING)
+    }
+
+
+def load_manifest(build_dir):
+    """The manifest of the build in ``build_dir``, or None if there is none."""
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_service_worker(source, precache_urls, version):
+    """``source`` with its precache manifest replaced by ``precache_urls``."""
+    manifest = json.dumps({"version": version, "urls": precache_urls})
+    built, replaced = _PRECACHE_LINE.subn(
+        lambda _: f"const PRECACHE_MANIFEST = {manifest};", source, count=1
+    )
+    if not replaced:
+        raise ValueError(f"{SERVICE_WORKER} has no PRECACHE_MANIFEST line to replace")
+    return built
+
+
+def build(static_folder, static_url_path, build_dir):
+    """
+    Writes the fingerprinted and compressed copies of the files in
+    ``static_folder`` to ``build_dir`` and returns the new manifest. Files of
+    the previous build stay until the next one, so pages rendered before a
+    rebuild keep working.
+    """
+    previous = load_manifest(build_dir) or {"files": {}}
+    files = {}
+    precache_urls = []
+    for rel_path, full_path in _iter_static_files(static_folder):
+        with open(full_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        name = _fingerprinted_name(rel_path, digest)
+        encodings = []
+        target = os.path.join(build_dir, name)
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+        if os.path.splitext(rel_path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            for suffix, compressed in _compressed_variants(data).items():
+                if not os.path.exists(target + suffix):
+                    _write_atomic(target + suffix, compressed)
+                encodings.append(suffix)
+        files[rel_path] = {"name": name, "size": len(data), "encodings": encodings}
+        if len(data) <= PRECACHE_MAX_BYTES:
+            precache_urls.append(f"{static_url_path}/{name}")
+
+    version = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode()
+    ).hexdigest()[:HASH_LENGTH]
+    manifest = {"version": version, "files": files}
+
+    sw_source = os.path.join(static_folder, SERVICE_WORKER)
+    if os.path.exists(sw_source):
+        with open(sw_source) as f:
+            source = f.read()
+        service_worker = build_service_worker(source, precache_urls, version)
+        _write_atomic(
+            os.path.join(build_dir, SERVICE_WORKER), service_worker.encode()
+        )
+        manifest["service_worker"] = SERVICE_WORKER
+
+    _write_atomic(
+        os.path.join(build_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode(),
+    )
+    _prune(build_dir, [previous, manifest])
+    return manifest
+
+
+def _prune(build_dir, manifests):
+    keep = {MANIFEST_NAME, SERVICE_WORKER}
+    for manifest in manifests:
+        for entry in manifest["files"].values():
+            keep.add(entry["name"])
+            keep.update(entry["name"] + suffix for suffix in entry["encodings"])
+    for dirpath, _, filenames in os.walk(build_dir):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(full_path, build_dir).replace(os.sep, "/")
+            if rel_path not in keep:
+                os.remove(full_path)
+
+
+class StaticAssets:
+    """Serves the static build of an app; see ``init_app``."""
+
+    def __init__(self, build_dir, manifest, fallback):
+        self.build_dir = build_dir
+        self.files = manifest["files"]
+        self.service_worker = manifest.get("service_worker")
+        self.fallback = fallback
+        # Fingerprinted name -> allowed encodings, for the files being served
+        self.served = {
+            entry["name"]: entry["encodings"] for entry in self.files.values()
+        }
+
+    def url_defaults(self, endpoint, values):
+        if endpoint == "static":
+            entry = self.files.get(values.get("filename"))
+            if entry is not None:
+                values["filename"] = entry["name"]
+
+    def send(self, filename):
+        if filename == self.service_worker:
+            response = send_from_directory(self.build_dir, filename)
+            # Browsers check for a new worker on navigation; never serve a stale one
+            response.cache_control.no_cache = True
+            return response
+        encodings = self.served.get(filename)
+        if encodings is None:
+            return self.fallback(filename=filename)
+
+        accepted = request.accept_encodings
+        path = filename
+        content_encoding = None
+        for encoding, suffix in ENCODINGS:
+            if suffix in encodings and accepted[encoding]:
+                path, content_encoding = filename + suffix, encoding
+                break
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(
+            self.build_dir, path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE
+        )
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def _build_dir(app):
+    return app.config.get("STATIC_BUILD_DIR") or os.path.join(
+        app.instance_path, BUILD_DIR
+    )
+
+
+@click.command(name="build-static")
+@with_appcontext
+def build_static():
+    """Fingerprints and precompresses static/ for production."""
+    app = current_app
+    build_dir = _build_dir(app)
+    manifest = build(app.static_folder, app.static_url_path, build_dir)
+    compressed = sum(1 for entry in manifest["files"].values() if entry["encodings"])
+    print(
+        f"{len(manifest['files'])} archivos estáticos en {build_dir} "
+        f"({compressed} precomprimidos, versión {manifest['version']})."
+    )
+    if brotli is None:
+        print("brotli no está instalado: solo se generaron variantes .gz.")
+
+
+def init_app(app):
+    """
+    Registers ``build-static`` and, if ``STATIC_BUILD`` is on and a build
+    exists, serves it. Returns the ``StaticAssets`` in use, or None.
+    """
+    app.cli.add_command(build_static)
+    if not app.config.get("STATIC_BUILD", app.config.get("PRODUCTION", False)):
+        return None
+    build_dir = _build_dir(app)
+    manifest = load_manifest(build_dir)
+    if manifest is None:
+        app.logger.warning(
+            "No static build found, run `flask build-static`", build_dir=build_dir
+        )
+        return None
+
+    assets = StaticAssets(build_dir, manifest, app.view_functions["static"])
+    app.url_defaults(assets.url_defaults)
+    app.view_functions["static"] = assets.send
+    return assets
@@ -0,0 +1,50 @@
+"""
+Template loading modes.
+
+In development templates are reloaded whenever they change, which means Jinja
+stats the file on every render. With ``PRODUCTION`` set in the instance config
+auto-reload is off, compiled templates are kept in a bytecode cache under
+``instance/jinja_cache`` and every template is compiled at startup, so the
+first request to a page doesn't pay for it and a broken template is reported
+in the log right away. ``TEMPLATES_AUTO_RELOAD``, if set, still wins.
+"""
+
+import os
+
+from jinja2 import FileSystemBytecodeCache, TemplateError
+
+BYTECODE_CACHE_DIR = "jinja_cache"
+
+
+def precompile(app):
+    """Compiles every template of ``app``; returns the names that failed."""
+    failed = []
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            failed.append(name)
+            app.logger.warning(
+                "Template failed to compile", template=name, error=str(e)
+            )
+    return failed
+
+
+def init_app(app):
+    """Applies the template mode. Call once the blueprints are registered."""
+    production = app.config.get("PRODUCTION", False)
+    if app.config.get("TEMPLATES_AUTO_RELOAD") is None:
+        app.config["TEMPLATES_AUTO_RELOAD"] = not production
+    app.jinja_env.auto_reload = app.config["TEMPLATES_AUTO_RELOAD"]
+    if not production:
+        return
+
+    cache_dir = os.path.join(app.instance_path, BYTECODE_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    failed = precompile(app)
+    app.logger.info(
+        "Templates precompiled",
+        templates=len(app.jinja_env.list_templates()) - len(failed),
+        failed=len(failed),
+    )
@@ -0,0 +1,64 @@
+import unittest
+
+import websocket
+from agent import AgentConnection
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+
+    def send(self, frame, opcode=None):
+        if self.fail:
+            raise websocket.WebSocketConnectionClosedException("closed")
+        self.sent.append(frame)
+
+
+class AgentConnectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.connection = AgentConnection("ws://test", buffer_limit=10)
+        self.connection._ws = FakeWebSocket()
+
+    def test_backoff_is_bounded_and_grows(self):
+        """El retardo crece exponencialmente pero nunca supera max_delay."""
+        connection = AgentConnection("ws://test", base_delay=1, max_delay=8)
+        for attempt in range(10):
+            delay = connection.next_delay()
+            self.assertLessEqual(delay, min(8, 2**attempt))
+            self.assertGreaterEqual(delay, 0)
+        self.assertEqual(connection.attempt, 10)
+
+    def test_output_is_buffered_until_connected(self):
+        self.connection.send("uno")
+        self.connection.send("dos")
+        self.assertEqual(self.connection._ws.sent, [])
+
+        self.connection.attempt = 3
+        self.connection.mark_connected()
+        self.assertEqual(self.connection._ws.sent, ["uno", "dos"])
+        self.assertEqual(self.connection.attempt, 0)
+
+        self.connection.send("tres")
+        self.assertEqual(self.connection._ws.sent, ["uno", "dos", "tres"])
+
+    def test_buffer_drops_oldest_over_limit(self):
+        for frame in ["aaaa", "bbbb", "cccc"]:
+            self.connection.send(frame)
+        self.assertEqual(self.connection.dropped_bytes, 4)
+
+        self.connection.mark_connected()
+        self.assertEqual(self.connection._ws.sent, ["bbbb", "cccc"])
+
+    def test_failed_send_is_buffered(self):
+        self.connection.mark_connected()
+        self.connection._ws.fail = True
+        self.connection.send("perdido")
+
+        self.connection._ws.fail = False
+        self.connection.mark_connected()
+        self.assertEqual(self.connection._ws.sent, ["perdido"])
+
+
+if __name__ == "__main__":
+    unittest.main()
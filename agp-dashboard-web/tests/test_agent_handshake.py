@@ -0,0 +1,147 @@
+import json
+import unittest
+
+import agent
+import extensions
+import jwt
+from agent_api import AgentNamespace
+from app import create_app
+from extensions import scheduler
+from models import Agent, db
+from test_agent_connection import FakeWebSocket
+
+
+class AgentHandshakeTestCase(unittest.TestCase):
+    """Autenticación de agent.py contra el namespace /agent del dashboard."""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Agent(name="Agente", agent_id="agent-001", api_key="clave"))
+        db.session.commit()
+
+        self.namespace = AgentNamespace("/agent", self.app.playbook_executor)
+        extensions.socketio.on_namespace(self.namespace)
+        self.token = jwt.encode({"agent_id": "agent-001"}, "clave", algorithm="HS256")
+
+        self.ws = FakeWebSocket()
+        self.connection = agent.connection
+        agent.connection = agent.AgentConnection("ws://test")
+        agent.connection._ws = self.ws
+        agent.message_codec.codec = None
+
+    def tearDown(self):
+        agent.connection = self.connection
+        agent.message_codec.codec = None
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def _handshake(self, resume_token=None):
+        """Autentica un cliente y entrega el auth_result recibido a agent.py."""
+        client = extensions.socketio.test_client(self.app, namespace="/agent")
+        client.emit(
+            "authenticate",
+            {
+                "token": self.token,
+                "compression": ["deflate"],
+                "resume_token": resume_token,
+            },
+            namespace="/agent",
+        )
+        (result,) = [
+            event["args"][0]
+            for event in client.get_received("/agent")
+            if event["name"] == "auth_result"
+        ]
+        agent.on_message(self.ws, json.dumps(result))
+        return client, result
+
+    def test_auth_result_connects_the_agent(self):
+        agent.send_control({"type": "shell_output", "output": "en cola"})
+        self.assertEqual(self.ws.sent, [])
+
+        client, result = self._handshake()
+        self.assertEqual(result["status"], "success")
+        self.assertFalse(result["resumed"])
+        self.assertEqual(agent.connection.session_token, result["session_token"])
+        self.assertEqual(agent.message_codec.codec, "deflate")
+        # Una sesión nueva descarta la salida retenida
+        self.assertEqual(self.ws.sent, [])
+
+        agent.send_control({"type": "shell_output", "output": "hola"})
+        self.assertEqual(len(self.ws.sent), 1)
+        (info,) = self.app.connected_agents.values()
+        self.assertEqual(info["id"], "agent-001")
+        self.assertEqual(info["compression"], "deflate")
+        client.disconnect(namespace="/agent")
+        self.assertEqual(self.app.connected_agents, {})
+
+    def test_session_is_resumed_after_reconnecting(self):
+        client, first = self._handshake()
+        agent.send_control({"type": "shell_output", "output": "hola"})
+        (info,) = self.app.connected_agents.values()
+        traffic = info["traffic"]
+        client.disconnect(namespace="/agent")
+
+        # Sin conexión, la salida se retiene hasta que se reanude la sesión
+        agent.connection.mark_disconnected()
+        agent.send_control({"type": "shell_output", "output": "pendiente"})
+        sent = len(self.ws.sent)
+
+        client, second = self._handshake(agent.connection.session_token)
+        self.assertTrue(second["resumed"])
+        self.assertEqual(second["session_token"], first["session_token"])
+        self.assertEqual(len(self.ws.sent), sent + 1)
+        (info,) = self.app.connected_agents.values()
+        self.assertIs(info["traffic"], traffic)
+        client.disconnect(namespace="/agent")
+
+    def test_agent_frames_are_counted(self):
+        """Los marcos del agente se cuentan tal como llegan y se publican."""
+        client, _ = self._handshake()
+        frame = agent.message_codec.encode({"type": "battery_report", "level": 80})
+        client.emit("battery_report", frame, namespace="/agent")
+        compressed = agent.message_codec.encode({"output": "x" * 4096})
+        client.emit("battery_report", compressed, namespace="/agent")
+
+        (info,) = self.app.connected_agents.values()
+        traffic = info["traffic"].as_dict()
+        self.assertEqual(traffic["raw_in"], len(frame) + 4096 + 14)
+        self.assertEqual(traffic["wire_in"], len(frame) + len(compressed))
+
+        metrics = self.app.test_client().get("/metrics").get_data(as_text=True)
+        self.assertIn(
+            'agp_agent_traffic_bytes_total{agent="agent-001",direction="in",'
+            f'stage="wire"}} {traffic["wire_in"]}',
+            metrics,
+        )
+        client.disconnect(namespace="/agent")
+
+    def test_invalid_token_is_rejected(self):
+        self.token = jwt.encode({"agent_id": "agent-001"}, "otra", algorithm="HS256")
+        closed = []
+        agent.connection.close = lambda: closed.append(True)
+        agent.send_control({"type": "shell_output", "output": "en cola"})
+
+        client, result = self._handshake()
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(closed, [True])
+        self.assertEqual(self.ws.sent, [])
+        self.assertEqual(self.app.connected_agents, {})
+        client.disconnect(namespace="/agent")
+
+
+if __name__ == "__main__":
+    unittest.main()
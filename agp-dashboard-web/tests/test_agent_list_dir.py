@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import agent
+from agent import iter_dir_entries, list_dir_sender
+
+
+class ListDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, "sub", "deep"))
+        for name in ("a.txt", "b.log", "sub/c.txt", "sub/deep/d.txt"):
+            with open(os.path.join(self.dir, name), "w") as f:
+                f.write(name)
+        os.symlink(os.path.join(self.dir, "sub"), os.path.join(self.dir, "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _entries(self, **kwargs):
+        return {e["name"]: e for e in iter_dir_entries(self.dir, **kwargs)}
+
+    def test_symlink_to_directory_is_a_directory(self):
+        """Un enlace a un directorio sigue apareciendo como directorio."""
+        entries = self._entries()
+        self.assertEqual(set(entries), {"a.txt", "b.log", "sub", "link"})
+        self.assertTrue(entries["link"]["is_dir"])
+        self.assertEqual(entries["link"]["type"], "symlink")
+        self.assertEqual(entries["sub"]["type"], "dir")
+        self.assertEqual(entries["a.txt"]["size"], 5)
+
+    def test_recursive_walk_does_not_follow_links(self):
+        entries = self._entries(recursive=True, max_depth=8)
+        self.assertIn(os.path.join("sub", "deep", "d.txt"), entries)
+        self.assertFalse(any(name.startswith("link" + os.sep) for name in entries))
+
+        entries = self._entries(recursive=True, max_depth=2)
+        self.assertIn(os.path.join("sub", "c.txt"), entries)
+        self.assertNotIn(os.path.join("sub", "deep", "d.txt"), entries)
+
+    def test_filters(self):
+        entries = self._entries(recursive=True, max_depth=8, pattern="*.txt")
+        self.assertEqual(len(entries), 3)
+        entries = self._entries(kinds={"dir"})
+        self.assertEqual(set(entries), {"sub"})
+
+    def test_listing_is_sent_in_pages(self):
+        sent = []
+        with patch.object(agent, "send_control", sent.append):
+            list_dir_sender(
+                {
+                    "path": self.dir,
+                    "request_id": "r1",
+                    "page_size": 3,
+                    "sort_by": "name",
+                }
+            )
+        self.assertEqual([page["done"] for page in sent], [False, True])
+        self.assertEqual(sent[-1]["total"], 4)
+        names = [e["name"] for page in sent for e in page["files"]]
+        self.assertEqual(names, ["a.txt", "b.log", "link", "sub"])
+
+        with patch.object(agent, "send_control", sent.append):
+            list_dir_sender({"path": os.path.join(self.dir, "missing")})
+        self.assertEqual(sent[-1]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+import asyncio
+import functools
+import importlib.util
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import httpx
+from agent_metrics import MetricsStore, flush_to_db, unflatten
+from app import create_app
+from extensions import scheduler
+from models import Agent, db
+
+AGENT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "agp-enterprise-agent"
+)
+
+
+def _load_agent_module(name, **dependencies):
+    """Imports a module of the enterprise agent, whose names clash with ours."""
+    spec = importlib.util.spec_from_file_location(
+        f"enterprise_{name}", os.path.join(AGENT_DIR, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    with patch.dict(sys.modules, dependencies):
+        spec.loader.exec_module(module)
+    return module
+
+
+class FlaskTransport(httpx.AsyncBaseTransport):
+    """Hands the agent's httpx requests to the Flask app."""
+
+    def __init__(self, app):
+        self.wsgi = httpx.WSGITransport(app=app)
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        response = self.wsgi.handle_request(request)
+        return httpx.Response(
+            response.status_code, headers=response.headers, content=response.read()
+        )
+
+
+class MetricsStoreTestCase(unittest.TestCase):
+    def test_deltas_are_applied_in_order(self):
+        store = MetricsStore()
+        resync = store.ingest(
+            "a1",
+            [
+                {"seq": 1, "full": False, "changed": {"ram_percent": 20.0}},
+                {"seq": 0, "full": True, "changed": {"ram_percent": 10.0, "x": 1}},
+                {"seq": 2, "full": False, "changed": {}, "removed": ["x"]},
+            ],
+        )
+        self.assertFalse(resync)
+        self.assertEqual(store.snapshot("a1"), {"ram_percent": 20.0})
+
+    def test_gap_requests_resync(self):
+        """Un delta sin su predecesor no se aplica y se pide una instantánea."""
+        store = MetricsStore()
+        store.ingest("a1", [{"seq": 0, "full": True, "changed": {"v": 1}}])
+        resync = store.ingest("a1", [{"seq": 5, "full": False, "changed": {"v": 9}}])
+        self.assertTrue(resync)
+        self.assertEqual(store.snapshot("a1"), {"v": 1})
+        # Unknown agents must start with a full snapshot too
+        self.assertTrue(store.ingest("a2", [{"seq": 3, "changed": {"v": 1}}]))
+
+    def test_unflatten(self):
+        flat = {"disks./.percent": 50.0, "cpu_per_core.0": 1, "cpu_per_core.1": 2}
+        self.assertEqual(
+            unflatten(flat),
+            {"disks": {"/": {"percent": 50.0}}, "cpu_per_core": [1, 2]},
+        )
+
+
+class ReportMetricsAPITestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app()
+        cls.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "WTF_CSRF_ENABLED": False,
+                "SECRET_KEY": "test_secret_key",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        cls.client = cls.app.test_client()
+        with cls.app.app_context():
+            db.create_all()
+            db.session.add(
+                Agent(agent_id="agent-1", name="Agent 1", api_key="agent-1-key")
+            )
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.drop_all()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def _post(self, samples, token="agent-1-key"):
+        return self.client.post(
+            "/api/v1/agents/report_metrics",
+            json={"agent_id": "agent-1", "samples": samples},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    def test_rejects_invalid_token(self):
+        response = self._post([], token="wrong")
+        self.assertEqual(response.status_code, 401)
+
+    def test_ingest_and_flush(self):
+        """Las muestras se guardan en memoria y se persisten en un solo commit."""
+        response = self._post(
+            [
+                {
+                    "seq": 0,
+                    "ts": 1700000000.0,
+                    "full": True,
+                    "changed": {"ram_percent": 40.0, "cpu_load_1m": 0.5},
+                },
+                {"seq": 1, "ts": 1700000010.0, "changed": {"ram_percent": 42.5}},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.get_json()["resync"])
+
+        with self.app.app_context():
+            written = flush_to_db(self.app.agent_metrics, db, Agent)
+            self.assertEqual(written, 1)
+            agent = Agent.query.filter_by(agent_id="agent-1").first()
+            self.assertEqual(agent.ram_percent, 42.5)
+            self.assertEqual(agent.cpu_load_1m, 0.5)
+            self.assertIsNotNone(agent.last_health_report)
+            # Nothing changed since: no further writes
+            self.assertEqual(flush_to_db(self.app.agent_metrics, db, Agent), 0)
+
+    def test_progress_is_relayed_to_the_browsers(self):
+        progress = {
+            "agent_id": "agent-1",
+            "task_id": "t1",
+            "seq": 0,
+            "chunks": [{"stream": "stdout", "data": "hola\n"}],
+        }
+        with patch.object(self.app.socketio, "emit") as emit:
+            response = self.client.post(
+                "/api/v1/agents/report_progress",
+                json=progress,
+                headers={"Authorization": "Bearer wrong"},
+            )
+            self.assertEqual(response.status_code, 401)
+            emit.assert_not_called()
+
+            response = self.client.post(
+                "/api/v1/agents/report_progress",
+                json=progress,
+                headers={"Authorization": "Bearer agent-1-key"},
+            )
+        self.assertEqual(response.status_code, 200)
+        emit.assert_called_once_with("task_progress", progress, namespace="/agent")
+
+
+class AgentMetricsPushTestCase(unittest.TestCase):
+    """El MetricsPusher del agente enterprise contra el endpoint real."""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Agent(agent_id="agent-1", name="Agent 1", api_key="agent-1-key"))
+        db.session.commit()
+
+        models = _load_agent_module("models")
+        self.reporter_module = _load_agent_module("reporter", models=models)
+        self.metrics_module = _load_agent_module("metrics")
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def _push(self, api_key):
+        """Pushes one sample through the agent's reporter client."""
+
+        async def push():
+            reporter = self.reporter_module.DashboardReporter(
+                "http://dashboard", api_key, agent_id="agent-1"
+            )
+            client = functools.partial(
+                httpx.AsyncClient, transport=FlaskTransport(self.app)
+            )
+            with patch.object(self.reporter_module.httpx, "AsyncClient", client):
+                await reporter.start()
+            pusher = self.metrics_module.MetricsPusher(
+                "agent-1", lambda: {"ram_percent": 40.0}, lambda: reporter.client
+            )
+            pusher.sample()
+            try:
+                return await pusher.push()
+            finally:
+                await reporter.stop()
+
+        return asyncio.run(push())
+
+    def test_agent_key_is_accepted(self):
+        self.assertTrue(self._push("agent-1-key"))
+        self.assertEqual(
+            self.app.agent_metrics.snapshot("agent-1"), {"ram_percent": 40.0}
+        )
+
+    def test_other_key_is_rejected(self):
+        self.assertFalse(self._push("dashboard_secret_token"))
+        self.assertIsNone(self.app.agent_metrics.snapshot("agent-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+from app import create_app
+from extensions import scheduler
+from models import Agent, AutomationLog, db
+from test_agent_metrics import FlaskTransport, _load_agent_module
+
+
+class AgentResultsTestCase(unittest.TestCase):
+    """El DashboardReporter del agente enterprise contra report_results."""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Agent(agent_id="agent-1", name="Agent 1", api_key="agent-1-key"))
+        db.session.commit()
+
+        self.models = _load_agent_module("models")
+        self.reporter_module = _load_agent_module("reporter", models=self.models)
+        self.dir = tempfile.mkdtemp()
+        self.outbox = os.path.join(self.dir, "outbox.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def _result(self, task_id, status="completed", error=None):
+        return self.models.TaskResult(
+            task_id=task_id, status=status, output="hola", error=error
+        )
+
+    def _report(self, results, api_key="agent-1-key"):
+        """Submits ``results`` and returns what is left in the outbox."""
+
+        async def report():
+            reporter = self.reporter_module.DashboardReporter(
+                "http://dashboard",
+                api_key,
+                outbox_path=self.outbox,
+                batch_delay=0,
+                agent_id="agent-1",
+            )
+            client = functools.partial(
+                httpx.AsyncClient, transport=FlaskTransport(self.app)
+            )
+            with patch.object(self.reporter_module.httpx, "AsyncClient", client):
+                await reporter.start()
+            for result in results:
+                await reporter.submit(result)
+            for _ in range(100):
+                if not reporter.pending or reporter.failures:
+                    break
+                await asyncio.sleep(0.01)
+            await reporter.stop()
+            return reporter.pending
+
+        return asyncio.run(report())
+
+    def test_results_are_stored_once(self):
+        """Un lote reenviado no duplica los resultados."""
+        results = [self._result("t1"), self._result("t2", "failed", "exit 1")]
+        self.assertEqual(self._report(results), [])
+        # The same batch again, as after a lost acknowledgement
+        self.assertEqual(self._report(results), [])
+
+        logs = {log.task_id: log for log in AutomationLog.query.all()}
+        self.assertEqual(sorted(logs), ["t1", "t2"])
+        self.assertEqual(logs["t1"].agent_id, "agent-1")
+        self.assertEqual(logs["t1"].status, "completed")
+        self.assertEqual(logs["t2"].output, "hola\nexit 1")
+
+    def test_other_key_keeps_results_in_the_outbox(self):
+        pending = self._report([self._result("t1")], api_key="otra")
+        self.assertEqual([result.task_id for result in pending], ["t1"])
+        self.assertEqual(AutomationLog.query.count(), 0)
+
+    def test_malformed_batch_is_rejected(self):
+        client = self.app.test_client()
+        headers = {"Authorization": "Bearer agent-1-key"}
+        response = client.post(
+            "/api/v1/agents/report_results",
+            json={"agent_id": "agent-1", "results": [{"status": "completed"}]},
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.post(
+            "/api/v1/agents/report_results", json={"results": []}, headers=headers
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import eventlet
+from app import create_app
+from backup_jobs import BackupJobs
+from backup_repository import RepositoryError
+from backup_stream import BACKUP_STATE_DIR
+from extensions import scheduler
+from models import db
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _wait(jobs, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while jobs.get(job_id)["status"] == "running":
+        if time.monotonic() > deadline:
+            raise AssertionError("the job did not finish")
+        eventlet.sleep(0.01)
+    return jobs.get(job_id)
+
+
+class GreenSocketIO:
+    """Background tasks as green threads, as Flask-SocketIO runs them here."""
+
+    def __init__(self):
+        self.emitted = []
+
+    def start_background_task(self, target, *args):
+        return eventlet.spawn(target, *args)
+
+    def sleep(self, seconds):
+        eventlet.sleep(seconds)
+
+    def emit(self, event, data):
+        self.emitted.append((event, data))
+
+
+class BackupJobsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.socketio = GreenSocketIO()
+        self.jobs = BackupJobs(self.socketio, progress_interval=0.01)
+
+    def test_job_reports_progress_and_message(self):
+        def work(report):
+            report("staging", 5, 10)
+            return "hecho"
+
+        job = self.jobs.start("restore", work, "Falló")
+        self.assertEqual(job["status"], "running")
+        job = _wait(self.jobs, job["id"])
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["message"], "hecho")
+        self.assertEqual((job["stage"], job["done"], job["total"]), ("staging", 5, 10))
+
+        self.assertEqual([j["id"] for j in self.jobs.pop_finished()], [job["id"]])
+        self.assertEqual(self.jobs.pop_finished(), [])
+
+    def test_progress_is_emitted_from_the_hub(self):
+        """El progreso que anota el hilo nativo llega a la página por Socket.IO."""
+
+        def work(report):
+            report("staging", 5, 10)
+            _busy(0.2)
+            report("swapping", 10, 10)
+            _busy(0.2)
+            return "hecho"
+
+        job = _wait(self.jobs, self.jobs.start("restore", work, "Falló")["id"])
+        events = [data for event, data in self.socketio.emitted]
+        self.assertTrue(
+            all(event == "backup_job_progress" for event, _ in self.socketio.emitted)
+        )
+        self.assertTrue(all(data["id"] == job["id"] for data in events))
+        self.assertEqual(events[0]["status"], "running")
+        stages = [data["stage"] for data in events[1:-1]]
+        self.assertEqual(stages, ["staging", "swapping"])
+        self.assertEqual(events[-1], job)
+
+    def test_failed_job_keeps_the_error(self):
+        def work(report):
+            raise RepositoryError("sin espacio")
+
+        job = _wait(self.jobs, self.jobs.start("snapshot", work, "Falló")["id"])
+        self.assertEqual(job["status"], "error")
+        self.assertEqual(job["message"], "Falló: sin espacio")
+
+    def test_work_does_not_block_the_hub(self):
+        """Mientras el trabajo ocupa la CPU, los green threads siguen corriendo."""
+        job = self.jobs.start("snapshot", lambda report: _busy(0.5), "Falló")
+        ticks = 0
+        while self.jobs.get(job["id"])["status"] == "running":
+            eventlet.sleep(0.01)
+            ticks += 1
+        self.assertGreater(ticks, 10)
+
+    def test_only_recent_finished_jobs_are_kept(self):
+        jobs = BackupJobs(GreenSocketIO(), max_finished=2)
+        ids = [
+            jobs.start("snapshot", lambda report: "ok", "Falló")["id"] for _ in range(3)
+        ]
+        while jobs.running():
+            eventlet.sleep(0.01)
+        self.assertIsNone(jobs.get(ids[0]))
+        self.assertIsNotNone(jobs.get(ids[2]))
+
+
+class BackupEndpointsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def _snapshot(self, app):
+        _busy(0.2)
+        snapshot = {
+            "id": "20260101T000000000000Z",
+            "stats": {"files": 3, "new_chunks": 2, "stored_bytes": 100},
+        }
+        return snapshot, (1, 4)
+
+    def test_snapshot_runs_in_the_background(self):
+        with patch("blueprints.system.snapshot_and_prune", self._snapshot):
+            response = self.client.post("/system/backup/snapshots")
+            self.assertEqual(response.status_code, 202)
+            status_url = response.get_json()["status_url"]
+            self.assertEqual(response.headers["Location"], status_url)
+            _wait(self.app.backup_jobs, response.get_json()["job"]["id"])
+
+        job = self.client.get(status_url).get_json()
+        self.assertEqual(job["status"], "done")
+        self.assertIn("Instantánea 20260101T000000000000Z creada", job["message"])
+
+        with patch("blueprints.system.open_repository") as repository:
+            repository.return_value.list_snapshots.return_value = []
+            page = self.client.get("/system/backup").get_data(as_text=True)
+        self.assertIn("3 archivos, 2 bloques nuevos", page)
+
+    def test_failed_snapshot_is_reported(self):
+        def failing(app):
+            raise OSError("disco lleno")
+
+        with patch("blueprints.system.snapshot_and_prune", failing):
+            response = self.client.post("/system/backup/snapshots")
+            job = _wait(self.app.backup_jobs, response.get_json()["job"]["id"])
+        self.assertEqual(job["message"], "No se pudo crear la instantánea: disco lleno")
+
+    def test_snapshot_is_restored_in_the_background(self):
+        def restore(repository, snapshot_id, base_path, progress):
+            self.assertEqual(snapshot_id, "20260101T000000000000Z")
+            self.assertEqual(base_path, self.app.root_path)
+            progress.start("staging", 10)
+            progress.advance(10)
+            return {"files": 3, "validated": True}
+
+        with patch("blueprints.system.restore_snapshot", restore):
+            response = self.client.post(
+                "/system/backup/snapshots/20260101T000000000000Z/restore"
+            )
+            self.assertEqual(response.status_code, 202)
+            job = _wait(self.app.backup_jobs, response.get_json()["job"]["id"])
+        self.assertEqual(job["kind"], "restore")
+        self.assertEqual(job["stage"], "staging")
+        self.assertEqual(
+            job["message"], "Copia de seguridad restaurada: 3 archivos verificados."
+        )
+
+    def test_upload_is_restored_after_the_request(self):
+        received = []
+
+        def restore(fileobj, base_path, progress):
+            received.append((fileobj.name, fileobj.read()))
+            return {"files": 1, "validated": False}
+
+        # The upload is saved under root_path: keep it out of the source tree
+        root_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_path)
+        with (
+            patch("blueprints.system.restore_archive", restore),
+            patch.object(self.app, "root_path", root_path),
+        ):
+            response = self.client.post(
+                "/system/backup/restore",
+                data={"backup_file": (io.BytesIO(b"PK datos"), "backup.zip")},
+            )
+            self.assertEqual(response.status_code, 202)
+            job = _wait(self.app.backup_jobs, response.get_json()["job"]["id"])
+        self.assertEqual(job["status"], "done")
+        ((path, data),) = received
+        self.assertEqual(data, b"PK datos")
+        self.assertEqual(
+            os.path.dirname(path), os.path.join(root_path, BACKUP_STATE_DIR)
+        )
+        # The uploaded copy is removed once restored
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_restore_is_reported(self):
+        def restore(repository, snapshot_id, base_path, progress):
+            raise RepositoryError("Snapshot x does not exist.")
+
+        with patch("blueprints.system.restore_snapshot", restore):
+            response = self.client.post("/system/backup/snapshots/x/restore")
+            job = _wait(self.app.backup_jobs, response.get_json()["job"]["id"])
+        self.assertEqual(job["status"], "error")
+        self.assertIn("Snapshot x does not exist.", job["message"])
+
+    def test_invalid_upload_is_rejected_right_away(self):
+        response = self.client.post(
+            "/system/backup/restore",
+            data={"backup_file": (io.BytesIO(b"x"), "backup.txt")},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.app.backup_jobs.running(), [])
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/system/backup/jobs/nope").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from backup_repository import BackupRepository, RepositoryError, iter_chunks
+from backup_stream import MANIFEST_NAME
+
+
+def _snapshot(snapshot_id, created_at):
+    return {"id": snapshot_id, "created_at": created_at, "files": {}}
+
+
+class BackupRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.repository = BackupRepository(os.path.join(self.base, "repo"))
+        self.model = random.Random(0).randbytes(2 * 1024 * 1024)
+        self._write("instance/tareas.json", b"[]")
+        self._write("instance/uploads/model.glb", self.model)
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def _write(self, name, data):
+        path = os.path.join(self.base, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def test_chunk_boundaries_follow_content(self):
+        """Insertar bytes al principio solo cambia los bloques cercanos."""
+        before = list(iter_chunks(io.BytesIO(self.model)))
+        after = list(iter_chunks(io.BytesIO(b"xyz" + self.model)))
+        self.assertEqual(b"".join(before), self.model)
+        self.assertGreater(len(before), 4)
+        self.assertEqual(before[1:], after[1:])
+
+    def test_unchanged_data_is_stored_once(self):
+        first = self.repository.create_snapshot(self.base)
+        self.assertGreater(first["stats"]["new_chunks"], 1)
+
+        # Same content under another name and a small edit of the original
+        self._write("instance/uploads/copy.glb", self.model)
+        edited = bytearray(self.model)
+        edited[1024 * 1024] ^= 0xFF
+        self._write("instance/uploads/model.glb", bytes(edited))
+
+        second = self.repository.create_snapshot(self.base)
+        self.assertEqual(second["stats"]["files"], 3)
+        self.assertLessEqual(second["stats"]["new_chunks"], 2)
+
+    def test_restore_and_download_any_snapshot(self):
+        first = self.repository.create_snapshot(self.base)
+        self._write("instance/tareas.json", b'[{"id": 1}]')
+        self.repository.create_snapshot(self.base)
+
+        target = os.path.join(self.base, "restored")
+        self.repository.restore(first["id"], target)
+        with open(os.path.join(target, "instance/tareas.json"), "rb") as f:
+            self.assertEqual(f.read(), b"[]")
+        with open(os.path.join(target, "instance/uploads/model.glb"), "rb") as f:
+            self.assertEqual(f.read(), self.model)
+
+        data = b"".join(self.repository.stream_zip(first["id"]))
+        zf = zipfile.ZipFile(io.BytesIO(data))
+        self.assertIsNone(zf.testzip())
+        self.assertEqual(zf.read("instance/tareas.json"), b"[]")
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+        self.assertEqual(set(manifest["files"]), set(first["files"]))
+
+        with self.assertRaises(RepositoryError):
+            self.repository.load_snapshot("missing")
+
+    def test_retention_keeps_latest_of_each_day_and_week(self):
+        day = 24 * 3600
+        monday = 1700438400  # 2023-11-20 00:00 UTC
+        snapshots = [
+            _snapshot("d0-late", monday + 14 * day + 20 * 3600),
+            _snapshot("d0-early", monday + 14 * day + 3600),
+            _snapshot("d-1", monday + 13 * day),
+            _snapshot("d-2", monday + 12 * day),
+            _snapshot("w-1", monday + 6 * day),
+            _snapshot("w-2", monday + day),
+        ]
+        kept = self.repository.select_kept(snapshots, keep_daily=2, keep_weekly=3)
+        self.assertEqual(kept, {"d0-late", "d-1", "w-1"})
+
+    def test_prune_collects_unreferenced_chunks(self):
+        self.repository.create_snapshot(self.base)
+        self._write("instance/uploads/model.glb", os.urandom(512 * 1024))
+        latest = self.repository.create_snapshot(self.base)
+
+        removed, chunks = self.repository.prune(keep_daily=0, keep_weekly=0)
+        self.assertEqual(removed, 1)
+        self.assertGreater(chunks, 0)
+        self.assertEqual(
+            [s["id"] for s in self.repository.list_snapshots()], [latest["id"]]
+        )
+        self.repository.restore(latest["id"], os.path.join(self.base, "restored"))
+
+
+if __name__ == "__main__":
+    unittest.main()
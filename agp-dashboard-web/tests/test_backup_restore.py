@@ -0,0 +1,124 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from backup_repository import BackupRepository
+from backup_restore import (
+    PREVIOUS_DIR,
+    RestoreError,
+    RestoreProgress,
+    restore_archive,
+    restore_snapshot,
+)
+from backup_stream import BACKUP_STATE_DIR, MANIFEST_NAME, stream_backup
+
+
+class BackupRestoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.state_dir = os.path.join(self.base, BACKUP_STATE_DIR)
+        self._write("instance/tareas.json", b"[]")
+        self._write("instance/uploads/model.glb", os.urandom(300 * 1024))
+        self._write("playbooks/deploy.yml", b"- hosts: all\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def _write(self, name, data):
+        path = os.path.join(self.base, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _read(self, name):
+        with open(os.path.join(self.base, name), "rb") as f:
+            return f.read()
+
+    def _backup(self, incremental=False):
+        return io.BytesIO(b"".join(stream_backup(self.base, incremental)))
+
+    def _rewrite_manifest(self, archive, change):
+        """Copies ``archive`` with its manifest modified by ``change``."""
+        out = io.BytesIO()
+        with zipfile.ZipFile(archive) as src, zipfile.ZipFile(out, "w") as dest:
+            for info in src.infolist():
+                data = src.read(info)
+                if info.filename == MANIFEST_NAME:
+                    manifest = json.loads(data)
+                    change(manifest)
+                    data = json.dumps(manifest)
+                dest.writestr(info, data)
+        out.seek(0)
+        return out
+
+    def test_full_restore_replaces_the_data(self):
+        """Los archivos creados después del backup desaparecen al restaurar."""
+        archive = self._backup()
+        self._write("instance/tareas.json", b'[{"id": 1}]')
+        self._write("playbooks/new.yml", b"")
+
+        reports = []
+        summary = restore_archive(
+            archive, self.base, RestoreProgress(lambda *args: reports.append(args))
+        )
+
+        self.assertEqual(summary, {"files": 3, "validated": True})
+        self.assertEqual(self._read("instance/tareas.json"), b"[]")
+        self.assertFalse(os.path.exists(os.path.join(self.base, "playbooks/new.yml")))
+        # The replaced data is kept aside
+        previous = os.path.join(self.state_dir, PREVIOUS_DIR, "playbooks/new.yml")
+        self.assertTrue(os.path.exists(previous))
+        self.assertEqual([r[0] for r in reports][-2:], ["swapping", "done"])
+
+    def test_mismatching_archive_leaves_data_untouched(self):
+        archive = self._rewrite_manifest(
+            self._backup(),
+            lambda m: m["files"]["instance/tareas.json"].update(sha256="0" * 64),
+        )
+        self._write("instance/tareas.json", b'[{"id": 1}]')
+
+        with self.assertRaises(RestoreError):
+            restore_archive(archive, self.base)
+        self.assertEqual(self._read("instance/tareas.json"), b'[{"id": 1}]')
+        self.assertEqual(os.listdir(self.state_dir), ["last_manifest.json"])
+
+    def test_incremental_restore_uses_unchanged_live_files(self):
+        self._backup()
+        self._write("instance/tareas.json", b'[{"id": 1}]')
+        archive = self._backup(incremental=True)
+        self._write("instance/tareas.json", b'[{"id": 2}]')
+
+        restore_archive(archive, self.base)
+        self.assertEqual(self._read("instance/tareas.json"), b'[{"id": 1}]')
+        self.assertEqual(self._read("playbooks/deploy.yml"), b"- hosts: all\n")
+
+        # A file the archive relies on changed: its base must be restored first
+        archive.seek(0)
+        self._write("playbooks/deploy.yml", b"changed")
+        with self.assertRaises(RestoreError):
+            restore_archive(archive, self.base)
+        self.assertEqual(self._read("playbooks/deploy.yml"), b"changed")
+
+    def test_unsafe_entries_are_rejected(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("instance/../../evil.txt", b"x")
+        with self.assertRaises(RestoreError):
+            restore_archive(archive, self.base)
+
+    def test_restore_snapshot(self):
+        repository = BackupRepository(os.path.join(self.state_dir, "repository"))
+        snapshot = repository.create_snapshot(self.base)
+        model = self._read("instance/uploads/model.glb")
+        os.remove(os.path.join(self.base, "instance/uploads/model.glb"))
+
+        restore_snapshot(repository, snapshot["id"], self.base)
+        self.assertEqual(self._read("instance/uploads/model.glb"), model)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from backup_stream import MANIFEST_NAME, stream_backup
+
+
+class BackupStreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self._write("instance/tareas.json", b"[]")
+        self._write("instance/uploads/model.glb", os.urandom(600 * 1024))
+        self._write("playbooks/deploy.yml", b"- hosts: all\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def _write(self, name, data):
+        path = os.path.join(self.base, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _backup(self, incremental=False):
+        chunks = list(stream_backup(self.base, incremental))
+        zf = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        return chunks, zf, json.loads(zf.read(MANIFEST_NAME))
+
+    def test_full_backup_is_streamed(self):
+        """El ZIP se genera en varios trozos y contiene todos los archivos."""
+        chunks, zf, manifest = self._backup()
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(zf.testzip(), None)
+        self.assertEqual(
+            sorted(n for n in zf.namelist() if n != MANIFEST_NAME),
+            [
+                "instance/tareas.json",
+                "instance/uploads/model.glb",
+                "playbooks/deploy.yml",
+            ],
+        )
+        self.assertEqual(manifest["type"], "full")
+        self.assertEqual(zf.read("playbooks/deploy.yml"), b"- hosts: all\n")
+
+    def test_incremental_only_includes_changes(self):
+        self._backup()
+        self._write("instance/tareas.json", b'[{"id": 1}]')
+        os.remove(os.path.join(self.base, "playbooks/deploy.yml"))
+
+        _, zf, manifest = self._backup(incremental=True)
+
+        self.assertEqual(
+            sorted(zf.namelist()), sorted(["instance/tareas.json", MANIFEST_NAME])
+        )
+        self.assertEqual(manifest["type"], "incremental")
+        self.assertEqual(manifest["deleted"], ["playbooks/deploy.yml"])
+        self.assertIn("instance/uploads/model.glb", manifest["files"])
+
+    def test_touched_file_with_same_content_is_skipped(self):
+        self._backup()
+        path = os.path.join(self.base, "playbooks/deploy.yml")
+        os.utime(path, (1, 1))
+
+        _, zf, _ = self._backup(incremental=True)
+        self.assertEqual(zf.namelist(), [MANIFEST_NAME])
+
+
+if __name__ == "__main__":
+    unittest.main()
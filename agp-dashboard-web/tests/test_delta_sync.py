@@ -0,0 +1,166 @@
+import base64
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from delta_sync import (
+    apply_delta,
+    block_signatures,
+    compute_delta,
+    directory_manifest,
+    sha256_bytes,
+)
+from file_transfer import ChunkReceiver, unpack_chunk
+from mcp_sync import McpSync
+
+
+class FakeSocketIO:
+    """
+    Answers sync requests like an agent holding ``remote_files`` and receives
+    chunked transfers like agent.py. Agents in ``silent`` never answer.
+    """
+
+    def __init__(self, remote_files, silent=()):
+        self.remote_files = remote_files
+        self.silent = set(silent)
+        self.sync = None
+        self.emitted = []
+        self.receivers = {}
+
+    def start_background_task(self, target, *args):
+        target(*args)
+
+    def emit(self, event, data, room=None, namespace=None):
+        self.emitted.append((event, data, room))
+        if room in self.silent:
+            return
+        if event == "write_file_stream":
+            receiver = ChunkReceiver(
+                data["transfer_id"], data["file_path"], data["size"], data["sha256"]
+            )
+            self.receivers[data["transfer_id"]] = receiver
+            self.sync.file_transfers[data["transfer_id"]].ready(receiver.offset)
+        elif event == "file_chunk":
+            transfer_id, offset, chunk = unpack_chunk(data)
+            receiver = self.receivers[transfer_id]
+            receiver.write(offset, chunk)
+            self.sync.file_transfers[transfer_id].ack(receiver.offset)
+        elif event == "transfer_complete":
+            receiver = self.receivers.pop(data["transfer_id"])
+            receiver.finalize(data["size"], data["sha256"])
+        elif event == "mcp_sync_request":
+            files = {}
+            for name in data["files"]:
+                path = self.remote_files.get(room, {}).get(name)
+                if path:
+                    with open(path, "rb") as f:
+                        files[name] = {"sha256": sha256_bytes(f.read())}
+                    files[name]["signatures"] = block_signatures(
+                        path, data["block_size"]
+                    )
+            self.sync.handle_sync_response(
+                {"request_id": data["request_id"], "files": files}
+            )
+
+
+class DeltaSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.old_path = os.path.join(self.temp_dir, "old", "tool.py")
+        self.new_path = os.path.join(self.temp_dir, "new", "tool.py")
+        os.makedirs(os.path.dirname(self.old_path))
+        os.makedirs(os.path.dirname(self.new_path))
+        self.old_content = b"".join(
+            f"def tool_{i}():\n    return {i}\n\n".encode() for i in range(400)
+        )
+        self.new_content = self.old_content.replace(b"return 200", b"return -200")
+        with open(self.old_path, "wb") as f:
+            f.write(self.old_content)
+        with open(self.new_path, "wb") as f:
+            f.write(self.new_content)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_delta_round_trip_is_small(self):
+        """Un cambio pequeño produce un delta mucho menor que el archivo."""
+        delta = compute_delta(self.new_content, block_signatures(self.old_path))
+        self.assertLess(len(delta), len(self.new_content) // 4)
+
+        rebuilt = os.path.join(self.temp_dir, "rebuilt.py")
+        apply_delta(self.old_path, delta, rebuilt)
+        with open(rebuilt, "rb") as f:
+            self.assertEqual(f.read(), self.new_content)
+
+    def test_directory_manifest(self):
+        manifest = directory_manifest(os.path.dirname(self.old_path))
+        self.assertEqual(manifest["tool.py"]["sha256"], sha256_bytes(self.old_content))
+
+    def test_push_to_many_agents(self):
+        """Cada agente recibe solo lo que le falta y el delta se comparte."""
+        remote_files = {
+            "sid-up-to-date": {"tool.py": self.new_path},
+            "sid-old-1": {"tool.py": self.old_path},
+            "sid-old-2": {"tool.py": self.old_path},
+            "sid-missing": {},
+        }
+        socketio = FakeSocketIO(remote_files)
+        remote_dir = os.path.join(self.temp_dir, "remote")
+        sync = McpSync(socketio, {}, remote_dir=remote_dir)
+        socketio.sync = sync
+
+        results = sync.push(self.new_path, list(remote_files), timeout=1)
+
+        self.assertEqual(
+            results,
+            {
+                "sid-up-to-date": "up_to_date",
+                "sid-old-1": "delta",
+                "sid-old-2": "delta",
+                "sid-missing": "full",
+            },
+        )
+        deltas = {
+            room: base64.b64decode(data["delta"])
+            for event, data, room in socketio.emitted
+            if event == "apply_delta"
+        }
+        self.assertEqual(deltas["sid-old-1"], deltas["sid-old-2"])
+        self.assertNotIn("sid-up-to-date", deltas)
+        self.assertEqual(sync.pending_responses, {})
+
+        # La copia completa viaja por la transferencia por bloques
+        self.assertNotIn("sid-missing", deltas)
+        with open(os.path.join(remote_dir, "tool.py"), "rb") as f:
+            self.assertEqual(f.read(), self.new_content)
+        self.assertEqual(sync.file_transfers, {})
+
+    def test_agents_are_waited_for_concurrently(self):
+        """Los agentes que no responden comparten un único plazo."""
+        remote_files = {
+            "sid-silent-1": {},
+            "sid-silent-2": {},
+            "sid-up-to-date": {"tool.py": self.new_path},
+        }
+        socketio = FakeSocketIO(remote_files, silent={"sid-silent-1", "sid-silent-2"})
+        sync = McpSync(socketio, {})
+        socketio.sync = sync
+
+        start = time.monotonic()
+        results = sync.push(self.new_path, list(remote_files), timeout=0.3)
+        self.assertLess(time.monotonic() - start, 0.55)
+        self.assertEqual(
+            results,
+            {
+                "sid-silent-1": "timeout",
+                "sid-silent-2": "timeout",
+                "sid-up-to-date": "up_to_date",
+            },
+        )
+        self.assertEqual(sync.pending_responses, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
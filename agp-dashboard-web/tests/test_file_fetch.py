@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import agent
+from file_fetch import FileFetcher
+from file_transfer import ChunkReceiver, TransferError, file_sha256, unpack_chunk
+
+
+class AgentLink:
+    """Delivers the fetcher's events to agent.py and the agent's frames back."""
+
+    def __init__(self):
+        self.fetcher = FileFetcher(self, window=2, chunk_size=4096)
+        self.chunk_bytes = 0
+
+    def emit(self, event, data, room=None, namespace=None):
+        agent.on_message(None, json.dumps(dict(data, type=event)))
+
+    def send(self, frame, binary=False):
+        if binary:
+            self.chunk_bytes += len(unpack_chunk(frame)[2])
+            self.fetcher.handle_chunk(frame)
+            return
+        data = json.loads(frame)
+        handler = {
+            "read_file_stream_start": self.fetcher.handle_start,
+            "transfer_complete": self.fetcher.handle_complete,
+            "read_file_result": self.fetcher.handle_failure,
+            "transfer_cancel": self.fetcher.handle_failure,
+        }[data["type"]]
+        handler(data)
+
+
+class FileFetchTestCase(unittest.TestCase):
+    """Lectura de archivos del agente en bloques, de agent.py al dashboard."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, "remote.bin")
+        with open(self.source, "wb") as f:
+            f.write(os.urandom(50_000))
+        self.target = os.path.join(self.temp_dir, "local", "copy.bin")
+
+        self.link = AgentLink()
+        self.connection = agent.connection
+        agent.connection = self.link
+        agent.message_codec.codec = None
+
+    def tearDown(self):
+        agent.connection = self.connection
+        shutil.rmtree(self.temp_dir)
+
+    def test_file_is_streamed_and_verified(self):
+        size = self.link.fetcher.fetch("sid", self.source, self.target, 5)
+        self.assertEqual(size, 50_000)
+        self.assertEqual(file_sha256(self.target), file_sha256(self.source))
+        self.assertEqual(os.listdir(os.path.dirname(self.target)), ["copy.bin"])
+        self.assertEqual(self.link.fetcher.transfers, {})
+        self.assertEqual(agent.outgoing_transfers, {})
+
+    def test_partial_download_is_resumed(self):
+        """Solo se piden los bytes que faltan de una descarga interrumpida."""
+        with open(self.source, "rb") as f:
+            head = f.read(20_480)
+        partial = ChunkReceiver("x", self.target, 50_000, file_sha256(self.source))
+        partial.write(0, head)
+        partial.close()
+
+        self.link.fetcher.fetch("sid", self.source, self.target, 5)
+        self.assertEqual(self.link.chunk_bytes, 50_000 - 20_480)
+        self.assertEqual(file_sha256(self.target), file_sha256(self.source))
+
+    def test_unreadable_file_is_reported(self):
+        missing = os.path.join(self.temp_dir, "missing.bin")
+        with self.assertRaises(TransferError) as error:
+            self.link.fetcher.fetch("sid", missing, self.target, 5)
+        self.assertIn("missing.bin", str(error.exception))
+        self.assertFalse(os.path.exists(self.target))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from file_transfer import (
+    ChunkReceiver,
+    TransferError,
+    TransferWindow,
+    file_sha256,
+    new_transfer_id,
+    pack_chunk,
+    send_file,
+    unpack_chunk,
+)
+
+
+class FileTransferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, "source.bin")
+        with open(self.source, "wb") as f:
+            f.write(os.urandom(10_000))
+        self.target = os.path.join(self.temp_dir, "out", "target.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _transfer(self, transfer_id, receiver, offset=0, drop_offsets=()):
+        """Connects a sender and a receiver in-process, acking every chunk."""
+        window = TransferWindow(window=2, chunk_size=1024)
+        dropped = set(drop_offsets)
+
+        def send_frame(frame):
+            _, chunk_offset, data = unpack_chunk(frame)
+            if chunk_offset in dropped:
+                dropped.discard(chunk_offset)
+                return
+            if receiver.write(chunk_offset, data) or chunk_offset < receiver.offset:
+                window.ack(receiver.offset)
+            else:
+                window.nack(receiver.offset)
+
+        return send_file(
+            self.source, transfer_id, send_frame, window, offset, chunk_size=1024
+        )
+
+    def test_pack_and_unpack_chunk(self):
+        """A packed chunk round-trips and corruption is detected."""
+        transfer_id = new_transfer_id()
+        frame = pack_chunk(transfer_id, 42, b"hello")
+        self.assertEqual(unpack_chunk(frame), (transfer_id, 42, b"hello"))
+
+        corrupted = frame[:-1] + b"X"
+        with self.assertRaises(TransferError):
+            unpack_chunk(corrupted)
+
+    def test_send_file_round_trip(self):
+        """The receiver ends up with an identical file after finalize."""
+        transfer_id = new_transfer_id()
+        receiver = ChunkReceiver(transfer_id, self.target)
+        size = self._transfer(transfer_id, receiver)
+        receiver.finalize(size, file_sha256(self.source))
+
+        self.assertEqual(file_sha256(self.target), file_sha256(self.source))
+        self.assertFalse(os.path.exists(self.target + ".part"))
+
+    def test_lost_chunk_is_resent(self):
+        """A gap in the stream triggers a nack and the sender rewinds."""
+        transfer_id = new_transfer_id()
+        receiver = ChunkReceiver(transfer_id, self.target)
+        size = self._transfer(transfer_id, receiver, drop_offsets={2048})
+        receiver.finalize(size, file_sha256(self.source))
+
+        self.assertEqual(file_sha256(self.target), file_sha256(self.source))
+
+    def test_resume_from_partial_file(self):
+        """A new receiver for the same file resumes from the partial size."""
+        sha256 = file_sha256(self.source)
+        with open(self.source, "rb") as f:
+            head = f.read(4096)
+        receiver = ChunkReceiver(new_transfer_id(), self.target, 10_000, sha256)
+        receiver.write(0, head)
+        receiver.close()
+
+        transfer_id = new_transfer_id()
+        receiver = ChunkReceiver(transfer_id, self.target, 10_000, sha256)
+        self.assertEqual(receiver.offset, 4096)
+        size = self._transfer(transfer_id, receiver, offset=receiver.offset)
+        receiver.finalize(size, sha256)
+
+        self.assertEqual(file_sha256(self.target), sha256)
+        self.assertEqual(os.listdir(os.path.dirname(self.target)), ["target.bin"])
+
+    def test_partial_file_of_another_version_is_discarded(self):
+        receiver = ChunkReceiver(new_transfer_id(), self.target, 10_000, "a" * 64)
+        receiver.write(0, b"old version")
+        receiver.close()
+
+        receiver = ChunkReceiver(new_transfer_id(), self.target, 10_000, "b" * 64)
+        self.assertEqual(receiver.offset, 0)
+        receiver.close()
+        # Without an announced hash there is nothing to compare against
+        receiver = ChunkReceiver(new_transfer_id(), self.target)
+        self.assertEqual(receiver.offset, 0)
+        receiver.close()
+
+    def test_hash_mismatch_is_rejected(self):
+        transfer_id = new_transfer_id()
+        receiver = ChunkReceiver(transfer_id, self.target)
+        size = self._transfer(transfer_id, receiver)
+        with self.assertRaises(TransferError):
+            receiver.finalize(size, "0" * 64)
+        self.assertEqual(os.listdir(os.path.dirname(self.target)), [])
+
+    def test_incomplete_transfer_is_discarded(self):
+        receiver = ChunkReceiver(new_transfer_id(), self.target, 10_000, "a" * 64)
+        receiver.write(0, b"partial")
+        with self.assertRaises(TransferError):
+            receiver.finalize(10_000, "a" * 64)
+        self.assertEqual(os.listdir(os.path.dirname(self.target)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import log_index
+from log_index import HEAD_BYTES, LogIndex, query_page
+
+START = 1700000000.0
+
+
+class LogIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.dir, "app.log")
+        self.index = LogIndex(self.log_path, os.path.join(self.dir, "index.sqlite"))
+        self.counter = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _log(self, count, level="info", **fields):
+        with open(self.log_path, "a") as f:
+            for _ in range(count):
+                ts = datetime.fromtimestamp(START + self.counter * 60, timezone.utc)
+                record = {
+                    "event": f"event {self.counter}",
+                    "level": level,
+                    "timestamp": ts.isoformat().replace("+00:00", "Z"),
+                    **fields,
+                }
+                f.write(json.dumps(record) + "\n")
+                self.counter += 1
+
+    def _rotate(self):
+        os.rename(self.log_path, f"{self.log_path}.1")
+
+    def _events(self, page):
+        return [r["event"] for r in page["records"]]
+
+    def test_field_and_time_queries(self):
+        self._log(10)
+        self._log(2, level="error", agent_id="agent-1")
+        self._rotate()
+        self._log(3, level="error", agent_id="agent-2")
+        self._log(1, level="error", agent_id="agent-1")
+        self.assertEqual(self.index.update(), 16)
+        self.assertEqual(self.index.update(), 0)
+
+        page = self.index.query(filters={"level": "ERROR", "agent_id": "agent-1"})
+        self.assertEqual(self._events(page), ["event 10", "event 11", "event 15"])
+        self.assertIsNone(page["cursor"])
+
+        page = self.index.query(since=START + 5 * 60, until=START + 8 * 60)
+        self.assertEqual(self._events(page), ["event 5", "event 6", "event 7"])
+
+        page = self.index.query(filters={"level": "error", "event": "EVENT 12"})
+        self.assertEqual(self._events(page), ["event 12"])
+
+    def test_query_page_paginates_with_index_cursors(self):
+        """Las consultas por campo usan el índice y se paginan hacia atrás."""
+        self._log(5, level="error")
+        self._log(5)
+
+        page = query_page(self.index, limit=3, filters={"level": "error"})
+        self.assertEqual(self._events(page), ["event 2", "event 3", "event 4"])
+        self.assertTrue(page["cursor"].startswith("#"))
+        page = query_page(
+            self.index, cursor=page["cursor"], limit=3, filters={"level": "error"}
+        )
+        self.assertEqual(self._events(page), ["event 0", "event 1"])
+        self.assertIsNone(page["cursor"])
+
+        # Without indexed filters the log is read backwards directly
+        page = query_page(self.index, limit=2)
+        self.assertEqual(self._events(page), ["event 8", "event 9"])
+        with self.assertRaises(ValueError):
+            query_page(self.index, since="yesterday")
+
+    def test_rotated_out_files_are_pruned(self):
+        self._log(4)
+        self._rotate()
+        self._log(2)
+        self.index.update()
+
+        os.remove(f"{self.log_path}.1")
+        self.index.update()
+        page = self.index.query()
+        self.assertEqual(self._events(page), ["event 4", "event 5"])
+
+    def test_truncated_file_is_reindexed(self):
+        self._log(4)
+        self.index.update()
+        with open(self.log_path, "w"):
+            pass
+        self._log(1, level="warning")
+        self.index.update()
+        page = self.index.query()
+        self.assertEqual(self._events(page), ["event 4"])
+
+    def test_small_file_is_not_reindexed_as_it_grows(self):
+        """Un app.log recién creado, más corto que HEAD_BYTES, no se reindexa."""
+        self._log(1)
+        self.assertLess(os.path.getsize(self.log_path), HEAD_BYTES)
+        self.assertEqual(self.index.update(), 1)
+        self._log(5)
+        self.assertGreater(os.path.getsize(self.log_path), HEAD_BYTES)
+        self.assertEqual(self.index.update(), 5)
+        self._log(1)
+        self.assertEqual(self.index.update(), 1)
+        self.assertEqual(len(self.index.query()["records"]), 7)
+
+    def test_query_page_only_catches_up_a_little(self):
+        self._log(20, level="error")
+        with mock.patch.object(log_index, "MAX_REQUEST_INDEX_BYTES", 1000):
+            page = query_page(self.index, filters={"level": "error"})
+        self.assertGreater(len(page["records"]), 0)
+        self.assertLess(len(page["records"]), 20)
+
+        # The scheduled update indexes the rest
+        self.index.update()
+        page = query_page(self.index, filters={"level": "error"})
+        self.assertEqual(len(page["records"]), 20)
+
+    def test_query_page_does_not_wait_for_the_scheduled_update(self):
+        self._log(3, level="error")
+        with self.index._lock:
+            page = query_page(self.index, filters={"level": "error"})
+        self.assertEqual(page["records"], [])
+
+    def test_query_page_does_not_wait_for_an_update_off_the_hub(self):
+        """El bloqueo también excluye al job programado en un hilo nativo."""
+        self._log(3, level="error")
+        holding, release = log_index._threading.Event(), log_index._threading.Event()
+
+        def update():
+            with self.index._lock:
+                holding.set()
+                release.wait(5)
+
+        updater = log_index._threading.Thread(target=update)
+        updater.start()
+        try:
+            self.assertTrue(holding.wait(5))
+            page = query_page(self.index, filters={"level": "error"})
+            self.assertEqual(page["records"], [])
+        finally:
+            release.set()
+            updater.join()
+        self.assertEqual(self.index.update(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
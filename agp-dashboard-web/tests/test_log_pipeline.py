@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import unittest
+import uuid
+from logging.handlers import QueueHandler
+
+from app import create_app
+from extensions import scheduler
+from log_pipeline import LogPipeline
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super(_ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class LogPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("test_log_pipeline")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.target = _ListHandler()
+
+    def test_records_are_written_by_the_pipeline_thread(self):
+        pipeline = LogPipeline()
+        pipeline.attach(self.logger, [self.target])
+        pipeline.start()
+        for i in range(100):
+            self.logger.info("message %d", i)
+        pipeline.stop()
+
+        self.assertEqual(self.target.messages, [f"message {i}" for i in range(100)])
+        self.assertFalse(any(isinstance(h, QueueHandler) for h in self.logger.handlers))
+
+    def test_overflow_is_dropped_and_reported(self):
+        """Con la cola llena se descarta el registro en vez de bloquear."""
+        pipeline = LogPipeline(maxsize=2)
+        pipeline.attach(self.logger, [self.target])
+        for i in range(5):
+            self.logger.info("message %d", i)
+        self.assertEqual(pipeline.stats()["dropped"], 3)
+
+        pipeline.start()
+        pipeline.stop()
+        self.assertEqual(self.target.messages[:2], ["message 0", "message 1"])
+        report = json.loads(self.target.messages[2])
+        self.assertEqual(report["dropped"], 3)
+        self.assertEqual(report["level"], "warning")
+
+    def test_sampling_keeps_warnings(self):
+        pipeline = LogPipeline()
+        pipeline.attach(self.logger, [self.target])
+        pipeline.sampler.configure({"test_log_pipeline": 0.25})
+        pipeline.start()
+        for i in range(8):
+            self.logger.info("message %d", i)
+        self.logger.warning("warning")
+        pipeline.stop()
+
+        self.assertEqual(self.target.messages, ["message 0", "message 4", "warning"])
+        self.assertEqual(pipeline.stats()["sampled_out"], 6)
+        # Stopping removes the sampling filter too
+        self.assertEqual(self.logger.filters, [])
+
+    def test_replaced_handlers_are_restored(self):
+        """Con replace, los registros de los loggers hijos pasan por la cola."""
+        previous = _ListHandler()
+        self.logger.addHandler(previous)
+        handlers = list(self.logger.handlers)
+        child = logging.getLogger("test_log_pipeline.child")
+        pipeline = LogPipeline()
+        pipeline.start()
+        pipeline.attach(self.logger, [self.target], replace=True)
+        child.info("from the child")
+        pipeline.stop()
+
+        self.assertEqual(self.target.messages, ["from the child"])
+        self.assertEqual(previous.messages, [])
+        self.assertEqual(self.logger.handlers, handlers)
+        self.logger.removeHandler(previous)
+
+
+class AppLoggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update({"TESTING": True, "SCHEDULER_API_ENABLED": False})
+
+    def tearDown(self):
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def test_module_loggers_go_through_the_pipeline(self):
+        root = logging.getLogger()
+        pipeline_handlers = [h for h in root.handlers if isinstance(h, QueueHandler)]
+        self.assertEqual(len(pipeline_handlers), 1)
+        # The basicConfig handler of utils.py was replaced
+        self.assertFalse(any(type(h) is logging.StreamHandler for h in root.handlers))
+
+        token = uuid.uuid4().hex
+        for name in ("agent_api", "mcp_sync", "playbook_executor", "utils"):
+            logging.getLogger(name).warning("%s %s", name, token)
+        self.app.log_pipeline.stop()
+
+        log_path = os.path.join(self.app.instance_path, "app.log")
+        with open(log_path) as f:
+            lines = [line for line in f if token in line]
+        self.assertEqual(len(lines), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
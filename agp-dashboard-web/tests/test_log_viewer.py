@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import log_viewer
+from log_viewer import LogTailer, read_page
+
+
+class LogViewerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.dir, "app.log")
+        self.counter = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _log(self, count, path=None, **fields):
+        with open(path or self.log_path, "a") as f:
+            for _ in range(count):
+                record = {"event": f"event {self.counter}", "level": "info", **fields}
+                f.write(json.dumps(record) + "\n")
+                self.counter += 1
+
+    def _rotate(self):
+        os.rename(self.log_path, f"{self.log_path}.1")
+
+    def _events(self, page):
+        return [r["event"] for r in page["records"]]
+
+    def test_pages_go_backwards_across_rotated_files(self):
+        self._log(5)
+        self._rotate()
+        self._log(3)
+
+        page = read_page(self.log_path, limit=4)
+        self.assertEqual(self._events(page), [f"event {i}" for i in range(4, 8)])
+
+        page = read_page(self.log_path, cursor=page["cursor"], limit=4)
+        self.assertEqual(self._events(page), [f"event {i}" for i in range(0, 4)])
+
+        page = read_page(self.log_path, cursor=page["cursor"], limit=4)
+        self.assertEqual(page["records"], [])
+        self.assertIsNone(page["cursor"])
+
+    def test_small_blocks_keep_lines_intact(self):
+        self._log(50, detail="x" * 37)
+        with mock.patch.object(log_viewer, "BLOCK_SIZE", 64):
+            page = read_page(self.log_path, limit=100)
+        self.assertEqual(self._events(page), [f"event {i}" for i in range(50)])
+
+    def test_filters(self):
+        """Se filtra por nivel, agente y texto del evento en el servidor."""
+        self._log(3)
+        self._log(2, level="error", agent_id="agent-1")
+        self._log(1, level="error", agent_id="agent-2")
+        with open(self.log_path, "a") as f:
+            f.write("Traceback (most recent call last):\n")
+
+        page = read_page(self.log_path, filters={"level": "ERROR"})
+        self.assertEqual(len(page["records"]), 3)
+        page = read_page(self.log_path, filters={"agent_id": "agent-1"})
+        self.assertEqual(self._events(page), ["event 3", "event 4"])
+        page = read_page(self.log_path, filters={"event": "traceback"})
+        self.assertEqual(len(page["records"]), 1)
+
+        with self.assertRaises(ValueError):
+            read_page(self.log_path, cursor="nonsense")
+
+    def test_tailer_follows_rotation(self):
+        self._log(2)
+        tailer = LogTailer(self.log_path)
+        self.assertEqual(tailer.poll(), [])
+
+        self._log(1)
+        # Partial line: only returned once complete
+        with open(self.log_path, "a") as f:
+            f.write('{"event": "partial"')
+        self.assertEqual([r["event"] for r in tailer.poll()], ["event 2"])
+
+        with open(self.log_path, "a") as f:
+            f.write("}\n")
+        self._rotate()
+        self._log(1)
+        self.assertEqual([r["event"] for r in tailer.poll()], ["partial", "event 3"])
+
+    def test_tailer_drains_a_large_rotated_file(self):
+        """Tras una rotación se lee el archivo anterior entero, en varias pasadas."""
+        self._log(1)
+        tailer = LogTailer(self.log_path)
+        self._log(50)
+        self._rotate()
+        self._log(1)
+
+        events = []
+        with mock.patch.object(log_viewer, "MAX_SCAN_BYTES", 1000):
+            for _ in range(20):
+                events.extend(r["event"] for r in tailer.poll())
+        self.assertEqual(events, [f"event {i}" for i in range(1, 52)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import templating
+from app import create_app
+from extensions import scheduler
+from flask import render_template_string
+from menu import MenuCache
+from models import db
+
+MENU = [
+    {"type": "link", "name": "Resumen", "url": "dashboard", "icon": "bi-house"},
+    {
+        "type": "submenu",
+        "name": "SYSTEM",
+        "id": "system-submenu",
+        "icon": "bi-hdd",
+        "items": [
+            {"name": "Logs", "url": "logs_viewer", "icon": "bi-file"},
+            {"name": "No registrado", "url": "missing.page", "icon": "bi-x"},
+            {"name": "Docs", "url": "https://example.com", "external": True},
+        ],
+    },
+]
+
+
+class MenuTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app()
+        cls.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        with cls.app.app_context():
+            db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.drop_all()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def test_menu_is_built_once_with_resolved_urls(self):
+        cache = MenuCache(MENU)
+        with self.app.test_request_context("/"):
+            menu = cache.main_menu()
+            with patch("menu.url_for") as url_for:
+                self.assertIs(cache.main_menu(), menu)
+                url_for.assert_not_called()
+
+        self.assertEqual(menu[0]["url"], "/summary")
+        items = menu[1]["items"]
+        self.assertEqual(
+            [item["url"] for item in items], ["/logs_viewer", "https://example.com"]
+        )
+        with self.assertRaises(TypeError):
+            items[0]["url"] = "/otra"
+
+        # Montada bajo un prefijo, la aplicación tiene su propio menú
+        with self.app.test_request_context("/", base_url="http://localhost/agp"):
+            self.assertEqual(cache.main_menu()[0]["url"], "/agp/summary")
+
+    def test_fragments_are_cached_by_locale(self):
+        """El fragmento se renderiza una vez por idioma."""
+        template = (
+            '{% call cached_fragment("sidebar") %}{{ counter.pop() }}{% endcall %}'
+        )
+        counter = [3, 2, 1]
+        self.app.jinja_env.auto_reload = False
+        try:
+            with self.app.test_request_context("/"):
+                first = render_template_string(template, counter=counter)
+                second = render_template_string(template, counter=counter)
+            with self.app.test_request_context("/"), patch(
+                "menu.get_locale", return_value="en"
+            ):
+                english = render_template_string(template, counter=counter)
+        finally:
+            self.app.jinja_env.auto_reload = True
+        self.assertEqual((first, second, english), ("1", "1", "2"))
+
+        # Con recarga automática de plantillas no se cachea
+        with self.app.test_request_context("/"):
+            self.assertEqual(render_template_string(template, counter=counter), "3")
+
+    def test_sidebar_is_only_cached_in_production(self):
+        """En desarrollo las plantillas se recargan y la barra no se cachea."""
+        self.assertTrue(self.app.jinja_env.auto_reload)
+        fragments = dict(self.app.menu_cache._fragments)
+        self.app.test_client().get("/logs_viewer")
+        self.assertEqual(self.app.menu_cache._fragments, fragments)
+
+        app = create_app()
+        instance = tempfile.mkdtemp()
+        try:
+            app.config.update(
+                {
+                    "TESTING": True,
+                    "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                    "PRODUCTION": True,
+                    "TEMPLATES_AUTO_RELOAD": None,
+                }
+            )
+            app.instance_path = instance
+            templating.init_app(app)
+            with app.app_context():
+                db.create_all()
+            client = app.test_client()
+            first = client.get("/logs_viewer").get_data(as_text=True)
+            self.assertEqual(
+                [key[0] for key in app.menu_cache._fragments], ["sidebar"]
+            )
+            # Se sirve la barra cacheada aunque el menú cambie
+            with patch.object(app.menu_cache, "main_menu", return_value=()):
+                second = client.get("/logs_viewer").get_data(as_text=True)
+            self.assertIn("Visor de Logs", second)
+            self.assertEqual(first, second)
+        finally:
+            shutil.rmtree(instance)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+
+import metrics
+from app import create_app
+from extensions import scheduler
+from metrics import Counter, Histogram, QueryStats, track_job
+from models import db
+from sqlalchemy import text
+
+
+class MetricTypesTestCase(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("h", "Help.", ("endpoint",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, ("index",))
+        lines = list(histogram.render())
+        self.assertIn('h_bucket{endpoint="index",le="0.1"} 1', lines)
+        self.assertIn('h_bucket{endpoint="index",le="1.0"} 3', lines)
+        self.assertIn('h_bucket{endpoint="index",le="+Inf"} 4', lines)
+        self.assertIn('h_count{endpoint="index"} 4', lines)
+        self.assertIn('h_sum{endpoint="index"} 4.25', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("c_total", "Help.", ("event",))
+        counter.inc(('say "hi"\n',), 2)
+        self.assertIn('c_total{event="say \\"hi\\"\\n"} 2', list(counter.render()))
+
+    def test_native_threads_do_not_lose_updates(self):
+        """Los trabajos fuera del hub registran métricas desde hilos nativos."""
+        counter = Counter("c_total", "Help.", ("job",))
+        histogram = Histogram("h", "Help.", ("job",), buckets=(1.0,))
+
+        def record():
+            for _ in range(20000):
+                counter.inc(("backup",))
+                histogram.observe(0.5, ("backup",))
+
+        threads = [metrics._threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.values[("backup",)], 80000)
+        self.assertIn('h_count{job="backup"} 80000', list(histogram.render()))
+
+    def test_track_job_counts_failures(self):
+        @track_job
+        def failing_job():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            failing_job()
+        self.assertEqual(metrics.JOB_FAILURES.values[("failing_job",)], 1)
+        self.assertEqual(metrics.JOB_DURATION.values[("failing_job",)][0][0], 1)
+
+    def test_query_stats_find_repeated_statements(self):
+        queries = QueryStats()
+        for agent_id in range(6):
+            queries.add("SELECT * FROM agent WHERE id = ?", 0.001)
+        queries.add("SELECT * FROM user", 0.002)
+        self.assertEqual(queries.count, 7)
+        self.assertAlmostEqual(queries.seconds, 0.008)
+        self.assertEqual(
+            queries.repeated(5), [("SELECT * FROM agent WHERE id = ?", 6)]
+        )
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app()
+        cls.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        cls.client = cls.app.test_client()
+        with cls.app.app_context():
+            db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.drop_all()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def test_requests_are_measured(self):
+        """Cada petición queda registrada por endpoint y código de estado."""
+        self.client.get("/logs_viewer/records?limit=1")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        body = response.get_data(as_text=True)
+        self.assertIn(
+            'agp_http_requests_total{endpoint="logs_viewer_records",'
+            'method="GET",status="200"}',
+            body,
+        )
+        self.assertIn("agp_connected_agents 0", body)
+        self.assertIn("# TYPE agp_db_query_duration_seconds histogram", body)
+
+    def test_template_render_time_is_measured(self):
+        self.client.get("/system/profiles")
+        self.assertIn(
+            ("system.profiles_page", "system/profiles.html"),
+            metrics.TEMPLATE_RENDER_DURATION.values,
+        )
+
+    def test_repeated_queries_are_reported(self):
+        """Una consulta repetida en bucle se cuenta y se expone en cabeceras."""
+        with self.app.test_request_context("/n_plus_one"):
+            self.app.preprocess_request()
+            for _ in range(6):
+                db.session.execute(text("SELECT 1"))
+            response = self.app.process_response(self.app.response_class("ok"))
+        # Fuera del modo debug no se añaden cabeceras
+        self.assertNotIn("X-DB-Query-Count", response.headers)
+        self.assertEqual(metrics.REPEATED_QUERIES.values[("unmatched",)], 1)
+
+        # Con la caché de usuarios vacía el auto-login vuelve a consultar la base
+        self.app.user_cache.clear()
+        self.app.debug = True
+        try:
+            response = self.client.get("/api/dashboard_stats")
+        finally:
+            self.app.debug = False
+        self.assertGreaterEqual(int(response.headers["X-DB-Query-Count"]), 1)
+        self.assertIn("X-DB-Time-Ms", response.headers)
+        self.assertEqual(response.headers["X-DB-Repeated-Statements"], "0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from collections import Counter
+
+import profiling
+from flask import Flask
+from profiling import flamegraph, list_profiles, read_stacks, save_stacks
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.profiles_dir = os.path.join(self.dir, "profiles")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _app(self, **config):
+        app = Flask(__name__, instance_path=self.dir)
+        app.config.update(config)
+
+        @app.route("/slow")
+        def slow():
+            _busy(0.1)
+            return "ok"
+
+        profiling.init_app(app)
+        return app
+
+    def test_disabled_installs_no_hooks(self):
+        app = self._app()
+        self.assertEqual(app.before_request_funcs, {})
+        self.assertEqual(app.teardown_request_funcs, {})
+        self.assertEqual(app.config["PROFILES_DIR"], self.profiles_dir)
+
+    def test_header_profiles_the_request(self):
+        """Con la cabecera X-Profile se perfila aunque la tasa de muestreo sea 0."""
+        app = self._app(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0)
+        client = app.test_client()
+        client.get("/slow")
+        self.assertEqual(list_profiles(self.profiles_dir), [])
+
+        client.get("/slow", headers={"X-Profile": "1"})
+        stacks = read_stacks(os.path.join(self.profiles_dir, "slow.folded"))
+        self.assertGreater(sum(stacks.values()), 5)
+        self.assertTrue(any("_busy (test_profiling.py" in s for s in stacks))
+
+    def test_stacks_are_aggregated_into_a_tree(self):
+        save_stacks(self.profiles_dir, "index", Counter({"a;b": 2, "a;c": 1}))
+        save_stacks(self.profiles_dir, "index", Counter({"a;b": 3}))
+        self.assertEqual(
+            list_profiles(self.profiles_dir), [{"endpoint": "index", "samples": 6}]
+        )
+
+        tree = flamegraph(self.profiles_dir, "index")
+        self.assertEqual(tree["value"], 6)
+        (a,) = tree["children"]
+        self.assertEqual(a["value"], 6)
+        self.assertEqual(
+            [(child["name"], child["value"]) for child in a["children"]],
+            [("b", 5), ("c", 1)],
+        )
+        self.assertIsNone(flamegraph(self.profiles_dir, "missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
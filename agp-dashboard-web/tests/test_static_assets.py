@@ -0,0 +1,118 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import static_assets
+from flask import Flask, url_for
+from static_assets import build, load_manifest
+
+CSS = b"body { color: #333; }\n" * 200
+SERVICE_WORKER = """const PRECACHE_MANIFEST = {"version": "dev", "urls": []};
+const CACHE_NAME = 'agp-dashboard-cache-' + PRECACHE_MANIFEST.version;
+"""
+
+
+class StaticAssetsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.static = os.path.join(self.dir, "static")
+        self.build_dir = os.path.join(self.dir, "build")
+        self._write("css/style.css", CSS)
+        self._write("icons/icon.png", b"\x89PNG" + os.urandom(64))
+        self._write("uploads/photo.jpg", b"jpeg")
+        self._write("sw.js", SERVICE_WORKER.encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, rel_path, data):
+        path = os.path.join(self.static, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _build(self):
+        return build(self.static, "/static", self.build_dir)
+
+    def _app(self):
+        app = Flask(__name__, static_folder=self.static)
+        app.config.update({"STATIC_BUILD": True, "STATIC_BUILD_DIR": self.build_dir})
+        self.assertIsNotNone(static_assets.init_app(app))
+        return app
+
+    def test_build_fingerprints_and_compresses(self):
+        manifest = self._build()
+        css = manifest["files"]["css/style.css"]
+        png = manifest["files"]["icons/icon.png"]
+        self.assertRegex(css["name"], r"^css/style\.[0-9a-f]{12}\.css$")
+        self.assertIn(".gz", css["encodings"])
+        self.assertEqual(png["encodings"], [])
+        self.assertNotIn("uploads/photo.jpg", manifest["files"])
+
+        with open(os.path.join(self.build_dir, css["name"] + ".gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), CSS)
+
+        with open(os.path.join(self.build_dir, "sw.js")) as f:
+            service_worker = f.read()
+        precache = json.loads(service_worker.split(" = ", 1)[1].split(";\n", 1)[0])
+        self.assertEqual(precache["version"], manifest["version"])
+        self.assertIn(f"/static/{css['name']}", precache["urls"])
+
+    def test_rebuild_keeps_the_previous_build_only(self):
+        """Tras recompilar se conservan los archivos de la versión anterior."""
+        first = self._build()["files"]["css/style.css"]["name"]
+        self._write("css/style.css", CSS + b"a {}\n")
+        second = self._build()["files"]["css/style.css"]["name"]
+        self._write("css/style.css", CSS + b"p {}\n")
+        third = self._build()["files"]["css/style.css"]["name"]
+
+        self.assertEqual(len({first, second, third}), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.build_dir, first)))
+        self.assertTrue(os.path.exists(os.path.join(self.build_dir, second)))
+        current = load_manifest(self.build_dir)["files"]["css/style.css"]
+        self.assertEqual(current["name"], third)
+
+    def test_fingerprinted_files_are_served_precompressed(self):
+        manifest = self._build()
+        css = manifest["files"]["css/style.css"]
+        app = self._app()
+        client = app.test_client()
+        with app.test_request_context():
+            url = url_for("static", filename="css/style.css")
+        self.assertEqual(url, f"/static/{css['name']}")
+
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.mimetype, "text/css")
+        self.assertEqual(gzip.decompress(response.data), CSS)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        response.close()
+
+        if static_assets.brotli is not None:
+            response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+            self.assertEqual(response.headers["Content-Encoding"], "br")
+            response.close()
+
+        response = client.get(url)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.data, CSS)
+        response.close()
+
+        # Los archivos fuera de la compilación se sirven como siempre
+        response = client.get("/static/uploads/photo.jpg")
+        self.assertEqual(response.data, b"jpeg")
+        self.assertNotIn("immutable", response.headers.get("Cache-Control", ""))
+        response.close()
+
+        response = client.get("/static/sw.js")
+        self.assertIn(manifest["version"], response.get_data(as_text=True))
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+        response.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import templating
+from app import create_app
+from extensions import scheduler
+
+
+class TemplatingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update({"TESTING": True})
+        self.dir = tempfile.mkdtemp()
+        self.app.instance_path = self.dir
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def test_development_reloads_templates(self):
+        self.assertTrue(self.app.jinja_env.auto_reload)
+        self.assertIsNone(self.app.jinja_env.bytecode_cache)
+
+    def test_production_precompiles_into_the_bytecode_cache(self):
+        """En producción las plantillas se compilan al arrancar y no se recargan."""
+        self.app.config.update({"PRODUCTION": True, "TEMPLATES_AUTO_RELOAD": None})
+        templating.init_app(self.app)
+
+        self.assertFalse(self.app.jinja_env.auto_reload)
+        cache_dir = os.path.join(self.dir, templating.BYTECODE_CACHE_DIR)
+        compiled = len(self.app.jinja_env.list_templates())
+        self.assertGreater(len(os.listdir(cache_dir)), compiled // 2)
+
+        # Sin la caché en memoria se carga el bytecode en vez de compilar
+        self.app.jinja_env.cache.clear()
+        with patch.object(self.app.jinja_env, "compile") as compile_:
+            template = self.app.jinja_env.get_template("base.html")
+        compile_.assert_not_called()
+        self.assertEqual(template.name, "base.html")
+
+
+if __name__ == "__main__":
+    unittest.main()
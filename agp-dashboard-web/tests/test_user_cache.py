@@ -0,0 +1,88 @@
+import unittest
+
+from app import create_app
+from extensions import scheduler
+from models import Notification, User, db
+from sqlalchemy import event
+
+
+class UserCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config.update(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "SCHEDULER_API_ENABLED": False,
+            }
+        )
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        admin = User(username="admin")
+        admin.set_password("password")
+        db.session.add(admin)
+        db.session.commit()
+        self.admin_id = admin.id
+
+        self.user_queries = []
+        self.engine = db.engine
+        event.listen(self.engine, "before_cursor_execute", self._count_query)
+
+    def tearDown(self):
+        event.remove(self.engine, "before_cursor_execute", self._count_query)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        if scheduler and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+    def _count_query(self, conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM user" in statement:
+            self.user_queries.append(statement)
+
+    def test_auto_login_uses_the_cache(self):
+        """El admin se busca una vez, no en cada petición."""
+        for _ in range(3):
+            response = self.app.test_client().get("/api/dashboard_stats")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.user_queries), 1)
+
+        # Sesión ya iniciada: load_user también sale de la caché
+        client = self.app.test_client()
+        for _ in range(3):
+            client.get("/api/dashboard_stats")
+        self.assertEqual(len(self.user_queries), 1)
+
+    def test_static_files_skip_the_hook(self):
+        self.app.user_cache.clear()
+        self.app.test_client().get("/static/swagger.json")
+        self.assertEqual(self.user_queries, [])
+
+    def test_password_change_invalidates(self):
+        cache = self.app.user_cache
+        old_hash = cache.get_by_username("admin").password_hash
+        db.session.remove()
+
+        admin = db.session.get(User, self.admin_id)
+        admin.set_password("new password")
+        db.session.commit()
+        db.session.remove()
+
+        admin = cache.get_by_username("admin")
+        self.assertNotEqual(admin.password_hash, old_hash)
+        self.assertTrue(admin.check_password("new password"))
+
+    def test_cached_user_is_attached_to_the_session(self):
+        self.app.user_cache.get(self.admin_id)
+        db.session.remove()
+
+        admin = self.app.user_cache.get(self.admin_id)
+        self.assertEqual(len(self.user_queries), 1)
+        db.session.add(Notification(user_id=admin.id, message="hola"))
+        db.session.commit()
+        self.assertEqual(admin.notifications.count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
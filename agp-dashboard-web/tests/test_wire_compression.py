@@ -0,0 +1,44 @@
+import unittest
+
+from wire_compression import (
+    COMPRESSION_THRESHOLD,
+    MessageCodec,
+    is_compressed_frame,
+    negotiate,
+)
+
+
+class WireCompressionTestCase(unittest.TestCase):
+    def test_negotiate_falls_back_to_deflate(self):
+        self.assertEqual(negotiate(["deflate"]), "deflate")
+        self.assertIsNone(negotiate(["brotli"]))
+        self.assertIsNone(negotiate(None))
+
+    def test_small_messages_stay_as_text(self):
+        codec = MessageCodec("deflate")
+        frame = codec.encode({"type": "shell_input", "input": "ls\n"})
+        self.assertIsInstance(frame, str)
+
+    def test_large_messages_are_compressed(self):
+        """Los mensajes grandes viajan comprimidos y se cuentan los bytes."""
+        sender, receiver = MessageCodec("deflate"), MessageCodec("deflate")
+        message = {"type": "shell_output", "output": "línea de log\n" * 500}
+
+        frame = sender.encode(message)
+        self.assertTrue(is_compressed_frame(frame))
+        self.assertEqual(receiver.decode(frame), message)
+
+        sent = sender.counters.as_dict()
+        self.assertGreater(sent["raw_out"], COMPRESSION_THRESHOLD)
+        self.assertLess(sent["wire_out"], sent["raw_out"] // 10)
+        self.assertEqual(receiver.counters.as_dict()["raw_in"], sent["raw_out"])
+
+    def test_no_codec_never_compresses(self):
+        codec = MessageCodec()
+        frame = codec.encode({"output": "x" * 10_000})
+        self.assertIsInstance(frame, str)
+        self.assertEqual(codec.decode(frame), {"output": "x" * 10_000})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Short-lived cache of user identities for the login hooks.
+
+``auto_login_admin`` looks the admin up by username on every anonymous
+request, and Flask-Login's ``load_user`` loads the user by id on every
+authenticated one. Both go through ``UserCache`` instead, which keeps the
+users' column values for ``USER_CACHE_SECONDS`` and rebuilds the instance in
+the request's session without a query, so relationships such as
+``user.notifications`` still load lazily as usual.
+
+Any insert, update or delete of a ``User`` in this process (a password reset,
+for instance) clears the cache at flush time. Changes made by another process,
+such as the ``reset-admin-password`` command, are seen once the entries
+expire.
+"""
+
+import time
+import weakref
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+# How long a user's identity is trusted before it is loaded again
+USER_CACHE_SECONDS = 30
+
+_CHANGE_EVENTS = ("after_insert", "after_update", "after_delete")
+# Every live cache, cleared together when a user changes
+_caches = weakref.WeakSet()
+
+
+def _clear_caches(mapper, connection, target):
+    for cache in list(_caches):
+        cache.clear()
+
+
+class UserCache:
+    """Users by id and by username, kept for ``ttl`` seconds."""
+
+    def __init__(self, db, model, ttl=USER_CACHE_SECONDS):
+        self.db = db
+        self.model = model
+        self.ttl = ttl
+        self._columns = [attr.key for attr in inspect(model).column_attrs]
+        self._by_id = {}  # id -> (expires, column values, or None if missing)
+        self._ids = {}  # username -> (expires, id, or None if missing)
+        _caches.add(self)
+        for name in _CHANGE_EVENTS:
+            if not event.contains(model, name, _clear_caches):
+                event.listen(model, name, _clear_caches)
+
+    def get(self, user_id):
+        """The user with ``user_id`` attached to the current session, or None."""
+        now = time.monotonic()
+        expires, values = self._by_id.get(user_id, (0, None))
+        if expires <= now:
+            user = self.db.session.get(self.model, user_id)
+            self._remember(user, user_id, now)
+            return user
+        return None if values is None else self._attach(values)
+
+    def get_by_username(self, username):
+        """The user named ``username`` attached to the current session, or None."""
+        now = time.monotonic()
+        expires, user_id = self._ids.get(username, (0, None))
+        if expires > now:
+            return None if user_id is None else self.get(user_id)
+        user = self.model.query.filter_by(username=username).first()
+        self._ids[username] = (now + self.ttl, user.id if user else None)
+        if user is not None:
+            self._remember(user, user.id, now)
+        return user
+
+    def clear(self):
+        self._by_id.clear()
+        self._ids.clear()
+
+    def _remember(self, user, user_id, now):
+        values = None
+        if user is not None:
+            values = {key: getattr(user, key) for key in self._columns}
+        self._by_id[user_id] = (now + self.ttl, values)
+
+    def _attach(self, values):
+        user = self.model(**values)
+        make_transient_to_detached(user)
+        # load=False: adopt the cached state instead of loading it again
+        return self.db.session.merge(user, load=False)
@@ -7,6 +7,7 @@ from datetime import datetime
 
 import requests
 from cryptography.fernet import Fernet
+from delta_sync import REMOTE_MCPS_DIR
 
 # Import models and db within the function to avoid circular imports
 # from models import AuditLog
@@ -20,7 +21,7 @@ app_logger = logging.getLogger(__name__)
 
 # Directorios de configuración
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-AGENT_REMOTE_MCPS_DIR = os.path.join(BASE_DIR, "instance", "remote_mcps")
+AGENT_REMOTE_MCPS_DIR = REMOTE_MCPS_DIR
 CUSTOM_TOOLS_DIR = os.path.join(BASE_DIR, "instance", "custom_tools")
 TAREAS_FILE = os.path.join(BASE_DIR, "instance", "tareas.json")
 
@@ -0,0 +1,125 @@
+"""
+Per-connection compression of agent <-> dashboard messages.
+
+During authentication the agent offers the codecs it supports and the
+dashboard picks one. From then on, JSON messages larger than
+``COMPRESSION_THRESHOLD`` bytes travel as binary frames::
+
+    b"Z" + codec id (1 byte) + compressed UTF-8 JSON
+
+Smaller messages stay as plain JSON text, where compression would cost more
+than it saves. Each side keeps byte counters before and after compression so
+the savings can be observed per agent.
+"""
+
+import json
+import threading
+import zlib
+
+# zstd is preferred when available, deflate (zlib) is always supported
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FRAME_COMPRESSED = b"Z"
+COMPRESSION_THRESHOLD = 1024
+
+_CODEC_IDS = {"zstd": b"s", "deflate": b"d"}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+
+
+def supported_codecs():
+    """Codecs available in this process, in order of preference."""
+    return ["zstd", "deflate"] if zstandard else ["deflate"]
+
+
+def negotiate(offered):
+    """Picks the preferred codec also offered by the peer, or ``None``."""
+    offered = offered or []
+    return next((c for c in supported_codecs() if c in offered), None)
+
+
+def _compress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def is_compressed_frame(frame):
+    return isinstance(frame, (bytes, bytearray)) and frame[:1] == FRAME_COMPRESSED
+
+
+class TrafficCounters:
+    """Bytes sent and received, before (raw) and after (wire) compression."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.raw_in = self.wire_in = 0
+        self.raw_out = self.wire_out = 0
+
+    def record_in(self, raw, wire):
+        with self._lock:
+            self.raw_in += raw
+            self.wire_in += wire
+
+    def record_out(self, raw, wire):
+        with self._lock:
+            self.raw_out += raw
+            self.wire_out += wire
+
+    def as_dict(self):
+        with self._lock:
+            raw = self.raw_in + self.raw_out
+            wire = self.wire_in + self.wire_out
+            return {
+                "raw_in": self.raw_in,
+                "wire_in": self.wire_in,
+                "raw_out": self.raw_out,
+                "wire_out": self.wire_out,
+                "ratio": round(wire / raw, 3) if raw else 1.0,
+            }
+
+
+class MessageCodec:
+    """Encodes and decodes JSON messages for one connection."""
+
+    def __init__(self, codec=None, threshold=COMPRESSION_THRESHOLD):
+        self.codec = codec
+        self.threshold = threshold
+        self.counters = TrafficCounters()
+
+    def encode(self, message):
+        """Returns ``str`` for plain messages and ``bytes`` for compressed ones."""
+        text = json.dumps(message)
+        raw = text.encode("utf-8")
+        if self.codec and len(raw) >= self.threshold:
+            frame = FRAME_COMPRESSED + _CODEC_IDS[self.codec]
+            frame += _compress(self.codec, raw)
+            self.counters.record_out(len(raw), len(frame))
+            return frame
+        self.counters.record_out(len(raw), len(raw))
+        return text
+
+    def decode_frame(self, frame):
+        """Returns the JSON text carried by a compressed binary frame."""
+        codec = _CODEC_NAMES.get(bytes(frame[1:2]))
+        if codec is None:
+            raise ValueError("Unknown compression codec in frame.")
+        raw = _decompress(codec, bytes(frame[2:]))
+        self.counters.record_in(len(raw), len(frame))
+        return raw.decode("utf-8")
+
+    def decode(self, message):
+        """Parses a text or compressed message into a Python object."""
+        if is_compressed_frame(message):
+            return json.loads(self.decode_frame(message))
+        size = len(message.encode("utf-8") if isinstance(message, str) else message)
+        self.counters.record_in(size, size)
+        return json.loads(message)
@@ -1,23 +1,44 @@
 # agp-enterprise-agent/api_server.py
 
-from typing import Any, Dict
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Tuple
 
-import requests  # To send results back to the dashboard
-from fastapi import APIRouter, BackgroundTasks, Depends, FastAPI, HTTPException, status
+import config
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from logic import execute_command, get_system_health
+from metrics import MetricsPusher
 from models import Task, TaskResult, TaskStatus
+from modules import ModuleError, ModuleRunner
+from reporter import DashboardReporter, ProgressBatcher
+from task_queue import DuplicateTaskError, QueueFullError, TaskScheduler
 
 # Placeholder for configuration
 # In a real app, this would come from config.py
 SECRET_TOKEN = "your_super_secret_token"
 DASHBOARD_URL = "http://<IP_DASHBOARD>:5000" # The dashboard's API endpoint
-DASHBOARD_API_TOKEN = "dashboard_secret_token"
+# The dashboard checks reports against this agent's own API key
+DASHBOARD_API_TOKEN = config.AUTH_TOKEN
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts the reporter, the task scheduler and the metrics push with the server."""
+    await reporter.start()
+    module_runner.start()
+    await scheduler.start()
+    await metrics_pusher.start()
+    yield
+    await metrics_pusher.stop()
+    await scheduler.stop()
+    await module_runner.stop()
+    await reporter.stop()
 
 app = FastAPI(
     title="AGP Enterprise Agent",
     description="API for the AGP Enterprise Agent, accessible via a secure tailnet.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Security scheme
@@ -37,25 +58,51 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(auth_
 # Create a router for our API endpoints
 api_router = APIRouter(dependencies=[Depends(verify_token)])
 
-def report_task_result(result: TaskResult):
-    """Sends the task result back to the dashboard."""
+# Results and progress go back to the dashboard through one pooled client
+reporter = DashboardReporter(
+    DASHBOARD_URL,
+    DASHBOARD_API_TOKEN,
+    outbox_path=config.RESULT_OUTBOX_FILE,
+    agent_id=config.AGENT_ID,
+)
+
+# Health is pushed to the dashboard over the same client instead of being polled
+metrics_pusher = MetricsPusher(
+    config.AGENT_ID,
+    get_system_health,
+    lambda: reporter.client,
+    interval=config.METRICS_INTERVAL_SECONDS,
+    push_every=config.METRICS_PUSH_EVERY,
+)
+
+# CPU-heavy built-in modules run in worker processes, off the event loop
+module_runner = ModuleRunner(config.MODULE_ROOTS, max_workers=config.MODULE_WORKERS)
+
+async def run_module(task: Task) -> Tuple[bool, str]:
     try:
-        url = f"{DASHBOARD_URL}/api/v1/agents/report_result"
-        headers = {"Authorization": f"Bearer {DASHBOARD_API_TOKEN}"}
-        response = requests.post(url, json=result.dict(), headers=headers, timeout=10)
-        response.raise_for_status()
-        print(f"INFO: Successfully reported result for task {result.task_id} to the dashboard.")
-    except requests.RequestException as e:
-        print(f"ERROR: Failed to report result for task {result.task_id} to dashboard: {e}")
-
-async def run_task_in_background(task: Task):
+        output = await module_runner.run(task.module, task.module_args)
+    except (ModuleError, OSError, TypeError, ValueError) as e:
+        return False, f"Module {task.module} failed: {e}"
+    return True, json.dumps(output)
+
+async def run_task_in_background(task: Task) -> TaskResult:
     """The actual logic to run the task and report back."""
     print(f"INFO: Executing task {task.task_id} in the background.")
     
-    # For now, we assume the playbook content is a simple command string
-    # e.g., "ls -la"
-    command_parts = task.playbook.content.split()
-    success, output = await execute_command(command_parts)
+    if task.module:
+        success, output = await run_module(task)
+    else:
+        # For now, we assume the playbook content is a simple command string
+        # e.g., "ls -la"
+        command_parts = task.playbook.content.split()
+        batcher = ProgressBatcher(task.task_id, reporter.send_progress)
+        batcher.start()
+        try:
+            success, output = await execute_command(
+                command_parts, on_output=batcher.add
+            )
+        finally:
+            await batcher.stop()
     
     status = TaskStatus.COMPLETED if success else TaskStatus.FAILED
     error_message = output if not success else None
@@ -69,8 +116,18 @@ async def run_task_in_background(task: Task):
     )
     
     # Send the report back to the dashboard
-    report_task_result(result)
+    await reporter.submit(result)
     print(f"INFO: Task {task.task_id} finished with status {status}.")
+    return result
+
+scheduler = TaskScheduler(
+    run_task_in_background,
+    reporter.submit,
+    concurrency=config.MAX_CONCURRENT_TASKS,
+    default_timeout=config.TASK_TIMEOUT_SECONDS or None,
+    state_path=config.TASK_QUEUE_FILE,
+    max_queued=config.MAX_QUEUED_TASKS,
+)
 
 
 @api_router.post("/heartbeat", tags=["Status"])
@@ -86,11 +143,52 @@ async def system_health() -> Dict[str, Any]:
     return get_system_health()
 
 @api_router.post("/execute_task", status_code=status.HTTP_202_ACCEPTED, tags=["Tasks"])
-async def execute_task(task: Task, background_tasks: BackgroundTasks) -> Dict[str, str]:
-    """Accepts a task for asynchronous execution."""
+async def execute_task(task: Task) -> Dict[str, Any]:
+    """Queues a task for asynchronous execution."""
     print(f"INFO: Received task {task.task_id} for playbook {task.playbook.name}")
-    background_tasks.add_task(run_task_in_background, task)
-    return {"message": "Task execution started", "task_id": task.task_id, "status": "running"}
+    try:
+        await scheduler.submit(task)
+    except DuplicateTaskError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Task {task.task_id} is already queued or running.",
+        )
+    except QueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"The task queue is full ({scheduler.max_queued} tasks waiting).",
+        )
+    return {
+        "message": "Task queued",
+        "task_id": task.task_id,
+        "status": TaskStatus.PENDING,
+        "queue_position": scheduler.position(task.task_id),
+    }
+
+@api_router.get("/tasks", tags=["Tasks"])
+async def list_tasks() -> List[Dict[str, Any]]:
+    """Lists queued, running and recently finished tasks."""
+    return scheduler.list()
+
+def _get_record(task_id: str):
+    record = scheduler.records.get(task_id)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+    return record
+
+@api_router.get("/tasks/{task_id}", tags=["Tasks"])
+async def get_task(task_id: str) -> Dict[str, Any]:
+    """Returns the status, queue position and runtime of a task."""
+    return scheduler.describe(_get_record(task_id))
+
+@api_router.delete("/tasks/{task_id}", tags=["Tasks"])
+async def cancel_task(task_id: str) -> Dict[str, Any]:
+    """Cancels a queued or running task."""
+    _get_record(task_id)
+    record = await scheduler.cancel(task_id)
+    return scheduler.describe(record)
 
 
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,44 @@
+# agp-enterprise-agent/benchmarks.py
+# Micro-benchmarks for the agent's hot paths. Run with: python benchmarks.py
+
+import contextlib
+import io
+import timeit
+
+from health import HealthCollector
+from logic import ALLOWED_COMMANDS_PATH, whitelist
+from whitelist import CommandWhitelist
+
+
+def _report(name: str, seconds: float, number: int) -> None:
+    print(f"{name:<40} {seconds / number * 1e6:10.3f} µs/op")
+
+
+def bench_whitelist(number: int = 100_000) -> None:
+    """Cost of a whitelist check, allowed and denied, plus a full reload."""
+    allowed = timeit.timeit(lambda: whitelist.check("ls", ["-la"]), number=number)
+    _report("whitelist.check (allowed)", allowed, number)
+    denied = timeit.timeit(lambda: whitelist.check("rm", ["-rf", "/"]), number=number)
+    _report("whitelist.check (denied)", denied, number)
+    reload_number = number // 100
+    # Each load logs a line; keep it out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        reload = timeit.timeit(
+            lambda: CommandWhitelist(ALLOWED_COMMANDS_PATH), number=reload_number
+        )
+    _report("whitelist load from disk", reload, reload_number)
+
+
+def bench_health(number: int = 1_000) -> None:
+    """Cost of /system_health, from the cache and collecting from /proc."""
+    collector = HealthCollector()
+    collector.get()
+    cached = timeit.timeit(collector.get, number=number * 100)
+    _report("health (cached)", cached, number * 100)
+    collect = timeit.timeit(collector.collect, number=number)
+    _report("health (collect)", collect, number)
+
+
+if __name__ == "__main__":
+    bench_whitelist()
+    bench_health()
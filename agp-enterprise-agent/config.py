@@ -4,6 +4,9 @@ import os
 # Agent's unique identifier, can be overridden by environment variable
 AGENT_ID = os.environ.get("AGP_AGENT_ID", "agent-001-test")
 
+# The agent's API key generated by the dashboard; authorizes its reports
+AUTH_TOKEN = os.environ.get("AGP_AUTH_TOKEN", "")
+
 # Dashboard WebSocket URL, can be overridden by environment variable
 # The "ws" scheme is for local testing without SSL. For production, it should be "wss".
 DASHBOARD_URL = os.environ.get("AGP_DASHBOARD_URL", "ws://localhost:8765")
@@ -13,4 +16,29 @@ DASHBOARD_URL = os.environ.get("AGP_DASHBOARD_URL", "ws://localhost:8765")
 CERT_DIR = os.path.join(os.path.dirname(__file__), "certs")
 CERT_FILE = os.path.join(CERT_DIR, "agent.pem")
 KEY_FILE = os.path.join(CERT_DIR, "agent.key")
-CA_FILE = os.path.join(CERT_DIR, "ca.pem")
\ No newline at end of file
+CA_FILE = os.path.join(CERT_DIR, "ca.pem")
+
+# Task scheduling: how many tasks run at once, how many may wait, the default
+# per-task timeout (0 disables it) and where queued tasks are kept across restarts
+MAX_CONCURRENT_TASKS = int(os.environ.get("AGP_MAX_CONCURRENT_TASKS", "2"))
+MAX_QUEUED_TASKS = int(os.environ.get("AGP_MAX_QUEUED_TASKS", "1000"))
+TASK_TIMEOUT_SECONDS = float(os.environ.get("AGP_TASK_TIMEOUT_SECONDS", "3600"))
+TASK_QUEUE_FILE = os.environ.get(
+    "AGP_TASK_QUEUE_FILE", os.path.join(os.path.dirname(__file__), "task_queue.json")
+)
+
+# Task results not yet acknowledged by the dashboard are kept here
+RESULT_OUTBOX_FILE = os.environ.get(
+    "AGP_RESULT_OUTBOX_FILE",
+    os.path.join(os.path.dirname(__file__), "result_outbox.jsonl"),
+)
+
+# Health metrics are sampled every interval and pushed to the dashboard in batches
+METRICS_INTERVAL_SECONDS = float(os.environ.get("AGP_METRICS_INTERVAL_SECONDS", "10"))
+METRICS_PUSH_EVERY = int(os.environ.get("AGP_METRICS_PUSH_EVERY", "3"))
+
+# CPU-heavy built-in modules run in worker processes, on paths under these roots
+MODULE_WORKERS = int(os.environ.get("AGP_MODULE_WORKERS", "0")) or os.cpu_count() or 1
+MODULE_ROOTS = os.environ.get("AGP_MODULE_ROOTS", os.path.expanduser("~")).split(
+    os.pathsep
+)
@@ -0,0 +1,207 @@
+# agp-enterprise-agent/health.py
+
+import copy
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Filesystems backed by a device; pseudo filesystems (proc, tmpfs, ...) are skipped
+PSEUDO_FILESYSTEMS = frozenset(
+    {
+        "autofs", "bpf", "cgroup", "cgroup2", "configfs", "debugfs", "devpts",
+        "devtmpfs", "fusectl", "hugetlbfs", "mqueue", "nsfs", "overlay", "proc",
+        "pstore", "ramfs", "securityfs", "squashfs", "sysfs", "tmpfs", "tracefs",
+    }
+)  # fmt: skip
+
+CpuTimes = Tuple[int, int]  # (busy, total) jiffies
+
+
+def read_meminfo(path: str = "/proc/meminfo") -> Dict[str, int]:
+    """Parses /proc/meminfo by key, values in kB."""
+    info = {}
+    with open(path, "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields = value.split()
+            if fields:
+                info[key] = int(fields[0])
+    return info
+
+
+def read_cpu_times(path: str = "/proc/stat") -> Dict[str, CpuTimes]:
+    """Busy and total jiffies for the aggregate "cpu" line and every core."""
+    times = {}
+    with open(path, "r") as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            name, *fields = line.split()
+            values = [int(v) for v in fields]
+            # user nice system idle iowait irq softirq steal (guest is in user)
+            total = sum(values[:8])
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            times[name] = (total - idle, total)
+    return times
+
+
+def read_net_dev(path: str = "/proc/net/dev") -> Dict[str, Dict[str, int]]:
+    """Byte, packet, error and drop counters per network interface."""
+    counters = {}
+    with open(path, "r") as f:
+        for line in f.readlines()[2:]:
+            name, _, data = line.partition(":")
+            fields = [int(v) for v in data.split()]
+            counters[name.strip()] = {
+                "rx_bytes": fields[0],
+                "rx_packets": fields[1],
+                "rx_errors": fields[2],
+                "rx_dropped": fields[3],
+                "tx_bytes": fields[8],
+                "tx_packets": fields[9],
+                "tx_errors": fields[10],
+                "tx_dropped": fields[11],
+            }
+    return counters
+
+
+def list_mounts(path: str = "/proc/self/mounts") -> List[str]:
+    """Mount points of real filesystems, one per device, always including /."""
+    mounts = ["/"]
+    seen_devices = set()
+    with open(path, "r") as f:
+        for line in f:
+            device, mount_point, fs_type = line.split()[:3]
+            if fs_type in PSEUDO_FILESYSTEMS or device in seen_devices:
+                continue
+            seen_devices.add(device)
+            # Spaces and other characters are octal-escaped in the mounts file
+            mount_point = re.sub(
+                r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), mount_point
+            )
+            if mount_point not in mounts:
+                mounts.append(mount_point)
+    return mounts
+
+
+def disk_usage(mount_point: str) -> Dict[str, Any]:
+    st = os.statvfs(mount_point)
+    total = st.f_blocks * st.f_frsize
+    free = st.f_bavail * st.f_frsize
+    used = total - st.f_bfree * st.f_frsize
+    # Like df: used / (used + space available to unprivileged users)
+    percent = used / (used + free) * 100 if used + free > 0 else 0
+    return {
+        "total_bytes": total,
+        "used_bytes": used,
+        "free_bytes": free,
+        "percent": round(percent, 1),
+    }
+
+
+class HealthCollector:
+    """
+    Gathers system health from /proc and statvfs, without spawning processes.
+
+    CPU utilisation is the busy share of jiffies between two consecutive
+    collections (since boot on the first one). Results are cached for `ttl`
+    seconds so frequent polling reads /proc at most once per interval; every
+    caller gets its own copy of the cached result.
+    """
+
+    def __init__(self, ttl: float = 2.0):
+        self.ttl = ttl
+        self._cached: Optional[Dict[str, Any]] = None
+        self._expires = 0.0
+        self._previous_cpu: Dict[str, CpuTimes] = {}
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        cached = self._cached
+        if cached is None or now >= self._expires:
+            with self._lock:
+                if self._cached is None or time.monotonic() >= self._expires:
+                    self._cached = self.collect()
+                    self._expires = time.monotonic() + self.ttl
+                cached = self._cached
+        # A copy, so a caller changing the result does not change the cache
+        return copy.deepcopy(cached)
+
+    def collect(self) -> Dict[str, Any]:
+        health_data: Dict[str, Any] = {"collected_at": time.time()}
+        self._collect_memory(health_data)
+        self._collect_disks(health_data)
+        self._collect_cpu(health_data)
+        self._collect_network(health_data)
+        return health_data
+
+    def _collect_memory(self, health_data: Dict[str, Any]) -> None:
+        try:
+            info = read_meminfo()
+            total_kb = info["MemTotal"]
+            available_kb = info.get("MemAvailable", info.get("MemFree", 0))
+            used_kb = total_kb - available_kb
+            ram_percent = (used_kb / total_kb) * 100 if total_kb > 0 else 0
+            health_data["ram_percent"] = round(ram_percent, 1)
+            health_data["memory"] = {
+                "total_kb": total_kb,
+                "available_kb": available_kb,
+                "swap_total_kb": info.get("SwapTotal", 0),
+                "swap_free_kb": info.get("SwapFree", 0),
+            }
+        except (OSError, KeyError, ValueError) as e:
+            health_data["ram_percent"] = -1
+            health_data["ram_error"] = str(e)
+
+    def _collect_disks(self, health_data: Dict[str, Any]) -> None:
+        try:
+            mounts = list_mounts()
+        except (OSError, ValueError):
+            mounts = ["/"]
+        disks = {}
+        for mount_point in mounts:
+            try:
+                disks[mount_point] = disk_usage(mount_point)
+            except OSError as e:
+                if mount_point == "/":
+                    health_data["disk_error"] = str(e)
+        health_data["disks"] = disks
+        health_data["disk_percent"] = disks["/"]["percent"] if "/" in disks else -1
+
+    def _collect_cpu(self, health_data: Dict[str, Any]) -> None:
+        try:
+            with open("/proc/loadavg", "r") as f:
+                load_1m, load_5m, load_15m = f.read().split()[:3]
+            health_data["cpu_load_1m"] = float(load_1m)
+            health_data["cpu_load_5m"] = float(load_5m)
+            health_data["cpu_load_15m"] = float(load_15m)
+        except (OSError, ValueError) as e:
+            health_data["cpu_load_1m"] = -1
+            health_data["cpu_error"] = str(e)
+
+        try:
+            times = read_cpu_times()
+        except (OSError, ValueError) as e:
+            health_data["cpu_percent"] = -1
+            health_data["cpu_error"] = str(e)
+            return
+        percents = {}
+        for name, (busy, total) in times.items():
+            prev_busy, prev_total = self._previous_cpu.get(name, (0, 0))
+            elapsed = total - prev_total
+            percent = (busy - prev_busy) / elapsed * 100 if elapsed > 0 else 0
+            percents[name] = round(percent, 1)
+        self._previous_cpu = times
+        health_data["cpu_percent"] = percents.pop("cpu", -1)
+        cores = sorted(percents, key=lambda name: int(name[3:]))
+        health_data["cpu_per_core"] = [percents[name] for name in cores]
+
+    def _collect_network(self, health_data: Dict[str, Any]) -> None:
+        try:
+            health_data["network"] = read_net_dev()
+        except (OSError, ValueError, IndexError) as e:
+            health_data["network"] = {}
+            health_data["network_error"] = str(e)
@@ -1,38 +1,108 @@
 # agp-enterprise-agent/logic.py
 
 import asyncio
-import json
+import codecs
 import os
-import subprocess
-from typing import Any, Dict, List, Tuple
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+from health import HealthCollector
+from whitelist import CommandWhitelist
 
 ALLOWED_COMMANDS_PATH = os.path.join(os.path.dirname(__file__), "allowed_commands.json")
 
-def get_allowed_commands() -> List[str]:
-    """Loads the list of allowed commands from the JSON file."""
-    try:
-        with open(ALLOWED_COMMANDS_PATH, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("WARN: allowed_commands.json not found or invalid. No commands will be executed.")
-        return []
+# Loaded once and hot-reloaded when the file changes
+whitelist = CommandWhitelist(ALLOWED_COMMANDS_PATH)
+
+# Health is read from /proc and statvfs, and cached for a couple of seconds
+health_collector = HealthCollector()
+
+# Output is read in chunks as it arrives; only this much is kept for the final result
+OUTPUT_CHUNK_SIZE = 4096
+MAX_OUTPUT_BYTES = 1024 * 1024
+TRUNCATION_NOTICE = "\n[... output truncated ...]\n"
+
+OutputCallback = Callable[[str, str], Awaitable[None]]
+
+
+class OutputBuffer:
+    """Keeps the head and the tail of a stream within a fixed byte budget."""
+
+    def __init__(self, max_bytes: int = MAX_OUTPUT_BYTES):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.truncated = False
+
+    def append(self, data: bytes) -> None:
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+                self.truncated = True
 
-async def execute_command(command_parts: list) -> Tuple[bool, str]:
+    def text(self) -> str:
+        head = self.head.decode(errors="replace")
+        tail = self.tail.decode(errors="replace")
+        if self.truncated:
+            return head + TRUNCATION_NOTICE + tail
+        return head + tail
+
+def get_allowed_commands() -> FrozenSet[str]:
+    """Returns the names of the commands currently allowed."""
+    return whitelist.commands
+
+async def _pump(
+    stream: asyncio.StreamReader,
+    name: str,
+    buffer: OutputBuffer,
+    on_output: Optional[OutputCallback],
+) -> None:
+    # A multi-byte character may be split across two reads
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = await stream.read(OUTPUT_CHUNK_SIZE)
+        if not data:
+            break
+        buffer.append(data)
+        if on_output is not None:
+            text = decoder.decode(data)
+            if text:
+                await on_output(name, text)
+    if on_output is not None:
+        text = decoder.decode(b"", final=True)
+        if text:
+            await on_output(name, text)
+
+
+async def execute_command(
+    command_parts: list,
+    on_output: Optional[OutputCallback] = None,
+    max_output_bytes: int = MAX_OUTPUT_BYTES,
+) -> Tuple[bool, str]:
     """
     Executes a command securely by checking it against a whitelist.
     `command_parts` is a list where the first element is the command
     and subsequent elements are its arguments.
+
+    stdout and stderr are read incrementally as the process produces them.
+    Each chunk is passed to `on_output(stream_name, text)` when given, and
+    at most `max_output_bytes` per stream are retained for the return value.
     """
     if not command_parts:
         return False, "No command provided."
 
     command = command_parts[0]
     args = command_parts[1:]
-    allowed_commands = get_allowed_commands()
+    denied = whitelist.check(command, args)
 
-    if command not in allowed_commands:
-        print(f"WARN: Attempt to execute disallowed command: {command}")
-        return False, f"Command '{command}' is not allowed."
+    if denied is not None:
+        print(f"WARN: Attempt to execute disallowed command: {' '.join(command_parts)}")
+        return False, denied
 
     try:
         print(f"Executing command: {' '.join(command_parts)}")
@@ -42,53 +112,30 @@ async def execute_command(command_parts: list) -> Tuple[bool, str]:
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
-        stdout, stderr = await proc.communicate()
+        stdout = OutputBuffer(max_output_bytes)
+        stderr = OutputBuffer(max_output_bytes)
+        try:
+            await asyncio.gather(
+                _pump(proc.stdout, "stdout", stdout, on_output),
+                _pump(proc.stderr, "stderr", stderr, on_output),
+            )
+            await proc.wait()
+        except asyncio.CancelledError:
+            # Cancelled or timed out by the scheduler: don't leave the process behind
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
 
         if proc.returncode == 0:
-            return True, stdout.decode().strip()
+            return True, stdout.text().strip()
         else:
-            return False, stderr.decode().strip()
+            return False, stderr.text().strip()
     except FileNotFoundError:
         return False, f"Command not found: {command}"
     except Exception as e:
         return False, f"Execution failed: {str(e)}"
 
 def get_system_health() -> Dict[str, Any]:
-    """Gathers CPU, RAM, and Disk health metrics."""
-    health_data: Dict[str, Any] = {}
-
-    # RAM Usage from /proc/meminfo
-    try:
-        with open('/proc/meminfo', 'r') as f:
-            lines = f.readlines()
-
-        mem_total_kb = int(lines[0].split()[1])
-        mem_available_kb = int(lines[2].split()[1])
-        mem_used_kb = mem_total_kb - mem_available_kb
-        ram_percent = (mem_used_kb / mem_total_kb) * 100 if mem_total_kb > 0 else 0
-        health_data['ram_percent'] = round(ram_percent, 1)
-    except (IOError, IndexError, ValueError) as e:
-        health_data['ram_percent'] = -1
-        health_data['ram_error'] = str(e)
-
-    # Disk Usage from `df` command
-    try:
-        result = subprocess.run(['df', '-h', '/'], capture_output=True, text=True, check=True)
-        line = result.stdout.strip().splitlines()[-1]
-        parts = line.split()
-        health_data['disk_percent'] = float(parts[4].replace('%', ''))
-    except (subprocess.CalledProcessError, IndexError, ValueError) as e:
-        health_data['disk_percent'] = -1
-        health_data['disk_error'] = str(e)
-
-    # CPU Load Average from /proc/loadavg
-    try:
-        with open('/proc/loadavg', 'r') as f:
-            load_1m, load_5m, _ = f.read().split()[:3]
-        health_data['cpu_load_1m'] = float(load_1m)
-        health_data['cpu_load_5m'] = float(load_5m)
-    except (IOError, ValueError) as e:
-        health_data['cpu_load_1m'] = -1
-        health_data['cpu_error'] = str(e)
-
-    return health_data
+    """Gathers CPU, RAM, disk and network health metrics (cached briefly)."""
+    return health_collector.get()
@@ -1,12 +1,25 @@
 # main.py
+import os
+import sys
+
 import uvicorn
 
+# "development" reloads on code changes; "production" runs a single process
+# without the reloader (the task queue and the module workers live in-process)
+PROFILES = {
+    "development": {"reload": True, "log_level": "info"},
+    "production": {"reload": False, "log_level": "warning", "access_log": False},
+}
+
 if __name__ == "__main__":
-    print("Starting AGP Enterprise Agent API server...")
+    default_profile = os.environ.get("AGP_PROFILE", "development")
+    profile = sys.argv[1] if len(sys.argv) > 1 else default_profile
+    if profile not in PROFILES:
+        sys.exit(f"Unknown profile '{profile}'. Use one of: {', '.join(PROFILES)}")
+    print(f"Starting AGP Enterprise Agent API server ({profile})...")
     uvicorn.run(
         "api_server:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True, # Use reload for development
-        log_level="info"
+        port=int(os.environ.get("AGP_PORT", "8000")),
+        **PROFILES[profile],
     )
@@ -0,0 +1,171 @@
+# agp-enterprise-agent/metrics.py
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+METRICS_PATH = "/api/v1/agents/report_metrics"
+
+# A numeric field is only resent when it moved at least this much since the
+# value the dashboard last received. Matched by key suffix, first match wins.
+METRIC_THRESHOLDS = [
+    ("percent", 1.0),
+    ("cpu_load_1m", 0.05),
+    ("cpu_load_5m", 0.05),
+    ("cpu_load_15m", 0.05),
+    ("_kb", 1024),
+    ("_bytes", 1024 * 1024),
+]
+DEFAULT_THRESHOLD = 0
+
+# Fields that change on every sample and carry no information for the dashboard
+IGNORED_FIELDS = frozenset({"collected_at"})
+
+def flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Flattens nested dicts and lists into dotted keys, e.g. "disks./.percent"."""
+    flat = {}
+    items = data.items() if isinstance(data, dict) else enumerate(data)
+    for key, value in items:
+        name = f"{prefix}{key}"
+        if isinstance(value, (dict, list)):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+def threshold_for(key: str) -> float:
+    for suffix, threshold in METRIC_THRESHOLDS:
+        if key.endswith(suffix):
+            return threshold
+    return DEFAULT_THRESHOLD
+
+def changed(old: Any, new: Any, threshold: float) -> bool:
+    numeric = (int, float)
+    if isinstance(old, numeric) and isinstance(new, numeric):
+        return new != old and abs(new - old) >= threshold
+    return old != new
+
+class DeltaEncoder:
+    """
+    Turns successive snapshots into samples holding only what changed.
+
+    A sample is `{"seq", "ts", "full", "changed", "removed"}`. Values are
+    compared with the last value sent rather than the last one sampled, so
+    slow drifts are still reported once they add up to the threshold. A full
+    snapshot is sent first, every `full_every` samples, and whenever the
+    dashboard asks for a resync.
+    """
+
+    def __init__(self, full_every: int = 60):
+        self.full_every = full_every
+        self.seq = 0
+        self.sent: Dict[str, Any] = {}
+        self.force_full = True
+
+    def encode(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        flat = {k: v for k, v in flatten(snapshot).items() if k not in IGNORED_FIELDS}
+        full = self.force_full or self.seq % self.full_every == 0
+        if full:
+            delta = flat
+            removed: List[str] = []
+            self.sent = dict(flat)
+        else:
+            delta = {
+                key: value
+                for key, value in flat.items()
+                if key not in self.sent
+                or changed(self.sent[key], value, threshold_for(key))
+            }
+            removed = [key for key in self.sent if key not in flat]
+            self.sent.update(delta)
+            for key in removed:
+                del self.sent[key]
+        self.force_full = False
+        sample = {
+            "seq": self.seq,
+            "ts": round(snapshot.get("collected_at", time.time()), 3),
+            "full": full,
+            "changed": delta,
+            "removed": removed,
+        }
+        self.seq += 1
+        return sample
+
+    def resync(self) -> None:
+        self.force_full = True
+
+class MetricsPusher:
+    """
+    Periodically samples health and pushes delta-encoded batches to the dashboard.
+
+    Samples are taken every `interval` seconds and sent together every
+    `push_every` samples. Unsent samples are kept up to `max_pending`; past
+    that the backlog is dropped and the next sample is a full snapshot, so the
+    dashboard never applies a delta on top of a state it did not receive.
+    """
+
+    def __init__(
+        self,
+        agent_id: str,
+        collect: Callable[[], Dict[str, Any]],
+        client_factory: Callable[[], Optional[httpx.AsyncClient]],
+        interval: float = 10.0,
+        push_every: int = 3,
+        max_pending: int = 360,
+    ):
+        self.agent_id = agent_id
+        self.collect = collect
+        self.client_factory = client_factory
+        self.interval = interval
+        self.push_every = push_every
+        self.max_pending = max_pending
+        self.encoder = DeltaEncoder()
+        self.pending: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def sample(self) -> None:
+        if len(self.pending) >= self.max_pending:
+            print(f"WARN: Dropping {len(self.pending)} unsent metric samples.")
+            self.pending.clear()
+            self.encoder.resync()
+        self.pending.append(self.encoder.encode(self.collect()))
+
+    async def push(self) -> bool:
+        client = self.client_factory()
+        if client is None or not self.pending:
+            return False
+        batch = list(self.pending)
+        payload = {"agent_id": self.agent_id, "samples": batch}
+        try:
+            response = await client.post(METRICS_PATH, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"WARN: Failed to push {len(batch)} metric sample(s): {e}")
+            return False
+        del self.pending[: len(batch)]
+        try:
+            resync = response.json().get("resync", False)
+        except ValueError:
+            resync = False
+        if resync:
+            # The dashboard lost track of this agent (e.g. it restarted)
+            self.encoder.resync()
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            if len(self.pending) >= self.push_every:
+                await self.push()
+            await asyncio.sleep(self.interval)
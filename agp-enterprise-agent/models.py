@@ -1,7 +1,7 @@
 # agp-enterprise-agent/models.py
 
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -12,6 +12,7 @@ class TaskStatus(str, Enum):
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class Playbook(BaseModel):
     """Represents an automation playbook."""
@@ -22,6 +23,11 @@ class Task(BaseModel):
     """Represents a task to be executed by the agent."""
     task_id: str
     playbook: Playbook
+    priority: int = 0  # Higher runs first
+    timeout_seconds: Optional[float] = None  # Falls back to the agent default
+    # Built-in module to run instead of the playbook command, e.g. "checksum"
+    module: Optional[str] = None
+    module_args: Dict[str, Any] = {}
 
 class TaskResult(BaseModel):
     """Represents the result of a task execution to be sent back to the dashboard."""
@@ -29,3 +35,14 @@ class TaskResult(BaseModel):
     status: TaskStatus
     output: str
     error: Optional[str] = None
+
+class OutputChunk(BaseModel):
+    """A piece of command output, tagged with the stream it came from."""
+    stream: str  # "stdout" or "stderr"
+    data: str
+
+class TaskProgress(BaseModel):
+    """A batch of incremental output sent while a task is still running."""
+    task_id: str
+    seq: int
+    chunks: List[OutputChunk]
@@ -0,0 +1,219 @@
+# agp-enterprise-agent/modules.py
+
+import asyncio
+import fnmatch
+import hashlib
+import multiprocessing
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+READ_BLOCK_SIZE = 1024 * 1024
+MAX_SEARCH_RESULTS = 1000
+MAX_SEARCH_FILE_BYTES = 16 * 1024 * 1024
+
+class ModuleError(Exception):
+    """Raised when a module is unknown or called with invalid arguments."""
+
+# --- Built-in modules ---
+# They run in worker processes, so they must be plain top-level functions
+# taking and returning picklable values.
+
+def checksum(path: str, algorithm: str = "sha256") -> Dict[str, Any]:
+    """Hashes a file in blocks."""
+    if algorithm not in hashlib.algorithms_guaranteed:
+        raise ModuleError(f"Unsupported algorithm: {algorithm}")
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            digest.update(block)
+    return {"path": path, "algorithm": algorithm, "digest": digest.hexdigest()}
+
+def archive(source: str, destination: str, format: str = "gztar") -> Dict[str, Any]:
+    """Creates an archive of `source`; `destination` is the name without extension."""
+    if format not in {name for name, _ in shutil.get_archive_formats()}:
+        raise ModuleError(f"Unsupported archive format: {format}")
+    root_dir, base_dir = os.path.split(os.path.abspath(source))
+    path = shutil.make_archive(destination, format, root_dir, base_dir)
+    return {"path": path, "size": os.path.getsize(path)}
+
+def file_search(
+    root: str,
+    pattern: str = "*",
+    contains: Optional[str] = None,
+    max_results: int = MAX_SEARCH_RESULTS,
+) -> Dict[str, Any]:
+    """Finds files under `root` by name glob and, optionally, text content."""
+    needle = contains.encode() if contains else None
+    matches: List[str] = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in fnmatch.filter(filenames, pattern):
+            path = os.path.join(dirpath, name)
+            if needle is not None and not _file_contains(path, needle):
+                continue
+            matches.append(path)
+            if len(matches) >= max_results:
+                return {"matches": matches, "truncated": True}
+    return {"matches": matches, "truncated": False}
+
+def _file_contains(path: str, needle: bytes) -> bool:
+    try:
+        if os.path.getsize(path) > MAX_SEARCH_FILE_BYTES:
+            return False
+        with open(path, "rb") as f:
+            return needle in f.read()
+    except OSError:
+        return False
+
+MODULES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "checksum": checksum,
+    "archive": archive,
+    "file_search": file_search,
+}
+
+# Arguments holding paths, checked against the allowed roots before running
+PATH_ARGUMENTS = {
+    "checksum": ("path",),
+    "archive": ("source", "destination"),
+    "file_search": ("root",),
+}
+
+def _worker_main(conn) -> None:
+    """Entry point of a worker process: runs module calls until the pipe closes."""
+    while True:
+        try:
+            name, args = conn.recv()
+        except EOFError:
+            break
+        try:
+            outcome = ("ok", MODULES[name](**args))
+        except Exception as e:
+            outcome = ("error", e)
+        try:
+            conn.send(outcome)
+        except Exception as e:
+            # The exception itself may not pickle
+            conn.send(("error", ModuleError(f"{type(e).__name__}: {e}")))
+    conn.close()
+
+class _Worker:
+    """A worker process and the parent's end of its pipe."""
+
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+def _reap(process: multiprocessing.process.BaseProcess, timeout: float) -> None:
+    """Waits for a terminated worker to exit, killing it if it does not."""
+    process.join(timeout)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+class ModuleRunner:
+    """
+    Runs built-in modules in a pool of worker processes so CPU-bound work
+    (hashing, compression, scanning) never blocks the agent's event loop.
+
+    Workers are started on demand with the "spawn" method, which is safe to
+    use from a process that already runs threads and an event loop, and are
+    reused for later calls. At most `max_workers` run at once, by default one
+    per core. When a call is cancelled, e.g. by the task timeout, the worker
+    running it is terminated, so the work stops with it, and a new one takes
+    its place on the next call. Path arguments must resolve inside one of
+    `allowed_roots`.
+    """
+
+    def __init__(
+        self,
+        allowed_roots: Sequence[str],
+        max_workers: Optional[int] = None,
+        reap_timeout: float = 1.0,
+    ):
+        self.allowed_roots = [os.path.realpath(root) for root in allowed_roots]
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.reap_timeout = reap_timeout
+        self.context = multiprocessing.get_context("spawn")
+        # Live worker processes, idle or busy
+        self.processes: Set[multiprocessing.process.BaseProcess] = set()
+        self._idle: List[_Worker] = []
+        self._busy: Set[_Worker] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def start(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    async def stop(self) -> None:
+        self._slots = None
+        workers = self._idle + list(self._busy)
+        self._idle = []
+        await asyncio.gather(*(self._end(worker) for worker in workers))
+
+    def validate(self, name: str, args: Dict[str, Any]) -> None:
+        if name not in MODULES:
+            raise ModuleError(f"Unknown module: {name}")
+        for key in PATH_ARGUMENTS[name]:
+            if key not in args:
+                continue
+            path = os.path.realpath(str(args[key]))
+            if not any(
+                path == root or path.startswith(root + os.sep)
+                for root in self.allowed_roots
+            ):
+                raise ModuleError(f"Path not allowed for {name}: {args[key]}")
+
+    async def run(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        self.validate(name, args)
+        if self._slots is None:
+            raise ModuleError("The module runner is not running.")
+        async with self._slots:
+            worker = self._idle.pop() if self._idle else await self._spawn()
+            self._busy.add(worker)
+            try:
+                status, value = await self._call(worker, name, args)
+            except BaseException:
+                # Also reached on cancellation: the work must not outlive the task
+                await self._end(worker)
+                raise
+            self._busy.discard(worker)
+            self._idle.append(worker)
+        if status == "error":
+            raise value
+        return value
+
+    async def _spawn(self) -> _Worker:
+        # Starting a spawned interpreter takes a while: not on the event loop
+        worker = await asyncio.to_thread(_Worker, self.context)
+        self.processes.add(worker.process)
+        return worker
+
+    async def _call(self, worker: _Worker, name: str, args: Dict[str, Any]):
+        worker.conn.send((name, args))
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+        try:
+            return worker.conn.recv()
+        except EOFError:
+            raise ModuleError(
+                f"Module {name} exited with code {worker.process.exitcode}"
+            ) from None
+
+    async def _end(self, worker: _Worker) -> None:
+        """Terminates a worker; the join runs in a thread, off the event loop."""
+        self._busy.discard(worker)
+        worker.conn.close()
+        process = worker.process
+        if process.is_alive():
+            process.terminate()
+        try:
+            await asyncio.to_thread(_reap, process, self.reap_timeout)
+        finally:
+            self.processes.discard(process)
@@ -0,0 +1,300 @@
+# agp-enterprise-agent/reporter.py
+
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+from models import OutputChunk, TaskProgress, TaskResult
+
+# HTTP/2 is used when the optional h2 package is installed
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+RESULTS_PATH = "/api/v1/agents/report_results"
+PROGRESS_PATH = "/api/v1/agents/report_progress"
+
+# Client errors that are retried anyway: a token the dashboard does not know
+# yet or throttling says nothing about the results themselves. A 404 is not
+# among them: a dashboard without the route would keep every result forever
+RETRYABLE_STATUS_CODES = frozenset({401, 403, 408, 425, 429})
+
+# Running output is batched: a report is sent every interval or once this much is queued
+PROGRESS_INTERVAL_SECONDS = 2.0
+PROGRESS_MAX_BATCH_BYTES = 64 * 1024
+
+def _is_rejection(error: httpx.HTTPError) -> bool:
+    """A client error that sending the same payload again would not fix."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    code = error.response.status_code
+    return 400 <= code < 500 and code not in RETRYABLE_STATUS_CODES
+
+class DashboardReporter:
+    """
+    Sends task results and progress to the dashboard over one pooled client.
+
+    Results are appended to a local outbox file before anything is sent, and
+    only removed once the dashboard acknowledged them, so they survive both
+    dashboard outages and agent restarts. Pending results are sent in batches
+    of up to `batch_size`; failed attempts are retried with full-jitter
+    exponential backoff. A result the dashboard rejects with a client error
+    would be rejected forever, so it is moved to `<outbox>.rejected` instead
+    of blocking the results behind it; when a whole batch is rejected, its
+    results are sent one by one to find the culprit. Progress reports are
+    best effort and never queued.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_token: str,
+        outbox_path: Optional[str] = None,
+        batch_size: int = 50,
+        batch_delay: float = 0.5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float = 10.0,
+        agent_id: Optional[str] = None,
+    ):
+        self.base_url = base_url
+        self.agent_id = agent_id
+        self.api_token = api_token
+        self.outbox_path = outbox_path
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.dead_letter_path = f"{outbox_path}.rejected" if outbox_path else None
+        self.pending: List[TaskResult] = []
+        self.failures = 0
+        self.rejected = 0
+        # Results still to be sent one at a time after a batch was rejected
+        self._isolate = 0
+        self.client: Optional[httpx.AsyncClient] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._outbox_lock: Optional[asyncio.Lock] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_token}"},
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+            http2=h2 is not None,
+        )
+        self.pending = self._load_outbox()
+        self._wakeup = asyncio.Event()
+        self._outbox_lock = asyncio.Lock()
+        if self.pending:
+            self._wakeup.set()
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def stop(self) -> None:
+        """Makes a last delivery attempt; anything left stays in the outbox."""
+        if self._sender is not None:
+            # Not in the middle of rewriting the outbox
+            async with self._outbox_lock:
+                self._sender.cancel()
+                await asyncio.gather(self._sender, return_exceptions=True)
+            self._sender = None
+        if self.pending:
+            await self._send_batch()
+        await self.client.aclose()
+
+    # --- Public API ---
+
+    async def submit(self, result: TaskResult) -> None:
+        """Queues a result for delivery. Returns once it is in the outbox."""
+        async with self._outbox_lock:
+            self.pending.append(result)
+            await asyncio.to_thread(self._append_outbox, result)
+        self._wakeup.set()
+
+    async def send_progress(self, progress: TaskProgress) -> None:
+        payload = {"agent_id": self.agent_id, **progress.dict()}
+        try:
+            response = await self.client.post(PROGRESS_PATH, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"WARN: Failed to report progress for task {progress.task_id}: {e}")
+
+    # --- Internals ---
+
+    def next_delay(self) -> float:
+        """Full-jitter exponential backoff based on consecutive failures."""
+        cap = min(self.max_delay, self.base_delay * (2 ** self.failures))
+        return random.uniform(0, cap)
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Give concurrent results a moment to join the same batch
+            await asyncio.sleep(self.batch_delay)
+            self._wakeup.clear()
+            while self.pending:
+                if await self._send_batch():
+                    self.failures = 0
+                    continue
+                self.failures += 1
+                delay = self.next_delay()
+                print(
+                    f"WARN: {len(self.pending)} result(s) pending, "
+                    f"retrying in {delay:.1f}s."
+                )
+                await asyncio.sleep(delay)
+
+    async def _send_batch(self) -> bool:
+        """Returns False when the batch should be retried later."""
+        batch = self.pending[: 1 if self._isolate else self.batch_size]
+        payload = {
+            "agent_id": self.agent_id,
+            "results": [result.dict() for result in batch],
+        }
+        try:
+            response = await self.client.post(RESULTS_PATH, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            if not _is_rejection(e):
+                print(f"ERROR: Failed to report {len(batch)} result(s): {e}")
+                return False
+            if len(batch) > 1:
+                print(f"WARN: Dashboard rejected {len(batch)} results, "
+                      f"sending them one by one: {e}")
+                self._isolate = len(batch)
+                return True
+            print(f"ERROR: Dashboard rejected the result of task {batch[0].task_id}, "
+                  f"moving it to {self.dead_letter_path}: {e}")
+            await self._remove_sent(batch, dead_letter=True)
+            return True
+        await self._remove_sent(batch)
+        ids = ", ".join(result.task_id for result in batch)
+        print(f"INFO: Successfully reported results for tasks {ids} to the dashboard.")
+        return True
+
+    async def _remove_sent(self, batch: List[TaskResult], dead_letter=False) -> None:
+        self._isolate = max(0, self._isolate - len(batch))
+        # New results may have been appended while the request was in flight
+        async with self._outbox_lock:
+            del self.pending[: len(batch)]
+            if dead_letter:
+                self.rejected += len(batch)
+                await asyncio.to_thread(self._append_dead_letters, batch)
+            await asyncio.to_thread(self._rewrite_outbox, list(self.pending))
+
+    def _append_dead_letters(self, batch: List[TaskResult]) -> None:
+        if not self.dead_letter_path:
+            return
+        with open(self.dead_letter_path, "a") as f:
+            for result in batch:
+                f.write(json.dumps(result.dict()) + "\n")
+
+    def _append_outbox(self, result: TaskResult) -> None:
+        if not self.outbox_path:
+            return
+        with open(self.outbox_path, "a") as f:
+            f.write(json.dumps(result.dict()) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_outbox(self, pending: List[TaskResult]) -> None:
+        if not self.outbox_path:
+            return
+        tmp_path = f"{self.outbox_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for result in pending:
+                f.write(json.dumps(result.dict()) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.outbox_path)
+
+    def _load_outbox(self) -> List[TaskResult]:
+        if not self.outbox_path or not os.path.exists(self.outbox_path):
+            return []
+        results = []
+        with open(self.outbox_path, "r") as f:
+            for line in f:
+                try:
+                    results.append(TaskResult(**json.loads(line)))
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    print(f"WARN: Skipping unreadable entry in {self.outbox_path}")
+        if results:
+            print(f"INFO: {len(results)} unreported result(s) found in the outbox.")
+        return results
+
+
+class ProgressBatcher:
+    """
+    Collects output chunks of a running task and reports them in batches.
+
+    A batch is sent once ``max_bytes`` are queued, and between start() and
+    stop() a timer sends whatever is queued every ``interval`` seconds, so
+    output is reported even while the command is silent.
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        send: Callable[[TaskProgress], Awaitable[None]],
+        interval: float = PROGRESS_INTERVAL_SECONDS,
+        max_bytes: int = PROGRESS_MAX_BATCH_BYTES,
+    ):
+        self.task_id = task_id
+        self.send = send
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.seq = 0
+        self.chunks: List[OutputChunk] = []
+        self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._timer = asyncio.create_task(self._tick())
+
+    async def stop(self) -> None:
+        """Stops the timer and sends what is left."""
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        await self.flush()
+
+    async def add(self, stream: str, data: str) -> None:
+        self.chunks.append(OutputChunk(stream=stream, data=data))
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.max_bytes:
+            await self.flush()
+
+    async def flush(self) -> None:
+        # One report at a time, so batches reach the dashboard in seq order
+        async with self._lock:
+            self.last_flush = time.monotonic()
+            if not self.chunks:
+                return
+            progress = TaskProgress(
+                task_id=self.task_id, seq=self.seq, chunks=self.chunks
+            )
+            self.seq += 1
+            self.chunks = []
+            self.pending_bytes = 0
+            await self.send(progress)
+
+    async def _tick(self) -> None:
+        while True:
+            delay = self.last_flush + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            await self.flush()
@@ -0,0 +1,286 @@
+# agp-enterprise-agent/task_queue.py
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models import Task, TaskResult, TaskStatus
+
+# Runs a task, reports its result and returns it; raising fails the task
+TaskRunner = Callable[[Task], Awaitable[TaskResult]]
+ResultReporter = Callable[[TaskResult], Awaitable[None]]
+
+ACTIVE_STATUSES = (TaskStatus.PENDING, TaskStatus.RUNNING)
+INTERRUPTED_ERROR = (
+    "Interrupted by an agent restart; not run again as it may have partly run."
+)
+
+class DuplicateTaskError(Exception):
+    """Raised when a task_id is submitted while it is still queued or running."""
+
+class QueueFullError(Exception):
+    """Raised when `max_queued` tasks are already waiting to run."""
+
+class TaskRecord:
+    """Bookkeeping for a task known to the scheduler."""
+
+    def __init__(self, task: Task, seq: int):
+        self.task = task
+        self.seq = seq
+        self.status = TaskStatus.PENDING
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.runner: Optional[asyncio.Task] = None
+
+    @property
+    def sort_key(self):
+        # Higher priority first, then first come first served
+        return (-self.task.priority, self.seq)
+
+    def runtime(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return round(end - self.started_at, 3)
+
+class TaskScheduler:
+    """
+    Runs tasks with a bounded concurrency, in priority order.
+
+    At most `max_queued` tasks wait in the queue; further submissions are
+    refused. Queued and running tasks are persisted to `state_path`: after a
+    restart queued tasks are picked up again, while tasks that were running
+    are reported as failed instead of being run a second time. Finished
+    tasks are kept in memory, up to `history_size`, for the status endpoints.
+    """
+
+    def __init__(
+        self,
+        runner: TaskRunner,
+        reporter: ResultReporter,
+        concurrency: int = 2,
+        default_timeout: Optional[float] = None,
+        state_path: Optional[str] = None,
+        history_size: int = 200,
+        max_queued: int = 1000,
+    ):
+        self.runner = runner
+        self.reporter = reporter
+        self.concurrency = max(1, concurrency)
+        self.default_timeout = default_timeout
+        self.state_path = state_path
+        self.history_size = history_size
+        self.max_queued = max_queued
+        self.queued = 0
+        self.records: Dict[str, TaskRecord] = {}
+        self._heap: List[Any] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Condition()
+        interrupted = []
+        for task, status in self._load_state():
+            record = self._enqueue(task)
+            if status == TaskStatus.RUNNING:
+                interrupted.append(record)
+        for record in interrupted:
+            self._finish(record, TaskStatus.FAILED, INTERRUPTED_ERROR)
+            await self.reporter(self._result(record))
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Stops the workers; unfinished tasks stay persisted for the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._save_state()
+
+    # --- Public API ---
+
+    async def submit(self, task: Task) -> TaskRecord:
+        record = self.records.get(task.task_id)
+        if record is not None and record.status in ACTIVE_STATUSES:
+            raise DuplicateTaskError(task.task_id)
+        if self.queued >= self.max_queued:
+            raise QueueFullError(task.task_id)
+        record = self._enqueue(task)
+        self._save_state()
+        async with self._wakeup:
+            self._wakeup.notify()
+        return record
+
+    async def cancel(self, task_id: str) -> Optional[TaskRecord]:
+        record = self.records.get(task_id)
+        if record is None or record.status not in ACTIVE_STATUSES:
+            return record
+        if record.runner is not None:
+            record.runner.cancel()
+        else:
+            # Still queued: the workers skip it when it reaches the top of the heap
+            self._finish(record, TaskStatus.CANCELLED, "Cancelled before start.")
+            await self.reporter(self._result(record))
+        return record
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position in the queue, or None if the task is not queued."""
+        record = self.records.get(task_id)
+        if record is None or record.status != TaskStatus.PENDING:
+            return None
+        ahead = sum(
+            1
+            for other in self.records.values()
+            if other.status == TaskStatus.PENDING and other.sort_key < record.sort_key
+        )
+        return ahead + 1
+
+    def describe(self, record: TaskRecord) -> Dict[str, Any]:
+        return self._describe(record, self.position(record.task.task_id))
+
+    def list(self) -> List[Dict[str, Any]]:
+        positions = self._positions()
+        records = sorted(self.records.values(), key=lambda r: r.seq)
+        return [self._describe(r, positions.get(r.task.task_id)) for r in records]
+
+    # --- Internals ---
+
+    def _positions(self) -> Dict[str, int]:
+        """Queue position of every pending task, from one pass over the heap."""
+        pending = sorted(
+            (entry for entry in self._heap if entry[2].status == TaskStatus.PENDING),
+            key=lambda entry: entry[0],
+        )
+        return {task_id: i for i, (_, task_id, _) in enumerate(pending, 1)}
+
+    def _describe(self, record: TaskRecord, position: Optional[int]) -> Dict[str, Any]:
+        return {
+            "task_id": record.task.task_id,
+            "playbook": record.task.playbook.name,
+            "priority": record.task.priority,
+            "status": record.status,
+            "queue_position": position,
+            "enqueued_at": record.enqueued_at,
+            "started_at": record.started_at,
+            "finished_at": record.finished_at,
+            "runtime_seconds": record.runtime(),
+            "error": record.error,
+        }
+
+    def _enqueue(self, task: Task) -> TaskRecord:
+        record = TaskRecord(task, next(self._seq))
+        self.records[task.task_id] = record
+        self.queued += 1
+        heapq.heappush(self._heap, (record.sort_key, task.task_id, record))
+        return record
+
+    async def _next_record(self) -> TaskRecord:
+        async with self._wakeup:
+            while True:
+                while self._heap:
+                    _, _, record = heapq.heappop(self._heap)
+                    if record.status == TaskStatus.PENDING:
+                        return record
+                await self._wakeup.wait()
+
+    async def _worker(self) -> None:
+        while True:
+            record = await self._next_record()
+            record.status = TaskStatus.RUNNING
+            record.started_at = time.time()
+            self.queued -= 1
+            self._save_state()
+            timeout = record.task.timeout_seconds or self.default_timeout
+            record.runner = asyncio.create_task(self.runner(record.task))
+            try:
+                result = await asyncio.wait_for(asyncio.shield(record.runner), timeout)
+                self._finish(record, result.status, result.error)
+            except asyncio.TimeoutError:
+                record.runner.cancel()
+                await asyncio.gather(record.runner, return_exceptions=True)
+                self._finish(record, TaskStatus.FAILED, f"Timed out after {timeout}s.")
+                await self.reporter(self._result(record))
+            except asyncio.CancelledError:
+                if not record.runner.cancelled():
+                    # The worker itself is stopping: the task stays RUNNING in
+                    # the saved state and is reported as interrupted on restart
+                    record.runner.cancel()
+                    await asyncio.gather(record.runner, return_exceptions=True)
+                    raise
+                self._finish(record, TaskStatus.CANCELLED, "Cancelled while running.")
+                await self.reporter(self._result(record))
+            except Exception as e:
+                self._finish(record, TaskStatus.FAILED, f"Runner error: {e}")
+                await self.reporter(self._result(record))
+            finally:
+                record.runner = None
+
+    def _finish(
+        self, record: TaskRecord, status: TaskStatus, error: Optional[str] = None
+    ):
+        if record.status == TaskStatus.PENDING:
+            self.queued -= 1
+        record.status = status
+        record.error = error
+        record.finished_at = time.time()
+        self._trim_history()
+        self._save_state()
+
+    def _result(self, record: TaskRecord) -> TaskResult:
+        return TaskResult(
+            task_id=record.task.task_id,
+            status=record.status,
+            output="",
+            error=record.error,
+        )
+
+    def _trim_history(self) -> None:
+        finished = [r for r in self.records.values() if r.status not in ACTIVE_STATUSES]
+        excess = len(finished) - self.history_size
+        if excess > 0:
+            for record in sorted(finished, key=lambda r: r.finished_at or 0)[:excess]:
+                del self.records[record.task.task_id]
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        active = sorted(
+            (r for r in self.records.values() if r.status in ACTIVE_STATUSES),
+            key=lambda r: r.seq,
+        )
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    [{"task": r.task.dict(), "status": r.status} for r in active], f
+                )
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"WARN: Could not persist task queue to {self.state_path}: {e}")
+
+    def _load_state(self) -> List[Tuple[Task, TaskStatus]]:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return []
+        try:
+            with open(self.state_path, "r") as f:
+                tasks = [
+                    (Task(**data["task"]), TaskStatus(data["status"]))
+                    for data in json.load(f)
+                ]
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            print(f"WARN: Ignoring unreadable task queue {self.state_path}: {e}")
+            return []
+        if tasks:
+            print(f"INFO: Restored {len(tasks)} queued task(s) from {self.state_path}.")
+        return tasks
@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+from health import HealthCollector, read_cpu_times, read_net_dev
+
+
+class HealthCollectorTestCase(unittest.TestCase):
+    def test_result_is_cached_for_the_ttl(self):
+        collector = HealthCollector(ttl=60)
+        with mock.patch.object(
+            collector, "collect", wraps=collector.collect
+        ) as collect:
+            first = collector.get()
+            second = collector.get()
+        self.assertEqual(collect.call_count, 1)
+        self.assertEqual(first, second)
+
+    def test_callers_cannot_change_the_cache(self):
+        collector = HealthCollector(ttl=60)
+        health = collector.get()
+        health["ram_percent"] = 1000
+        health["disks"].clear()
+        health.pop("collected_at")
+
+        cached = collector.get()
+        self.assertNotEqual(cached["ram_percent"], 1000)
+        self.assertIn("/", cached["disks"])
+        self.assertIn("collected_at", cached)
+
+    def test_expired_result_is_collected_again(self):
+        collector = HealthCollector(ttl=0)
+        first = collector.get()
+        second = collector.get()
+        self.assertGreaterEqual(second["collected_at"], first["collected_at"])
+        self.assertIsNot(first, second)
+
+    def test_proc_readers(self):
+        times = read_cpu_times()
+        busy, total = times["cpu"]
+        self.assertLessEqual(busy, total)
+        self.assertIn("lo", read_net_dev())
+
+
+if __name__ == "__main__":
+    unittest.main()
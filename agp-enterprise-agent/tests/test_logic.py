@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from logic import OutputBuffer, _pump, execute_command
+
+
+class PumpTestCase(unittest.IsolatedAsyncioTestCase):
+    async def _pump_reads(self, reads):
+        stream = asyncio.StreamReader()
+        received = []
+
+        async def on_output(name, text):
+            received.append(text)
+
+        pump = asyncio.create_task(_pump(stream, "stdout", OutputBuffer(), on_output))
+        for data in reads:
+            stream.feed_data(data)
+            # Let the pump consume each read on its own
+            await asyncio.sleep(0)
+        stream.feed_eof()
+        await pump
+        return received
+
+    async def test_characters_split_across_reads_are_kept(self):
+        """Un carácter multibyte partido entre dos lecturas no se corrompe."""
+        data = "año ñandú €".encode()
+        cut = data.index("€".encode()) + 1
+        received = await self._pump_reads([data[:4], data[4:cut], data[cut:]])
+        self.assertEqual("".join(received), "año ñandú €")
+        self.assertNotIn("�", "".join(received))
+
+    async def test_truncated_character_at_eof_is_replaced(self):
+        received = await self._pump_reads([b"ok \xe2\x82"])
+        self.assertEqual("".join(received), "ok �")
+
+    async def test_execute_command_streams_output(self):
+        chunks = []
+
+        async def on_output(name, text):
+            chunks.append((name, text))
+
+        success, output = await execute_command(["echo", "hola"], on_output=on_output)
+        self.assertTrue(success)
+        self.assertEqual(output, "hola")
+        self.assertEqual(chunks, [("stdout", "hola\n")])
+
+        success, output = await execute_command(["rm", "-rf", "/"])
+        self.assertFalse(success)
+        self.assertIn("not allowed", output)
+
+
+class OutputBufferTestCase(unittest.TestCase):
+    def test_keeps_head_and_tail(self):
+        buffer = OutputBuffer(max_bytes=8)
+        buffer.append(b"abcdefghijkl")
+        self.assertTrue(buffer.truncated)
+        self.assertEqual(buffer.text(), "abcd\n[... output truncated ...]\nijkl")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from modules import ModuleError, ModuleRunner
+
+
+class ModuleRunnerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.runner = ModuleRunner([self.dir], max_workers=2)
+        self.runner.start()
+
+    async def asyncTearDown(self):
+        await self.runner.stop()
+        shutil.rmtree(self.dir)
+
+    async def test_checksum_runs_in_a_worker(self):
+        path = os.path.join(self.dir, "data.bin")
+        with open(path, "wb") as f:
+            f.write(b"hola" * 1000)
+        result = await self.runner.run("checksum", {"path": path})
+        self.assertEqual(result["digest"], hashlib.sha256(b"hola" * 1000).hexdigest())
+        (process,) = self.runner.processes
+
+        # The idle worker takes the next call
+        await self.runner.run("checksum", {"path": path, "algorithm": "md5"})
+        self.assertEqual(self.runner.processes, {process})
+        self.assertTrue(process.is_alive())
+
+        await self.runner.stop()
+        self.assertFalse(process.is_alive())
+        self.assertEqual(self.runner.processes, set())
+
+    async def test_errors_are_raised_in_the_caller(self):
+        with self.assertRaises(FileNotFoundError):
+            await self.runner.run("checksum", {"path": os.path.join(self.dir, "x")})
+        with self.assertRaises(ModuleError):
+            await self.runner.run(
+                "checksum", {"path": self.dir, "algorithm": "unknown"}
+            )
+        with self.assertRaises(ModuleError):
+            await self.runner.run("checksum", {"path": "/etc/passwd"})
+
+    async def test_timeout_terminates_the_worker(self):
+        # Opening a FIFO with no writer blocks the search forever
+        os.mkfifo(os.path.join(self.dir, "pipe"))
+        call = asyncio.create_task(
+            self.runner.run("file_search", {"root": self.dir, "contains": "x"})
+        )
+        for _ in range(100):
+            if self.runner.processes:
+                break
+            await asyncio.sleep(0.01)
+        (process,) = self.runner.processes
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(call, 0.5)
+        self.assertFalse(process.is_alive())
+        self.assertEqual(self.runner.processes, set())
+
+        # A new worker replaces the terminated one
+        os.remove(os.path.join(self.dir, "pipe"))
+        result = await self.runner.run("file_search", {"root": self.dir})
+        self.assertEqual(result["matches"], [])
+        self.assertNotIn(process, self.runner.processes)
+
+    async def test_stubborn_worker_is_killed_off_the_loop(self):
+        """Esperar a que el proceso termine no bloquea el bucle de eventos."""
+        self.runner.reap_timeout = 0.3
+        os.mkfifo(os.path.join(self.dir, "pipe"))
+        call = asyncio.create_task(
+            self.runner.run("file_search", {"root": self.dir, "contains": "x"})
+        )
+        for _ in range(100):
+            if self.runner.processes:
+                break
+            await asyncio.sleep(0.01)
+        (process,) = self.runner.processes
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        # A worker ignoring SIGTERM is killed once reap_timeout is over
+        with patch.object(process, "terminate"):
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(call, 0.1)
+        ticker.cancel()
+        self.assertFalse(process.is_alive())
+        self.assertGreater(ticks, 15)
+
+    async def test_workers_are_limited(self):
+        os.mkfifo(os.path.join(self.dir, "pipe"))
+        args = {"root": self.dir, "contains": "x"}
+        calls = [
+            asyncio.create_task(self.runner.run("file_search", args)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.5)
+        self.assertEqual(len(self.runner.processes), 2)
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        self.assertEqual(self.runner.processes, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
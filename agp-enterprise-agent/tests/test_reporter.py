@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import httpx
+from models import TaskResult, TaskStatus
+from reporter import RESULTS_PATH, DashboardReporter, ProgressBatcher
+
+
+def make_result(task_id):
+    return TaskResult(task_id=task_id, status=TaskStatus.COMPLETED, output="ok")
+
+
+class DashboardReporterTestCase(unittest.IsolatedAsyncioTestCase):
+    """The dashboard is an httpx.MockTransport answering with ``self.status``."""
+
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.outbox = os.path.join(self.dir, "outbox.jsonl")
+        self.status = 200
+        self.rejected_ids = set()
+        self.requests = []
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _handler(self, request):
+        ids = [r["task_id"] for r in json.loads(request.content)["results"]]
+        self.requests.append((request.url.path, ids))
+        if self.rejected_ids.intersection(ids):
+            return httpx.Response(422)
+        return httpx.Response(self.status)
+
+    async def _start(self):
+        reporter = DashboardReporter(
+            "http://dashboard",
+            "token",
+            outbox_path=self.outbox,
+            batch_delay=0,
+            base_delay=0.01,
+            max_delay=0.02,
+        )
+        await reporter.start()
+        await reporter.client.aclose()
+        reporter.client = httpx.AsyncClient(
+            base_url="http://dashboard", transport=httpx.MockTransport(self._handler)
+        )
+        return reporter
+
+    async def _wait_until_sent(self, reporter):
+        for _ in range(200):
+            if not reporter.pending:
+                return
+            await asyncio.sleep(0.01)
+        self.fail("results were not delivered")
+
+    def _outbox_ids(self, path=None):
+        if not os.path.exists(path or self.outbox):
+            return []
+        with open(path or self.outbox) as f:
+            return [json.loads(line)["task_id"] for line in f]
+
+    async def test_outbox_survives_a_restart(self):
+        """Los resultados no entregados se conservan entre reinicios."""
+        self.status = 503
+        reporter = await self._start()
+        await reporter.submit(make_result("t1"))
+        await reporter.submit(make_result("t2"))
+        await asyncio.sleep(0.05)
+        await reporter.stop()
+        self.assertEqual(self._outbox_ids(), ["t1", "t2"])
+        self.assertGreater(len(self.requests), 1)
+
+        self.status = 200
+        self.requests = []
+        reporter = await self._start()
+        self.assertEqual([r.task_id for r in reporter.pending], ["t1", "t2"])
+        await self._wait_until_sent(reporter)
+        await reporter.stop()
+        self.assertEqual(self.requests, [(RESULTS_PATH, ["t1", "t2"])])
+        self.assertEqual(self._outbox_ids(), [])
+
+    async def test_retries_until_the_dashboard_answers(self):
+        answers = iter([500, 429, 401, 200])
+        handler = self._handler
+
+        def flaky(request):
+            self.status = next(answers)
+            return handler(request)
+
+        self._handler = flaky
+        reporter = await self._start()
+        await reporter.submit(make_result("t1"))
+        await self._wait_until_sent(reporter)
+        await reporter.stop()
+        self.assertEqual(len(self.requests), 4)
+        self.assertEqual(reporter.rejected, 0)
+        self.assertEqual(self._outbox_ids(), [])
+
+    async def test_rejected_result_is_dead_lettered(self):
+        """Un resultado rechazado (4xx) no bloquea a los demás."""
+        self.rejected_ids = {"bad"}
+        reporter = await self._start()
+        for task_id in ("t1", "bad", "t2"):
+            await reporter.submit(make_result(task_id))
+        await self._wait_until_sent(reporter)
+        await reporter.stop()
+
+        # The batch holding "bad" is retried one result at a time
+        self.assertIn((RESULTS_PATH, ["bad"]), self.requests)
+        self.assertIn((RESULTS_PATH, ["t1"]), self.requests)
+        delivered = [
+            ids for _, ids in self.requests if not self.rejected_ids.intersection(ids)
+        ]
+        self.assertEqual(sorted(sum(delivered, [])), ["t1", "t2"])
+        self.assertEqual(reporter.rejected, 1)
+        self.assertEqual(self._outbox_ids(), [])
+        self.assertEqual(self._outbox_ids(reporter.dead_letter_path), ["bad"])
+
+    async def test_missing_route_is_not_retried_forever(self):
+        """Sin la ruta en el dashboard (404) los resultados no se acumulan."""
+        self.status = 404
+        reporter = await self._start()
+        await reporter.submit(make_result("t1"))
+        await self._wait_until_sent(reporter)
+        await reporter.stop()
+        self.assertEqual(self._outbox_ids(), [])
+        self.assertEqual(self._outbox_ids(reporter.dead_letter_path), ["t1"])
+
+
+class ProgressBatcherTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sent = []
+
+        async def send(progress):
+            self.sent.append(progress)
+
+        self.send = send
+
+    async def test_timer_flushes_while_the_command_is_silent(self):
+        """La salida pendiente se envía aunque el comando no produzca más."""
+        batcher = ProgressBatcher("t1", self.send, interval=0.05)
+        batcher.start()
+        await batcher.add("stdout", "uno")
+        self.assertEqual(self.sent, [])
+
+        await asyncio.sleep(0.15)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0].chunks[0].data, "uno")
+
+        await batcher.add("stderr", "dos")
+        await batcher.stop()
+        self.assertEqual([p.seq for p in self.sent], [0, 1])
+        self.assertEqual(self.sent[1].chunks[0].stream, "stderr")
+
+        # Nothing pending: stopping sends nothing more
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.sent), 2)
+
+    async def test_large_output_is_sent_right_away(self):
+        batcher = ProgressBatcher("t1", self.send, interval=60, max_bytes=10)
+        await batcher.add("stdout", "x" * 6)
+        self.assertEqual(self.sent, [])
+        await batcher.add("stdout", "x" * 6)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(self.sent[0].chunks), 2)
+        await batcher.stop()
+        self.assertEqual(len(self.sent), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from models import Playbook, Task, TaskResult, TaskStatus
+from task_queue import INTERRUPTED_ERROR, QueueFullError, TaskScheduler
+
+
+def make_task(task_id, priority=0, timeout=None):
+    return Task(
+        task_id=task_id,
+        playbook=Playbook(name="p", content="echo hola"),
+        priority=priority,
+        timeout_seconds=timeout,
+    )
+
+
+class TaskSchedulerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.dir, "task_queue.json")
+        self.reported = []
+        self.release = asyncio.Event()
+        self.outcomes = {}
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.dir)
+
+    async def _report(self, result):
+        self.reported.append(result)
+
+    async def _run(self, task):
+        await self.release.wait()
+        outcome = self.outcomes.get(task.task_id, TaskStatus.COMPLETED)
+        if isinstance(outcome, Exception):
+            raise outcome
+        result = TaskResult(task_id=task.task_id, status=outcome, output="")
+        if outcome == TaskStatus.FAILED:
+            result.error = "exit 1"
+        await self._report(result)
+        return result
+
+    def _scheduler(self, **kwargs):
+        kwargs.setdefault("state_path", self.state_path)
+        return TaskScheduler(self._run, self._report, **kwargs)
+
+    async def _drain(self, scheduler, *task_ids):
+        for _ in range(100):
+            if all(
+                scheduler.records[t].status
+                not in (TaskStatus.PENDING, TaskStatus.RUNNING)
+                for t in task_ids
+            ):
+                return
+            await asyncio.sleep(0.01)
+        self.fail("tasks did not finish")
+
+    async def test_final_status_comes_from_the_runner(self):
+        """Una tarea que falla termina como FAILED, no como COMPLETED."""
+        self.outcomes = {"bad": TaskStatus.FAILED, "boom": RuntimeError("roto")}
+        self.release.set()
+        scheduler = self._scheduler()
+        await scheduler.start()
+        for task_id in ("ok", "bad", "boom"):
+            await scheduler.submit(make_task(task_id))
+        await self._drain(scheduler, "ok", "bad", "boom")
+        await scheduler.stop()
+
+        records = scheduler.records
+        self.assertEqual(records["ok"].status, TaskStatus.COMPLETED)
+        self.assertEqual(records["bad"].status, TaskStatus.FAILED)
+        self.assertEqual(records["bad"].error, "exit 1")
+        self.assertEqual(records["boom"].status, TaskStatus.FAILED)
+        self.assertIn("roto", records["boom"].error)
+
+    async def test_timeout_fails_the_task(self):
+        scheduler = self._scheduler()
+        await scheduler.start()
+        await scheduler.submit(make_task("slow", timeout=0.05))
+        await self._drain(scheduler, "slow")
+        await scheduler.stop()
+        self.assertEqual(scheduler.records["slow"].status, TaskStatus.FAILED)
+        self.assertEqual(self.reported[-1].status, TaskStatus.FAILED)
+
+    async def test_queue_is_bounded(self):
+        scheduler = self._scheduler(concurrency=1, max_queued=2)
+        await scheduler.start()
+        await scheduler.submit(make_task("running"))
+        await asyncio.sleep(0.01)
+        await scheduler.submit(make_task("a"))
+        await scheduler.submit(make_task("b", priority=5))
+        with self.assertRaises(QueueFullError):
+            await scheduler.submit(make_task("c"))
+        self.assertEqual(scheduler.position("b"), 1)
+        positions = {t["task_id"]: t["queue_position"] for t in scheduler.list()}
+        self.assertEqual(positions, {"running": None, "a": 2, "b": 1})
+
+        # Cancelling a queued task frees its slot
+        await scheduler.cancel("a")
+        await scheduler.submit(make_task("c"))
+        positions = {t["task_id"]: t["queue_position"] for t in scheduler.list()}
+        self.assertEqual(positions, {"running": None, "a": None, "b": 1, "c": 2})
+        self.release.set()
+        await self._drain(scheduler, "running", "b", "c")
+        await scheduler.stop()
+        self.assertEqual(scheduler.queued, 0)
+
+    async def test_interrupted_tasks_are_not_run_again(self):
+        """Tras reiniciar, las tareas pendientes se reanudan y las que se
+        estaban ejecutando se dan por fallidas."""
+        scheduler = self._scheduler(concurrency=1)
+        await scheduler.start()
+        await scheduler.submit(make_task("running"))
+        await asyncio.sleep(0.01)
+        await scheduler.submit(make_task("queued"))
+        await scheduler.stop()
+
+        with open(self.state_path) as f:
+            saved = {
+                entry["task"]["task_id"]: entry["status"] for entry in json.load(f)
+            }
+        self.assertEqual(saved, {"running": "running", "queued": "pending"})
+
+        started = []
+        original_run = self._run
+
+        async def run(task):
+            started.append(task.task_id)
+            return await original_run(task)
+
+        self.release.set()
+        scheduler = TaskScheduler(run, self._report, state_path=self.state_path)
+        await scheduler.start()
+        await self._drain(scheduler, "running", "queued")
+        await scheduler.stop()
+
+        self.assertEqual(started, ["queued"])
+        self.assertEqual(scheduler.records["running"].status, TaskStatus.FAILED)
+        self.assertEqual(self.reported[0].task_id, "running")
+        self.assertEqual(self.reported[0].error, INTERRUPTED_ERROR)
+
+
+if __name__ == "__main__":
+    unittest.main()
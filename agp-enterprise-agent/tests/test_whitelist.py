@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from whitelist import CommandWhitelist
+
+
+class CommandWhitelistTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "allowed_commands.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, entries, mtime=None):
+        with open(self.path, "w") as f:
+            if isinstance(entries, str):
+                f.write(entries)
+            else:
+                json.dump(entries, f)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_commands_and_argument_rules(self):
+        self._write(["ls", {"command": "echo", "args": ["hello*", "-n"]}])
+        whitelist = CommandWhitelist(self.path)
+        self.assertEqual(whitelist.commands, frozenset({"ls", "echo"}))
+        self.assertIsNone(whitelist.check("ls", ["-la", "/tmp"]))
+        self.assertIsNone(whitelist.check("echo", ["-n", "hello world"]))
+        self.assertIn("not allowed", whitelist.check("rm", ["-rf", "/"]))
+        self.assertEqual(
+            whitelist.check("echo", ["bye"]),
+            "Argument 'bye' is not allowed for 'echo'.",
+        )
+
+    def test_empty_argument_list_allows_no_arguments(self):
+        self._write([{"command": "date", "args": []}])
+        whitelist = CommandWhitelist(self.path)
+        self.assertIsNone(whitelist.check("date", []))
+        self.assertIsNotNone(whitelist.check("date", ["+%s"]))
+
+    def test_reloads_when_the_file_changes(self):
+        self._write(["ls"], mtime=1000)
+        whitelist = CommandWhitelist(self.path, check_interval=0)
+        self.assertIsNotNone(whitelist.check("pwd", []))
+
+        self._write(["ls", "pwd"], mtime=2000)
+        self.assertIsNone(whitelist.check("pwd", []))
+
+    def test_check_interval_limits_reloads(self):
+        self._write(["ls"], mtime=1000)
+        whitelist = CommandWhitelist(self.path, check_interval=3600)
+        self._write(["pwd"], mtime=2000)
+        self.assertIsNone(whitelist.check("ls", []))
+        self.assertIsNotNone(whitelist.check("pwd", []))
+
+    def test_broken_edit_keeps_the_previous_whitelist(self):
+        self._write(["ls", {"command": "echo", "args": ["hi"]}], mtime=1000)
+        whitelist = CommandWhitelist(self.path, check_interval=0)
+        rules = whitelist.arg_rules
+
+        self._write("[not json", mtime=2000)
+        self.assertIsNone(whitelist.check("ls", []))
+        self.assertIsNone(whitelist.check("echo", ["hi"]))
+        self.assertIs(whitelist.arg_rules, rules)
+
+    def test_missing_file_allows_nothing(self):
+        whitelist = CommandWhitelist(self.path, check_interval=0)
+        self.assertEqual(whitelist.commands, frozenset())
+        self.assertIsNotNone(whitelist.check("ls", []))
+
+        self._write(["ls"])
+        self.assertIsNone(whitelist.check("ls", []))
+
+
+if __name__ == "__main__":
+    unittest.main()
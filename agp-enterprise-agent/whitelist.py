@@ -0,0 +1,110 @@
+# agp-enterprise-agent/whitelist.py
+
+import fnmatch
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, FrozenSet, Optional, Pattern, Sequence, Tuple
+
+
+class CommandWhitelist:
+    """
+    The set of commands the agent is allowed to run, loaded from a JSON file.
+
+    Each entry of the file is either a command name, which allows it with any
+    arguments, or an object restricting its arguments with glob patterns:
+
+        ["ls", {"command": "echo", "args": ["hello*", "-n"]}]
+
+    With `args`, every argument must match at least one of the patterns.
+    The file is parsed once and re-read only when its mtime changes, checked
+    at most every `check_interval` seconds. If a reload fails, the previous
+    whitelist stays in effect.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        # (commands, argument rules), replaced as a whole on reload
+        self._rules: Tuple[FrozenSet[str], Dict[str, Pattern]] = (frozenset(), {})
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._reload()
+        self._next_check = time.monotonic() + check_interval
+
+    @property
+    def commands(self) -> FrozenSet[str]:
+        return self._rules[0]
+
+    @property
+    def arg_rules(self) -> Dict[str, Pattern]:
+        return self._rules[1]
+
+    def check(self, command: str, args: Sequence[str]) -> Optional[str]:
+        """Returns None if the command line is allowed, otherwise the reason."""
+        self._maybe_reload()
+        # Read both from one snapshot; a reload may replace it meanwhile
+        commands, arg_rules = self._rules
+        if command not in commands:
+            return f"Command '{command}' is not allowed."
+        rule = arg_rules.get(command)
+        if rule is not None:
+            for arg in args:
+                if not rule.fullmatch(arg):
+                    return f"Argument '{arg}' is not allowed for '{command}'."
+        return None
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._reload()
+
+    def _reload(self) -> None:
+        try:
+            self._mtime = os.stat(self.path).st_mtime
+        except OSError:
+            # Remember the file is missing so it is not re-read until it appears
+            self._mtime = None
+        try:
+            with open(self.path, "r") as f:
+                commands, arg_rules = self._parse(json.load(f))
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            if self.commands:
+                print(f"WARN: Could not reload {self.path}, keeping the old one: {e}")
+            else:
+                print(f"WARN: {self.path} not found or invalid: {e}")
+                print("WARN: No commands will be executed.")
+            return
+        # A single assignment, so a concurrent check sees either the old
+        # commands and rules or the new ones, never a mix of both
+        self._rules = (commands, arg_rules)
+        print(f"INFO: Loaded {len(commands)} allowed command(s) from {self.path}.")
+
+    @staticmethod
+    def _parse(entries):
+        commands = set()
+        arg_rules = {}
+        for entry in entries:
+            if isinstance(entry, str):
+                commands.add(entry)
+                continue
+            command = entry["command"]
+            commands.add(command)
+            patterns = entry.get("args")
+            if patterns is not None:
+                # One alternation per command, so a check is a single regex match
+                regex = "|".join(f"(?:{fnmatch.translate(p)})" for p in patterns)
+                arg_rules[command] = re.compile(regex or "(?!)")
+        return frozenset(commands), arg_rules